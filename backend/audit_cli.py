@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Offline deliverability audit for large domain lists.
+
+Runs the same checks as /api/check-deliverability without going through HTTP.
+Domains are read as a stream (file or stdin, first CSV column, one per line),
+split into chunks and audited on a process pool; each worker runs the checks
+concurrently on its own event loop.
+
+Progress is checkpointed after every chunk that reaches the output file, so an
+interrupted run can be continued with --resume. The checkpoint records a hash
+of the input lines already audited; resuming against a different input is
+refused rather than skipping or misaligning domains.
+
+    python audit_cli.py domains.txt -o results.jsonl --workers 8
+    zcat export.csv.gz | python audit_cli.py - -o results.csv --resume
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Union
+
+from pydantic import ValidationError
+
+import server
+from fast_json import dumps as json_dumps
+from dns_scheduler import BULK, set_priority
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+def parse_domain_line(line: str) -> Optional[str]:
+    return server.parse_domain_line(line.encode())
+
+
+async def audit_domains(domains: List[str], concurrency: int) -> List[Dict]:
+    # Audits yield upstream DNS capacity to interactive API requests
+    set_priority(BULK)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def audit(raw_domain: str) -> Dict:
+        try:
+            domain = server.DeliverabilityRequest(domain=raw_domain).domain
+        except ValidationError as e:
+            return {'domain': raw_domain, 'error': e.errors()[0]['msg']}
+        async with semaphore:
+            try:
+                return await server.build_deliverability_report(domain)
+            except Exception as e:
+                return {'domain': raw_domain, 'error': f'Error checking deliverability: {str(e)}'}
+
+    return list(await asyncio.gather(*(audit(domain) for domain in domains)))
+
+
+def audit_chunk(lines: List[str], concurrency: int) -> List[Dict]:
+    """Process pool entry point: audit one chunk of raw input lines"""
+    domains = []
+    seen = set()
+    for line in lines:
+        domain = parse_domain_line(line)
+        if domain and domain not in seen:
+            seen.add(domain)
+            domains.append(domain)
+    return asyncio.run(audit_domains(domains, concurrency))
+
+
+def init_worker():
+    # Per-domain INFO logging from server would swamp the terminal
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def read_chunks(stream, chunk_size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(islice(stream, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultWriter:
+    """Writes reports as JSONL or CSV (one row per domain, one column per check)"""
+
+    def __init__(self, output, fmt: str, write_header: bool):
+        self.output = output
+        self.fmt = fmt
+        self.check_names = [spec.name for spec in server.checks_registry]
+        if fmt == 'csv' and write_header:
+            self._write_csv_row(['domain', 'overall_score', 'error'] + self.check_names)
+
+    def _write_csv_row(self, row: List) -> None:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(row)
+        self.output.write(buffer.getvalue())
+
+    def write(self, report: Union[server.DeliverabilityReport, Dict]) -> None:
+        """Write a report, or an {'domain', 'error'} dict for a domain that couldn't be checked"""
+        if self.fmt == 'jsonl':
+            self.output.write(json_dumps(report).decode() + '\n')
+            return
+        if isinstance(report, dict):
+            self._write_csv_row([report['domain'], '', report['error']] + [''] * len(self.check_names))
+            return
+        passed = {check.name: check.passed for check in report.checks}
+        self._write_csv_row(
+            [report.domain, report.overall_score, '']
+            + [passed.get(name, '') for name in self.check_names]
+        )
+
+    def commit(self) -> int:
+        """Flush everything written so far to disk and return the file size"""
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        return self.output.tell()
+
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: Dict) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def input_name(path: str) -> str:
+    return path if path == '-' else os.path.abspath(path)
+
+
+def checkpoint_mismatch(checkpoint: Dict, args, lines_read: int, digest: str) -> Optional[str]:
+    """Why the checkpoint can't be resumed against this input, if it can't"""
+    if checkpoint.get('input') != input_name(args.input):
+        return f"checkpoint is for input {checkpoint.get('input')!r}, not {input_name(args.input)!r}"
+    if lines_read < checkpoint['lines_done']:
+        return f"input has {lines_read} lines, the checkpoint is after {checkpoint['lines_done']}"
+    if checkpoint.get('input_sha256') != digest:
+        return 'the first lines of the input differ from the ones already audited'
+    return None
+
+
+def run(args) -> int:
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    checkpoint_path = args.output + CHECKPOINT_SUFFIX
+    checkpoint = load_checkpoint(checkpoint_path) if args.resume else None
+    lines_done = checkpoint['lines_done'] if checkpoint else 0
+
+    # Hash of every input line audited so far, in order; a resumed run must read the same lines
+    input_hash = hashlib.sha256()
+    stream = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', errors='replace')
+    lines_read = 0
+    for line in islice(stream, lines_done):
+        input_hash.update(line.encode())
+        lines_read += 1
+
+    if checkpoint:
+        mismatch = checkpoint_mismatch(checkpoint, args, lines_read, input_hash.hexdigest())
+        if mismatch:
+            print(f"Cannot resume: {mismatch}. Remove {checkpoint_path} to start over.", file=sys.stderr)
+            return 2
+        # Drop anything written after the last checkpoint, then append
+        output = open(args.output, 'r+', newline='')
+        output.truncate(checkpoint['output_bytes'])
+        output.seek(checkpoint['output_bytes'])
+        print(f"Resuming after {lines_done} input lines", file=sys.stderr)
+    else:
+        output = open(args.output, 'w', newline='')
+    writer = ResultWriter(output, fmt, write_header=not checkpoint)
+
+    started = time.perf_counter()
+    audited = 0
+    chunks = read_chunks(stream, args.chunk_size)
+    next_index = 0  # next chunk to submit
+    write_index = 0  # next chunk to write, so the output stays in input order
+    finished = {}
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        while True:
+            # Keep a bounded number of chunks in flight so memory stays flat
+            while len(running) < args.workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                running[pool.submit(audit_chunk, chunk, args.concurrency)] = (next_index, chunk)
+                next_index += 1
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, chunk = running.pop(future)
+                finished[index] = (future.result(), chunk)
+
+            while write_index in finished:
+                reports, chunk = finished.pop(write_index)
+                for report in reports:
+                    writer.write(report)
+                audited += len(reports)
+                lines_done += len(chunk)
+                for line in chunk:
+                    input_hash.update(line.encode())
+                save_checkpoint(checkpoint_path, {
+                    'input': input_name(args.input),
+                    'input_sha256': input_hash.hexdigest(),
+                    'lines_done': lines_done,
+                    'output_bytes': writer.commit(),
+                })
+                write_index += 1
+
+    output.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.perf_counter() - started
+    rate = audited / elapsed if elapsed else 0.0
+    print(f"Audited {audited} domains in {elapsed:.1f}s ({rate:.1f} domains/second)", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="domain file, or '-' for stdin")
+    parser.add_argument('-o', '--output', required=True, help='results file (.csv or .jsonl)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='output format (default: from the output extension)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--concurrency', type=int, default=50, help='domains checked at once per worker')
+    parser.add_argument('--chunk-size', type=int, default=500, help='input lines per work unit')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint next to the output file')
+    return run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import asyncio
+import sys
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+import profiling
+from dns_scheduler import QueryThrottled
+
+# A DNS lookup a check needs: (qname, rdtype)
+Query = Tuple[str, str]
+
+# Lookups that were rate limited while the current check ran (set per check task)
+_throttled_lookups: ContextVar[Optional[List[Query]]] = ContextVar('throttled_lookups', default=None)
+
+
+def _note_throttled(qname: str, rdtype: str) -> None:
+    throttled = _throttled_lookups.get()
+    if throttled is not None:
+        throttled.append((qname, rdtype))
+
+
+class CheckSkipped(Exception):
+    """Raised by a check with nothing to examine; reported as skipped rather than failed"""
+
+
+@dataclass(frozen=True, slots=True)
+class Recommendation:
+    title: str
+    description: str
+
+
+@dataclass(slots=True)
+class CheckResult:
+    """Outcome of one check in a report; id, name and description are the spec's own (interned) strings"""
+    id: str
+    name: str
+    description: str
+    passed: bool
+    result: str
+    status: str  # passed, failed, inconclusive or skipped
+
+
+@dataclass(frozen=True)
+class CheckSpec:
+    """A registered deliverability check.
+
+    `run(domain, ctx)` returns {'passed': bool, 'result': str}; the engine adds a
+    `status` of passed, failed, inconclusive (lookups were rate limited) or
+    skipped (the check raised CheckSkipped, say because what it examines is
+    missing and a dependency already reported that). `queries(domain)`
+    lists the lookups the check will make, so the engine can issue them up front
+    and share them with other checks. Checks listed in `depends_on` finish first
+    and their CheckResults are available in `ctx.results`.
+    """
+    id: str
+    name: str
+    description: str
+    run: Callable[[str, 'CheckContext'], Awaitable[Dict]]
+    queries: Callable[[str], List[Query]] = lambda domain: []
+    depends_on: Tuple[str, ...] = ()
+    recommendation: Optional[Recommendation] = None
+
+
+class CheckContext:
+    """Per-domain state shared by the checks of one run.
+
+    Identical lookups made through `lookup` are issued once. Callers await a
+    shielded view, so one check timing out does not cancel a lookup another
+    check is still waiting on.
+
+    `hints` carries what the caller already knows about the domain (such as
+    `dkim_selectors` to try first); checks record what they learned for the
+    caller in `findings` (such as the `dkim_selector` that matched).
+
+    Lookups made through `lookup` or `resolve` that were rate limited are
+    noted against the check awaiting them, so the engine can report the check
+    as inconclusive rather than failed.
+    """
+
+    def __init__(self, domain: str, resolve: Callable[[str, str], Awaitable], hints: Optional[Dict] = None):
+        self.domain = domain
+        self._resolve = resolve
+        self.hints: Dict = hints or {}
+        self.findings: Dict = {}
+        self.results: Dict[str, CheckResult] = {}
+        self._lookups: Dict[Query, asyncio.Task] = {}
+
+    def prefetch(self, qname: str, rdtype: str) -> asyncio.Task:
+        """Start a lookup (once) without waiting for it"""
+        key = (qname.rstrip('.').lower(), rdtype.upper())
+        task = self._lookups.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(qname, rdtype))
+            # Failures are reported to whoever awaits the lookup; don't warn if nobody does
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._lookups[key] = task
+        return task
+
+    async def lookup(self, qname: str, rdtype: str):
+        """Await a shared lookup"""
+        try:
+            return await asyncio.shield(self.prefetch(qname, rdtype))
+        except QueryThrottled:
+            _note_throttled(qname, rdtype)
+            raise
+
+    async def resolve(self, qname: str, rdtype: str):
+        """An unshared lookup, for probes the caller may cancel"""
+        try:
+            return await self._resolve(qname, rdtype)
+        except QueryThrottled:
+            _note_throttled(qname, rdtype)
+            raise
+
+    @property
+    def lookup_count(self) -> int:
+        return len(self._lookups)
+
+    def close(self) -> None:
+        for task in self._lookups.values():
+            task.cancel()
+
+
+class CheckRegistry:
+    def __init__(self):
+        self._specs: Dict[str, CheckSpec] = {}
+
+    def register(self, id: str, name: str, description: str, queries: Callable[[str], List[Query]] = None,
+                 depends_on: Tuple[str, ...] = (), recommendation: Optional[Dict] = None):
+        """Decorator registering an async check function under `id`"""
+        def decorator(func):
+            for dependency in depends_on:
+                if dependency not in self._specs:
+                    raise ValueError(f"Check '{id}' depends on unregistered check '{dependency}'")
+            self._specs[id] = CheckSpec(
+                id=sys.intern(id),
+                name=sys.intern(name),
+                description=sys.intern(description),
+                run=func,
+                queries=queries or (lambda domain: []),
+                depends_on=tuple(depends_on),
+                recommendation=Recommendation(**recommendation) if recommendation else None,
+            )
+            return func
+        return decorator
+
+    def __getitem__(self, id: str) -> CheckSpec:
+        return self._specs[id]
+
+    def __iter__(self):
+        return iter(self._specs.values())
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def stages(self) -> List[List[CheckSpec]]:
+        """Group checks into dependency levels; checks in a level don't depend on each other"""
+        level: Dict[str, int] = {}
+        for spec in self._specs.values():  # registration order is already topological
+            level[spec.id] = max((level[d] + 1 for d in spec.depends_on), default=0)
+        stages: List[List[CheckSpec]] = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for spec in self._specs.values():
+            stages[level[spec.id]].append(spec)
+        return stages
+
+    def query_plan(self, domain: str) -> List[Query]:
+        """Deduplicated lookups every check declares for a domain, in first-use order"""
+        plan: Dict[Query, None] = {}
+        for spec in self._specs.values():
+            for qname, rdtype in spec.queries(domain):
+                plan.setdefault((qname.rstrip('.').lower(), rdtype.upper()), None)
+        return list(plan)
+
+
+class CheckEngine:
+    """Runs every registered check for a domain, as concurrently as dependencies allow.
+
+    An optional `precheck(domain, ctx)` runs before any other lookup is issued.
+    If it returns a reason (say, the domain does not exist), every check fails
+    with that reason and nothing else is looked up. The reason is also left
+    in ctx.findings['precheck_failure'].
+    """
+
+    def __init__(self, registry: CheckRegistry, resolve: Callable[[str, str], Awaitable], timeout: float,
+                 precheck: Optional[Callable[[str, CheckContext], Awaitable[Optional[str]]]] = None):
+        self.registry = registry
+        self.resolve = resolve
+        self.timeout = timeout
+        self.precheck = precheck
+
+    async def run(self, domain: str, ctx: Optional[CheckContext] = None) -> List[CheckResult]:
+        """Run every check; pass `ctx` to supply hints or a different resolve function"""
+        ctx = ctx or CheckContext(domain, self.resolve)
+        try:
+            if self.precheck is not None:
+                with profiling.span('precheck', 'precheck') as span:
+                    try:
+                        reason = await asyncio.wait_for(self.precheck(domain, ctx), timeout=self.timeout)
+                    except asyncio.TimeoutError:
+                        reason = None  # undecided; the checks find out for themselves
+                    if span is not None:
+                        span.attrs['outcome'] = 'ok' if reason is None else 'failed'
+                        if reason is not None:
+                            span.attrs['result'] = reason
+                if reason is not None:
+                    ctx.findings['precheck_failure'] = reason
+                    return [self._fail_without_running(spec, reason, ctx) for spec in self.registry]
+
+            # Issue every declared lookup now; checks pick them up through ctx.lookup
+            for qname, rdtype in self.registry.query_plan(domain):
+                ctx.prefetch(qname, rdtype)
+
+            tasks: Dict[str, asyncio.Task] = {}
+            for spec in self.registry:
+                tasks[spec.id] = asyncio.ensure_future(
+                    self._run_check(spec, domain, ctx, [tasks[d] for d in spec.depends_on])
+                )
+            return list(await asyncio.gather(*tasks.values()))
+        finally:
+            ctx.close()
+
+    def _fail_without_running(self, spec: CheckSpec, reason: str, ctx: CheckContext) -> CheckResult:
+        metrics.CHECK_RESULTS.inc(check=spec.id, outcome='precheck_failed')
+        result = CheckResult(spec.id, spec.name, spec.description, False, reason, 'failed')
+        ctx.results[spec.id] = result
+        return result
+
+    async def _run_check(self, spec: CheckSpec, domain: str, ctx: CheckContext,
+                         dependencies: List[asyncio.Task]) -> CheckResult:
+        if dependencies:
+            await asyncio.gather(*dependencies)
+        started = time.perf_counter()
+        throttled: List[Query] = []
+        _throttled_lookups.set(throttled)
+        with profiling.span(spec.id, 'check') as span:
+            try:
+                outcome = await asyncio.wait_for(spec.run(domain, ctx), timeout=self.timeout)
+                status = 'passed' if outcome['passed'] else 'failed'
+                if throttled and not outcome['passed']:
+                    # The failure may only mean we held the lookups back; don't report it as a finding
+                    status = 'inconclusive'
+                    outcome = {
+                        'passed': False,
+                        'result': f'Inconclusive: {len(throttled)} DNS lookup(s) were rate limited, try again shortly',
+                    }
+            except QueryThrottled:
+                outcome = {'passed': False, 'result': 'Inconclusive: DNS lookups were rate limited, try again shortly'}
+                status = 'inconclusive'
+            except CheckSkipped as e:
+                outcome = {'passed': False, 'result': f'Skipped: {e}'}
+                status = 'skipped'
+            except asyncio.TimeoutError:
+                outcome = {'passed': False, 'result': f'Check timed out after {self.timeout:g} seconds'}
+                status = 'timeout'
+            except Exception as e:
+                outcome = {'passed': False, 'result': f'Error running check: {str(e)}'}
+                status = 'error'
+            if span is not None:
+                span.attrs['status'] = status
+                if status != 'passed':
+                    span.attrs['result'] = outcome['result']
+        metrics.CHECK_DURATION.observe(time.perf_counter() - started, check=spec.id)
+        metrics.CHECK_RESULTS.inc(check=spec.id, outcome=status)
+        result = CheckResult(
+            spec.id, spec.name, spec.description, outcome['passed'], outcome['result'],
+            status if status in ('inconclusive', 'skipped') else 'passed' if outcome['passed'] else 'failed',
+        )
+        ctx.results[spec.id] = result
+        return result
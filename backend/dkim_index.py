@@ -0,0 +1,220 @@
+"""Learned DKIM selector statistics, used to order selector probes.
+
+Selectors are mostly chosen by the sending provider (Klaviyo domains publish
+"klaviyo", SendGrid domains "s1"/"s2", ...), and the provider shows in the
+domain's MX hosts and SPF includes. The index counts which selector matched,
+overall and per provider fingerprint, and remembers the last selector that
+matched for each domain. Probing follows these counts, so a known domain
+needs one lookup and a new domain on a known provider needs one or two.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def provider_fingerprints(mx_hosts: Iterable[str], spf_record: Optional[str]) -> List[str]:
+    """Provider markers for a domain: the parent domains of its MX hosts and its SPF include targets"""
+    fingerprints = set()
+    for host in mx_hosts:
+        labels = host.rstrip('.').lower().split('.')
+        if len(labels) >= 2:
+            fingerprints.add('mx:' + '.'.join(labels[-2:]))
+    for term in (spf_record or '').split()[1:]:
+        mechanism = term.lstrip('+-~?').lower()
+        if mechanism.startswith('include:') and '%' not in mechanism:
+            fingerprints.add('spf:' + mechanism[len('include:'):].rstrip('.'))
+    return sorted(fingerprints)
+
+
+class SelectorIndex:
+    """Selector counts, persisted to `path` and shared by every process using that path.
+
+    Each process keeps what it learned since its last save as deltas. Saving
+    merges those deltas into the file's current contents under an exclusive
+    lock, so workers of one server (or the monitor beside it) add to each
+    other's counts rather than overwriting them, then adopts the merged state.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_domains: int = 200000, max_fingerprints: int = 20000):
+        self.path = path
+        self.max_domains = max_domains
+        self.max_fingerprints = max_fingerprints
+        self.overall: Counter = Counter()
+        self.by_fingerprint: "OrderedDict[str, Counter]" = OrderedDict()
+        self.last_good: "OrderedDict[str, str]" = OrderedDict()
+        self.saved_at = 0.0
+        self._new_deltas()
+
+    def _new_deltas(self) -> None:
+        self._overall_delta: Counter = Counter()
+        self._fingerprint_delta: Dict[str, Counter] = {}
+        self._last_good_delta: Dict[str, Optional[str]] = {}  # None: forget the domain
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._overall_delta or self._last_good_delta)
+
+    def known_selector(self, domain: str) -> Optional[str]:
+        return self.last_good.get(domain)
+
+    def order(self, selectors: List[str], fingerprints: Iterable[str] = ()) -> List[str]:
+        """`selectors` sorted by provider hits, then overall hits; ties keep their given order"""
+        fingerprints = list(fingerprints)
+        position = {selector: i for i, selector in enumerate(selectors)}
+        return sorted(selectors, key=lambda s: (-self.provider_hits(s, fingerprints), -self.overall[s], position[s]))
+
+    def provider_hits(self, selector: str, fingerprints: Iterable[str]) -> int:
+        return sum(self.by_fingerprint.get(fingerprint, {}).get(selector, 0) for fingerprint in fingerprints)
+
+    def record(self, domain: str, fingerprints: Iterable[str], selector: Optional[str]) -> None:
+        """Learn from one check: the selector that matched, or None when none did"""
+        if selector is None:
+            if self.last_good.pop(domain, None) is not None:
+                self._last_good_delta[domain] = None
+            return
+        previous = self.last_good.get(domain)
+        if previous == selector:
+            self.last_good.move_to_end(domain)
+            return  # re-confirmations would only inflate the counts of domains checked often
+        self._last_good_delta[domain] = selector
+        self._overall_delta[selector] += 1
+        for fingerprint in fingerprints:
+            self._fingerprint_delta.setdefault(fingerprint, Counter())[selector] += 1
+        self._apply(self.last_good, self.overall, self.by_fingerprint,
+                    {domain: selector}, Counter({selector: 1}), {fingerprint: Counter({selector: 1}) for fingerprint in fingerprints})
+
+    def _apply(self, last_good: "OrderedDict[str, str]", overall: Counter, by_fingerprint: "OrderedDict[str, Counter]",
+               last_good_delta: Dict[str, Optional[str]], overall_delta: Counter,
+               fingerprint_delta: Dict[str, Counter]) -> None:
+        """Add deltas to a state, keeping the most recently used domains and fingerprints"""
+        for domain, selector in last_good_delta.items():
+            if selector is None:
+                last_good.pop(domain, None)
+            else:
+                last_good[domain] = selector
+                last_good.move_to_end(domain)
+        while len(last_good) > self.max_domains:
+            last_good.popitem(last=False)
+        overall.update(overall_delta)
+        for fingerprint, counts in fingerprint_delta.items():
+            by_fingerprint.setdefault(fingerprint, Counter()).update(counts)
+            by_fingerprint.move_to_end(fingerprint)
+        while len(by_fingerprint) > self.max_fingerprints:
+            by_fingerprint.popitem(last=False)
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': FORMAT_VERSION,
+            'overall': dict(self.overall),
+            'by_fingerprint': {fingerprint: dict(counts) for fingerprint, counts in self.by_fingerprint.items()},
+            'last_good': dict(self.last_good),
+        }
+
+    def _adopt(self, data: Dict) -> None:
+        self.overall = Counter(data.get('overall', {}))
+        self.by_fingerprint = OrderedDict(
+            (fingerprint, Counter(counts)) for fingerprint, counts in data.get('by_fingerprint', {}).items())
+        self.last_good = OrderedDict(data.get('last_good', {}))
+
+    def _read(self) -> Optional[Dict]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable DKIM selector index {self.path}: {e}")
+            return None
+        if data.get('version') != FORMAT_VERSION:
+            logger.warning(f"Ignoring DKIM selector index {self.path} with unknown version {data.get('version')}")
+            return None
+        return data
+
+    def load(self) -> 'SelectorIndex':
+        """Read the index from `path`; a missing or unreadable file starts an empty index"""
+        if self.path:
+            data = self._read()
+            if data is not None:
+                self._adopt(data)
+        return self
+
+    def merge_and_write(self, deltas) -> Dict:
+        """Add `deltas` to the file's current contents and atomically replace it; safe to run in a
+        worker thread. Returns the merged state."""
+        last_good_delta, overall_delta, fingerprint_delta = deltas
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = SelectorIndex(self.path, self.max_domains, self.max_fingerprints).load()
+            self._apply(merged.last_good, merged.overall, merged.by_fingerprint,
+                        last_good_delta, overall_delta, fingerprint_delta)
+            data = merged.to_dict()
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        return data
+
+    def _take_deltas(self):
+        deltas = (self._last_good_delta, self._overall_delta, self._fingerprint_delta)
+        self._new_deltas()
+        return deltas
+
+    def _saved(self, data: Dict) -> None:
+        """Adopt the merged state, plus whatever was learned while it was being written"""
+        self._adopt(data)
+        self._apply(self.last_good, self.overall, self.by_fingerprint,
+                    self._last_good_delta, self._overall_delta, self._fingerprint_delta)
+        self.saved_at = time.time()
+
+    def _restore(self, deltas) -> None:
+        """A save failed: keep its deltas for the next attempt"""
+        last_good_delta, overall_delta, fingerprint_delta = deltas
+        self._last_good_delta = {**last_good_delta, **self._last_good_delta}
+        self._overall_delta = overall_delta + self._overall_delta
+        for fingerprint, counts in self._fingerprint_delta.items():
+            fingerprint_delta.setdefault(fingerprint, Counter()).update(counts)
+        self._fingerprint_delta = fingerprint_delta
+
+    def save(self) -> None:
+        if not self.path or not self.dirty:
+            return
+        deltas = self._take_deltas()
+        try:
+            data = self.merge_and_write(deltas)
+        except OSError:
+            self._restore(deltas)
+            raise
+        self._saved(data)
+
+    async def autosave(self, interval: float) -> None:
+        """Save every `interval` seconds while there are changes; the file is written off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if not self.path or not self.dirty:
+                continue
+            deltas = self._take_deltas()
+            try:
+                data = await loop.run_in_executor(None, self.merge_and_write, deltas)
+            except OSError as e:
+                self._restore(deltas)
+                logger.warning(f"Could not save DKIM selector index to {self.path}: {e}")
+                continue
+            self._saved(data)
+
+    def stats(self) -> Dict:
+        return {
+            'domains': len(self.last_good),
+            'fingerprints': len(self.by_fingerprint),
+            'selectors': len(self.overall),
+            'hits': sum(self.overall.values()),
+        }
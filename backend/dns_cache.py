@@ -0,0 +1,165 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import dns.message
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+
+# Used when a negative answer carries no SOA record to take the TTL from
+DEFAULT_NEGATIVE_TTL = 60
+
+
+def negative_ttl(response) -> Optional[int]:
+    """Negative caching TTL of a response: min(SOA TTL, SOA minimum), per RFC 2308"""
+    if response is None:
+        return None
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return min(rrset.ttl, rrset[0].minimum)
+    return None
+
+
+def _response_of(error: Exception):
+    if isinstance(error, dns.resolver.NXDOMAIN):
+        return next(iter(error.responses().values()), None)
+    return error.kwargs.get('response')
+
+
+def pack_entry(answer, error: Optional[Exception]) -> bytes:
+    """Serialize a cache entry for the shared cache: a kind byte, then the response in wire format"""
+    if error is None:
+        return b'A' + answer.response.to_wire()
+    response = _response_of(error)
+    kind = b'X' if isinstance(error, dns.resolver.NXDOMAIN) else b'N'
+    return kind + (response.to_wire() if response is not None else b'')
+
+
+def unpack_entry(qname: str, rdtype: str, data: bytes, ttl: float) -> Tuple[object, Optional[Exception]]:
+    """Rebuild (answer, error) from pack_entry() output; the answer expires `ttl` seconds from now"""
+    name = dns.name.from_text(qname)
+    response = dns.message.from_wire(data[1:]) if len(data) > 1 else None
+    kind = data[:1]
+    if kind == b'A':
+        answer = dns.resolver.Answer(name, dns.rdatatype.from_text(rdtype), dns.rdataclass.IN, response)
+        answer.expiration = time.time() + ttl
+        return answer, None
+    if kind == b'X':
+        return None, dns.resolver.NXDOMAIN(qnames=[name], responses={name: response} if response else {})
+    return None, dns.resolver.NoAnswer(response=response) if response is not None else dns.resolver.NoAnswer()
+
+
+class DNSCache:
+    """LRU cache of DNS answers that honors record TTLs.
+
+    Positive answers live until their rrset TTL expires. NXDOMAIN and NoAnswer
+    results are cached as negative entries for the SOA minimum of the zone.
+    Other failures (timeouts, SERVFAIL) are never cached.
+
+    With a `shared` SharedCacheClient, entries are also published to the
+    cache shared by the other worker processes, and get_shared() looks there
+    after a local miss.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_ttl: int = 3600, shared=None):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.shared = shared
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, object, Optional[Exception]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self.shared_hits = 0
+
+    @staticmethod
+    def key(qname: str, rdtype: str) -> Tuple[str, str]:
+        return qname.rstrip('.').lower(), rdtype.upper()
+
+    def get(self, qname: str, rdtype: str):
+        """Return a cached answer, re-raise a cached negative result, or return None on a miss"""
+        key = self.key(qname, rdtype)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, answer, error = entry
+        if expires <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if error is not None:
+            self.negative_hits += 1
+            raise error.with_traceback(None)
+        return answer
+
+    async def get_shared(self, qname: str, rdtype: str):
+        """After a local miss: look in the shared cache and keep a hit locally; None on a miss"""
+        if self.shared is None:
+            return None
+        key = self.key(qname, rdtype)
+        found = await self.shared.get('dns:' + '|'.join(key))
+        if found is None:
+            return None
+        data, ttl = found
+        answer, error = unpack_entry(qname, rdtype, data, ttl)
+        self._store(key, ttl, answer, error)
+        self.shared_hits += 1
+        if error is not None:
+            raise error
+        return answer
+
+    def put_answer(self, qname: str, rdtype: str, answer) -> None:
+        ttl = max(0, answer.expiration - time.time())
+        self._publish(self._store(self.key(qname, rdtype), ttl, answer, None), answer, None)
+
+    def put_error(self, qname: str, rdtype: str, error: Exception) -> None:
+        """Cache NXDOMAIN/NoAnswer results; ignore everything else"""
+        if isinstance(error, dns.resolver.NXDOMAIN):
+            ttls = [negative_ttl(response) for response in error.responses().values()]
+            ttls = [ttl for ttl in ttls if ttl is not None]
+            ttl = min(ttls) if ttls else DEFAULT_NEGATIVE_TTL
+        elif isinstance(error, dns.resolver.NoAnswer):
+            ttl = negative_ttl(error.kwargs.get('response'))
+            if ttl is None:
+                ttl = DEFAULT_NEGATIVE_TTL
+        else:
+            return
+        self._publish(self._store(self.key(qname, rdtype), ttl, None, error), None, error)
+
+    def _store(self, key: Tuple[str, str], ttl: float, answer, error: Optional[Exception]) -> Optional[Tuple[Tuple[str, str], float]]:
+        """Store an entry; returns (key, ttl) when it was stored"""
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return None
+        self._entries[key] = (time.time() + ttl, answer, error)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return key, ttl
+
+    def _publish(self, stored: Optional[Tuple[Tuple[str, str], float]], answer, error: Optional[Exception]) -> None:
+        if self.shared is not None and stored is not None:
+            key, ttl = stored
+            self.shared.set('dns:' + '|'.join(key), pack_entry(answer, error), ttl)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'negative_hits': self.negative_hits,
+            'evictions': self.evictions,
+            'shared_hits': self.shared_hits,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,244 @@
+"""Admission control for upstream DNS queries.
+
+Every query the pooled resolver sends first takes a token from a global token
+bucket (queries per second) and then a slot from its upstream's concurrency
+budget. Waiters are served by priority, so interactive checks go ahead of bulk
+audits. The priority comes from a context variable that bulk code paths set
+with `set_priority(BULK)`.
+
+Both limits adapt (AIMD). A SERVFAIL, REFUSED or timeout from an upstream
+halves the global rate and that upstream's concurrency budget, and every
+success wins a little of each back. This backs off an upstream that has
+started rate-limiting us before it turns every answer into an error. A query
+that can't be admitted before its deadline raises QueryThrottled, so callers
+can tell "we held back" from "the record doesn't exist".
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import dns.exception
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+query_priority: ContextVar[int] = ContextVar('dns_query_priority', default=INTERACTIVE)
+
+
+def set_priority(priority: int) -> None:
+    """Set the priority of DNS queries made from the current task (and tasks it starts)"""
+    query_priority.set(priority)
+
+
+class QueryThrottled(dns.exception.DNSException):
+    """The query was held back by the local rate limit or concurrency budget and never sent"""
+    msg = 'DNS query was rate limited locally'
+
+
+class _PriorityWaiters:
+    """Futures waiting for capacity, served lowest priority value first, then FIFO"""
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self) -> bool:
+        """Waiters belong to one event loop; a new loop (asyncio.run in a CLI) starts afresh.
+
+        Returns True when the loop changed."""
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return False
+        self._loop = loop
+        self._heap = []
+        return True
+
+    def push(self, priority: int) -> asyncio.Future:
+        future = self._loop.create_future()
+        heapq.heappush(self._heap, (priority, next(self._sequence), future))
+        return future
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """Next waiter still waiting, or None"""
+        while self._heap:
+            future = heapq.heappop(self._heap)[2]
+            if not future.done():
+                return future
+        return None
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def by_priority(self) -> Dict[str, int]:
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._heap:
+            if not future.done():
+                counts[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return counts
+
+
+async def _wait(future: asyncio.Future, timeout: float, on_cancel) -> None:
+    try:
+        await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise QueryThrottled() from None
+    except asyncio.CancelledError:
+        # Granted just as we were cancelled: hand the capacity back
+        if future.done() and not future.cancelled():
+            on_cancel()
+        raise
+
+
+class TokenBucket:
+    """Global queries-per-second limit whose rate adapts to upstream health"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, min_rate: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else max(1.0, rate / 50)
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.throttled = 0
+        self._waiters = _PriorityWaiters()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_decrease = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        if not self.enabled:
+            return
+        if self._waiters.bind_loop():
+            self._timer = None
+        # Everyone goes through the queue, so capacity always goes to the highest priority waiter
+        future = self._waiters.push(priority)
+        self._release()
+        if future.done():
+            return
+        try:
+            await _wait(future, timeout, self._give_back)
+        except QueryThrottled:
+            self.throttled += 1
+            raise
+
+    def _give_back(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+        self._release()
+
+    def _schedule(self) -> None:
+        if self._timer is None:
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            self._timer = self._waiters._loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._release()
+
+    def _release(self) -> None:
+        self._refill()
+        while self.tokens >= 1:
+            future = self._waiters.pop()
+            if future is None:
+                return
+            self.tokens -= 1
+            future.set_result(None)
+        if self._waiters:
+            self._schedule()
+
+    def decrease(self) -> None:
+        """Halve the rate, at most once a second so one burst of failures counts once"""
+        now = time.monotonic()
+        if not self.enabled or now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, self.rate)
+
+    def increase(self) -> None:
+        if self.enabled and self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def stats(self) -> Dict:
+        return {
+            'rate_limit': self.max_rate,
+            'current_rate': round(self.rate, 2),
+            'waiting': self._waiters.by_priority(),
+            'throttled': self.throttled,
+        }
+
+
+class ConcurrencyBudget:
+    """Queries in flight to one upstream; the limit shrinks on failures and regrows on success"""
+
+    def __init__(self, limit: int, min_limit: int = 4):
+        self.max_limit = limit
+        self.limit = float(limit)
+        self.min_limit = min(min_limit, limit) if limit > 0 else 0
+        self.in_flight = 0
+        self.throttled = 0
+        self._waiters = _PriorityWaiters()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_limit > 0
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        if not self.enabled:
+            return
+        self._waiters.bind_loop()
+        future = self._waiters.push(priority)
+        self._wake()
+        if future.done():
+            return
+        try:
+            await _wait(future, timeout, self.release)
+        except QueryThrottled:
+            self.throttled += 1
+            raise
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        self.in_flight -= 1
+        self._wake()
+
+    def decrease(self) -> None:
+        if self.enabled:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+    def increase(self) -> None:
+        if self.enabled and self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _wake(self) -> None:
+        while self.in_flight < int(self.limit):
+            future = self._waiters.pop()
+            if future is None:
+                return
+            # The slot passes straight to the waiter
+            self.in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            'concurrency_limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'waiting': self._waiters.by_priority(),
+            'throttled': self.throttled,
+        }
@@ -0,0 +1,393 @@
+"""Stub resolver with persistent, pooled transports to configured upstreams.
+
+Each upstream keeps a small pool of connected UDP sockets and one pipelined
+TCP (or DNS-over-TLS) connection that is reused across queries: answers are
+matched to queries by message ID, so many lookups share a socket and a
+truncated answer retried over TCP does not pay a new handshake. Upstreams are
+tried in order of health (recent failures, then smoothed latency); failing
+ones are backed off exponentially. Every query is admitted through
+dns_scheduler's global rate limit and per-upstream concurrency budget.
+
+Nameserver specs: "9.9.9.9", "127.0.0.1:5353", "[2620:fe::fe]:53",
+"tcp://9.9.9.9" (TCP only), "tls://1.1.1.1#cloudflare-dns.com" (DoT, port 853,
+certificate checked against the name after '#').
+"""
+import asyncio
+import secrets
+import ssl
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+
+import profiling
+from dns_scheduler import ConcurrencyBudget, TokenBucket, query_priority
+
+# Advertised EDNS payload size (the DNS Flag Day 2020 recommendation)
+EDNS_PAYLOAD = 1232
+
+
+def parse_nameserver(spec: str) -> Tuple[str, str, int, Optional[str]]:
+    """Split a nameserver spec into (transport, host, port, tls server name)"""
+    transport = 'udp'
+    if '://' in spec:
+        transport, spec = spec.split('://', 1)
+        if transport not in ('udp', 'tcp', 'tls'):
+            raise ValueError(f'Unsupported DNS transport: {transport}')
+    server_name = None
+    if '#' in spec:
+        spec, server_name = spec.split('#', 1)
+    port = 853 if transport == 'tls' else 53
+    if spec.startswith('['):
+        host, _, rest = spec[1:].partition(']')
+        if rest.startswith(':'):
+            port = int(rest[1:])
+    elif spec.count(':') == 1:
+        host, port_text = spec.split(':')
+        port = int(port_text)
+    else:
+        host = spec
+    return transport, host, port, server_name
+
+
+class _UDPChannel(asyncio.DatagramProtocol):
+    """A connected UDP socket multiplexing queries by message ID"""
+
+    def __init__(self):
+        self.transport = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 2:
+            return
+        future = self.pending.get(struct.unpack('!H', data[:2])[0])
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc):
+        # ICMP errors (port unreachable etc.): every outstanding query on this socket is lost
+        self._fail(exc)
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self._fail(exc or ConnectionError('UDP socket closed'))
+
+    def _fail(self, exc):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def exchange(self, wire: bytes, message_id: int, timeout: float) -> bytes:
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        try:
+            self.transport.sendto(wire)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(message_id, None)
+
+
+class _StreamChannel:
+    """One TCP or TLS connection carrying pipelined queries (RFC 7766)"""
+
+    def __init__(self, host: str, port: int, ssl_context: Optional[ssl.SSLContext], server_name: Optional[str]):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.server_name = server_name
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.closed = False
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self, timeout: float) -> None:
+        reader, self._writer = await asyncio.wait_for(asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context,
+            server_hostname=(self.server_name or self.host) if self.ssl_context else None,
+        ), timeout)
+        self._reader_task = asyncio.ensure_future(self._read_loop(reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        error: Exception = ConnectionError('DNS connection closed by upstream')
+        try:
+            while True:
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+                data = await reader.readexactly(length)
+                future = self.pending.get(struct.unpack('!H', data[:2])[0]) if length >= 2 else None
+                if future is not None and not future.done():
+                    future.set_result(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(str(e) or type(e).__name__)
+        finally:
+            self.close(error)
+
+    async def exchange(self, wire: bytes, message_id: int, timeout: float) -> bytes:
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        try:
+            self._writer.write(struct.pack('!H', len(wire)) + wire)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(message_id, None)
+
+    def close(self, error: Optional[Exception] = None) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error or ConnectionError('DNS connection closed'))
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+
+
+class Upstream:
+    """One upstream nameserver with its socket pool and health state"""
+
+    def __init__(self, spec: str, udp_sockets: int = 4, max_in_flight: int = 0):
+        self.spec = spec
+        self.transport, self.host, self.port, self.server_name = parse_nameserver(spec)
+        self.udp_sockets = udp_sockets
+        self.budget = ConcurrencyBudget(max_in_flight)
+        self.ssl_context = ssl.create_default_context() if self.transport == 'tls' else None
+        # Health: smoothed latency, failures since the last success, and backoff deadline
+        self.latency = 0.05
+        self.failures = 0
+        self.down_until = 0.0
+        self.queries = 0
+        self.errors = 0
+        self._loop = None
+        self._udp: List[_UDPChannel] = []
+        self._next_udp = 0
+        self._stream: Optional[_StreamChannel] = None
+        self._stream_lock: Optional[asyncio.Lock] = None
+        self._udp_lock: Optional[asyncio.Lock] = None
+
+    def _bind_loop(self) -> None:
+        # Sockets belong to one event loop; callers like audit_cli run several in sequence
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._udp = []
+            self._stream = None
+            self._stream_lock = asyncio.Lock()
+            self._udp_lock = asyncio.Lock()
+
+    async def _udp_channel(self) -> _UDPChannel:
+        if len(self._udp) < self.udp_sockets or any(channel.closed for channel in self._udp):
+            async with self._udp_lock:
+                self._udp = [channel for channel in self._udp if not channel.closed]
+                if len(self._udp) < self.udp_sockets:
+                    _, channel = await self._loop.create_datagram_endpoint(
+                        _UDPChannel, remote_addr=(self.host, self.port))
+                    self._udp.append(channel)
+                    return channel
+        # Spread queries (and source ports) across the pool
+        self._next_udp = (self._next_udp + 1) % len(self._udp)
+        return self._udp[self._next_udp]
+
+    async def _stream_channel(self, timeout: float) -> Tuple[_StreamChannel, bool]:
+        """Return (channel, reused); opens a connection if none is usable"""
+        async with self._stream_lock:
+            if self._stream is not None and not self._stream.closed:
+                return self._stream, True
+            channel = _StreamChannel(self.host, self.port, self.ssl_context, self.server_name)
+            await channel.connect(timeout)
+            self._stream = channel
+            return channel, False
+
+    async def exchange(self, query: dns.message.Message, timeout: float) -> dns.message.Message:
+        """Send a query (UDP first unless configured otherwise) and return the matching response"""
+        self._bind_loop()
+        self.queries += 1
+        if self.transport == 'udp':
+            channel = await self._udp_channel()
+            response = await self._exchange_on(channel, query, timeout)
+            if not response.flags & dns.flags.TC:
+                return response
+        while True:
+            channel, reused = await self._stream_channel(timeout)
+            try:
+                return await self._exchange_on(channel, query, timeout)
+            except ConnectionError:
+                # The upstream may have closed an idle connection just as we wrote to it
+                if not reused:
+                    raise
+
+    async def _exchange_on(self, channel, query: dns.message.Message, timeout: float) -> dns.message.Message:
+        message_id = secrets.randbelow(65536)
+        while message_id in channel.pending:
+            message_id = secrets.randbelow(65536)
+        query.id = message_id
+        data = await channel.exchange(query.to_wire(), message_id, timeout)
+        response = dns.message.from_wire(data)
+        if not query.is_response(response):
+            raise dns.exception.FormError('Response does not match the query')
+        return response
+
+    def record_success(self, elapsed: float) -> None:
+        self.latency = 0.8 * self.latency + 0.2 * elapsed
+        self.failures = 0
+        self.down_until = 0.0
+        self.budget.increase()
+
+    def record_failure(self) -> None:
+        self.errors += 1
+        self.failures += 1
+        self.down_until = time.monotonic() + min(30.0, 0.25 * 2 ** self.failures)
+        self.budget.decrease()
+
+    def available(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def close(self) -> None:
+        for channel in self._udp:
+            if channel.transport is not None:
+                channel.transport.close()
+        if self._stream is not None:
+            self._stream.close()
+        self._udp = []
+        self._stream = None
+
+    def stats(self) -> Dict:
+        return {
+            'nameserver': self.spec,
+            'transport': self.transport,
+            'latency_ms': round(self.latency * 1000, 2),
+            'consecutive_failures': self.failures,
+            'backing_off': not self.available(time.monotonic()),
+            'queries': self.queries,
+            'errors': self.errors,
+            **self.budget.stats(),
+        }
+
+
+class PooledResolver:
+    """Async stub resolver over persistent upstream connections.
+
+    resolve() behaves like dns.asyncresolver.Resolver.resolve(): it returns a
+    dns.resolver.Answer and raises NXDOMAIN, NoAnswer, NoNameservers or
+    LifetimeTimeout, or QueryThrottled when the query could not be admitted
+    before its lifetime ran out. `rate_limit` (queries per second) and
+    `upstream_concurrency` of 0 disable the respective limit.
+    """
+
+    def __init__(self, nameservers: List[str], timeout: float = 2.0, lifetime: float = 5.0, udp_sockets: int = 4,
+                 rate_limit: float = 0, rate_burst: Optional[float] = None, upstream_concurrency: int = 0):
+        self.timeout = timeout
+        self.lifetime = lifetime
+        self.udp_sockets = udp_sockets
+        self.upstream_concurrency = upstream_concurrency
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+        self.in_flight = 0
+        self.set_nameservers(nameservers)
+
+    def set_nameservers(self, nameservers: List[str]) -> None:
+        if not nameservers:
+            raise ValueError('At least one nameserver is required')
+        for upstream in getattr(self, 'upstreams', []):
+            upstream.close()
+        self.upstreams = [Upstream(spec, self.udp_sockets, self.upstream_concurrency) for spec in nameservers]
+
+    @property
+    def nameservers(self) -> List[str]:
+        return [upstream.spec for upstream in self.upstreams]
+
+    def _ordered_upstreams(self) -> List[Upstream]:
+        now = time.monotonic()
+        healthy = sorted((u for u in self.upstreams if u.available(now)), key=lambda u: u.latency)
+        # Backed-off upstreams are still tried, soonest-to-recover first, rather than failing outright
+        resting = sorted((u for u in self.upstreams if not u.available(now)), key=lambda u: u.down_until)
+        return healthy + resting
+
+    async def resolve(self, qname: str, rdtype: str) -> dns.resolver.Answer:
+        self.in_flight += 1
+        try:
+            return await self._resolve(qname, rdtype)
+        finally:
+            self.in_flight -= 1
+
+    async def _resolve(self, qname: str, rdtype: str) -> dns.resolver.Answer:
+        name = dns.name.from_text(qname)
+        rdtype_value = dns.rdatatype.from_text(rdtype)
+        query = dns.message.make_query(name, rdtype_value, use_edns=0, payload=EDNS_PAYLOAD)
+        deadline = time.monotonic() + self.lifetime
+        priority = query_priority.get()
+        errors = []
+
+        while True:
+            for upstream in self._ordered_upstreams():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise dns.resolver.LifetimeTimeout(timeout=self.lifetime, errors=errors)
+                # Raises QueryThrottled if no token or upstream slot frees up in time
+                await self.rate_limiter.acquire(priority, remaining)
+                await upstream.budget.acquire(priority, deadline - time.monotonic())
+                started = time.monotonic()
+                try:
+                    response = await upstream.exchange(query, min(self.timeout, max(0.0, deadline - started)))
+                except (asyncio.TimeoutError, OSError, EOFError, dns.exception.DNSException) as e:
+                    upstream.record_failure()
+                    self.rate_limiter.decrease()
+                    errors.append((upstream.spec, upstream.transport != 'udp', upstream.port, e, None))
+                    continue
+                finally:
+                    upstream.budget.release()
+                    profiling.annotate(upstream=upstream.spec, attempts=len(errors) + 1)
+
+                rcode = response.rcode()
+                if rcode in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                    self.rate_limiter.increase()
+                if rcode == dns.rcode.NOERROR:
+                    upstream.record_success(time.monotonic() - started)
+                    answer = dns.resolver.Answer(name, rdtype_value, dns.rdataclass.IN, response,
+                                                 upstream.host, upstream.port)
+                    if answer.rrset is None:
+                        raise dns.resolver.NoAnswer(response=response)
+                    return answer
+                if rcode == dns.rcode.NXDOMAIN:
+                    upstream.record_success(time.monotonic() - started)
+                    raise dns.resolver.NXDOMAIN(qnames=[name], responses={name: response})
+                # SERVFAIL, REFUSED, ...: this upstream can't help (or is shedding our load), try the next one
+                upstream.record_failure()
+                self.rate_limiter.decrease()
+                errors.append((upstream.spec, upstream.transport != 'udp', upstream.port,
+                               dns.rcode.to_text(rcode), response))
+            if all(isinstance(error[3], str) for error in errors[-len(self.upstreams):]):
+                # Every upstream answered with an error rcode; retrying won't change that
+                raise dns.resolver.NoNameservers(request=query, errors=errors)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise dns.resolver.LifetimeTimeout(timeout=self.lifetime, errors=errors)
+            # Every upstream failed this round; pause briefly rather than spin on instant errors
+            await asyncio.sleep(min(0.1, remaining))
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for queries in flight; returns how many are still running"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return self.in_flight
+
+    def close(self) -> None:
+        for upstream in self.upstreams:
+            upstream.close()
+
+    def stats(self) -> List[Dict]:
+        return [upstream.stats() for upstream in self.upstreams]
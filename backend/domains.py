@@ -0,0 +1,58 @@
+import re
+from functools import lru_cache
+
+# Longest input we are willing to look at (URLs included); a hostname is at most 253
+MAX_INPUT_LENGTH = 2048
+MAX_DOMAIN_LENGTH = 253
+
+# Every pattern is anchored and free of nested quantifiers, so matching is linear
+_SCHEME = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]{0,31}://')
+_PATH_START = re.compile(r'[/?#\\]')
+_LABEL = re.compile(r'[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?')
+_TLD = re.compile(r'[a-z]{2,63}|xn--[a-z0-9-]{1,59}')
+
+
+def normalize_domain(value: str) -> str:
+    """Turn user input (bare domain, URL, mixed case, IDN) into a lowercase ASCII domain.
+
+    Strips any scheme, credentials, path, query, port and trailing dot, then
+    IDNA-encodes and validates each label. Raises ValueError on invalid input.
+    """
+    if len(value) > MAX_INPUT_LENGTH:
+        raise ValueError('Invalid domain format')
+    return _normalize(value)
+
+
+@lru_cache(maxsize=4096)
+def _normalize(value: str) -> str:
+    host = value.strip()
+    scheme = _SCHEME.match(host)
+    if scheme:
+        host = host[scheme.end():]
+    path = _PATH_START.search(host)
+    if path:
+        host = host[:path.start()]
+    host = host.rpartition('@')[2]
+    if ':' in host:
+        host, _, port = host.rpartition(':')
+        if port and not port.isdigit():
+            raise ValueError('Invalid domain format')
+    if host.endswith('.'):
+        host = host[:-1]
+    host = host.lower()
+
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            raise ValueError('Invalid domain format')
+
+    if not host or len(host) > MAX_DOMAIN_LENGTH:
+        raise ValueError('Invalid domain format')
+    labels = host.split('.')
+    if len(labels) < 2 or not _TLD.fullmatch(labels[-1]):
+        raise ValueError('Invalid domain format')
+    for label in labels[:-1]:
+        if not _LABEL.fullmatch(label):
+            raise ValueError('Invalid domain format')
+    return host
@@ -0,0 +1,194 @@
+"""Industry ROI benchmarks used by the revenue calculator.
+
+Benchmarks live in a versioned JSON file (data/industry_benchmarks.json):
+
+    {
+      "version": "2026-10-17.1",
+      "regions": {"global": "Global", "europe": "Europe", ...},
+      "industries": {
+        "fashion": {"name": "Fashion & Apparel", "email_roi": 25, "sms_roi": 20,
+                    "regions": {"europe": {"email_roi": 23}}},
+        "fashion.footwear": {"name": "Footwear", "parent": "fashion", "sms_roi": 18}
+      }
+    }
+
+ROI figures are percentages of total revenue. A sub-vertical names its
+`parent` and inherits any figure it does not set, and a region override
+inherits from the industry's global figures. The file is resolved once into
+a BenchmarkTable, an immutable mapping of every (industry, region) pair, so a
+lookup is one dict access however large the table grows. BenchmarkStore
+swaps in a new table when the file changes. A file that fails validation
+is logged and ignored, and the previous table stays in service.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = 'global'
+FIGURES = ('email_roi', 'sms_roi')
+
+
+@dataclass(frozen=True, slots=True)
+class Benchmark:
+    industry: str
+    name: str
+    region: str  # the region the figures come from; DEFAULT_REGION when the requested one has no override
+    email_roi: float
+    sms_roi: float
+
+
+class BenchmarkTable:
+    """Resolved benchmarks of one data file version; never modified after construction"""
+
+    def __init__(self, version: str, regions: Mapping[str, str], entries: Dict[Tuple[str, str], Benchmark]):
+        self.version = version
+        self.regions = MappingProxyType(dict(regions))
+        self._entries = MappingProxyType(entries)
+        self.industries: Tuple[str, ...] = tuple(industry for industry, region in entries if region == DEFAULT_REGION)
+
+    def get(self, industry: str, region: str = DEFAULT_REGION) -> Optional[Benchmark]:
+        return self._entries.get((industry, region))
+
+    def __len__(self) -> int:
+        return len(self.industries)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BenchmarkTable':
+        """Validate and resolve a parsed data file; raises ValueError describing the first problem"""
+        if not isinstance(data, dict):
+            raise ValueError('Benchmark data must be a JSON object')
+        version = data.get('version')
+        if not isinstance(version, str) or not version:
+            raise ValueError('Benchmark data needs a version string')
+        regions = data.get('regions') or {DEFAULT_REGION: 'Global'}
+        if not isinstance(regions, dict) or not all(isinstance(name, str) for name in regions.values()):
+            raise ValueError('Benchmark regions must be an object of region names')
+        if DEFAULT_REGION not in regions:
+            raise ValueError(f'Benchmark regions must include {DEFAULT_REGION!r}')
+        industries = data.get('industries')
+        if not isinstance(industries, dict) or not industries:
+            raise ValueError('Benchmark data has no industries')
+        for key, raw in industries.items():
+            if not isinstance(raw, dict):
+                raise ValueError(f'Industry {key!r} must be an object')
+            if 'parent' in raw and not isinstance(raw['parent'], str):
+                raise ValueError(f'Industry {key!r} needs a string parent')
+            if not isinstance(raw.get('regions') or {}, dict):
+                raise ValueError(f'Industry {key!r} needs an object of regional figures')
+
+        resolved: Dict[str, Dict] = {}
+
+        def resolve(key: str, seen: Tuple[str, ...] = ()) -> Dict:
+            if key in resolved:
+                return resolved[key]
+            if key in seen:
+                raise ValueError(f"Industry parent cycle: {' -> '.join(seen + (key,))}")
+            raw = industries.get(key)
+            if not isinstance(raw, dict):
+                raise ValueError(f'Unknown industry {key!r}' + (f' (parent of {seen[-1]!r})' if seen else ''))
+            parent = resolve(raw['parent'], seen + (key,)) if raw.get('parent') else {}
+            entry = {
+                'name': raw.get('name', parent.get('name')),
+                **{figure: raw.get(figure, parent.get(figure)) for figure in FIGURES},
+                # Regional figures are inherited from the parent too, then overridden field by field
+                'regions': {region: dict(figures) for region, figures in parent.get('regions', {}).items()},
+            }
+            for region, figures in (raw.get('regions') or {}).items():
+                if region not in regions or region == DEFAULT_REGION:
+                    raise ValueError(f'Industry {key!r} has figures for unknown region {region!r}')
+                if not isinstance(figures, dict):
+                    raise ValueError(f'Industry {key!r} needs an object of figures for region {region!r}')
+                entry['regions'].setdefault(region, {}).update(figures)
+            if not isinstance(entry['name'], str) or not entry['name']:
+                raise ValueError(f'Industry {key!r} has no name')
+            resolved[key] = entry
+            return entry
+
+        entries: Dict[Tuple[str, str], Benchmark] = {}
+        for key in industries:
+            entry = resolve(key)
+            for region in regions:
+                override = entry['regions'].get(region) if region != DEFAULT_REGION else None
+                figures = {figure: (override or {}).get(figure, entry[figure]) for figure in FIGURES}
+                for figure, value in figures.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 100:
+                        raise ValueError(f'Industry {key!r} ({region}) needs {figure} between 0 and 100, got {value!r}')
+                entries[(key, region)] = Benchmark(
+                    industry=key,
+                    name=entry['name'],
+                    region=region if override else DEFAULT_REGION,
+                    **figures,
+                )
+        return cls(version, regions, entries)
+
+
+def load_table(path: str) -> BenchmarkTable:
+    with open(path) as f:
+        return BenchmarkTable.from_dict(json.load(f))
+
+
+class BenchmarkStore:
+    """The current BenchmarkTable, replaced whenever the data file changes.
+
+    Handlers read `store.table` once per request and use that table
+    throughout, so a reload never mixes two versions in one response.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._signature = self._file_signature()
+        # A broken file at startup is a deployment error: fail loudly
+        self.table = load_table(path)
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def reload_if_changed(self) -> bool:
+        """Load the file again if it changed since the last load; returns True when a new table is in use"""
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            table = load_table(self.path)
+        except (OSError, ValueError) as e:
+            self.reload_errors += 1
+            logger.warning(f"Keeping industry benchmarks {self.table.version}; {self.path} is invalid: {e}")
+            return False
+        self.table = table
+        self.reloads += 1
+        logger.info(f"Loaded industry benchmarks {table.version} ({len(table)} industries)")
+        return True
+
+    async def watch(self, interval: float) -> None:
+        """Check the file every `interval` seconds; parsing runs off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.reload_if_changed)
+            except Exception:
+                # Whatever went wrong, the next change to the file still has to be picked up
+                self.reload_errors += 1
+                logger.exception(f"Error reloading industry benchmarks from {self.path}")
+
+    def stats(self) -> Dict:
+        return {
+            'version': self.table.version,
+            'industries': len(self.table),
+            'regions': list(self.table.regions),
+            'reloads': self.reloads,
+            'reload_errors': self.reload_errors,
+        }
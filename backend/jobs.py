@@ -0,0 +1,382 @@
+"""Background jobs for bulk audits too large for one HTTP request.
+
+A job is a list of domains submitted once and checked in the background.
+Clients poll its status or follow it over server-sent events, and download
+the results as gzipped JSONL when it finishes.
+
+Jobs and their per-domain results live in SQLite, not in memory:
+
+* Any worker process can answer for any job.
+* A job interrupted by a restart resumes from its last flushed result.
+* The table of queued jobs is the queue. Submitting beyond `max_queued` is
+  refused, and the API turns that into a 429.
+
+Each process runs a JobManager. It claims queued jobs atomically, runs at most
+`workers` of them at a time, and checks each job's domains `concurrency` at a
+time. Results are flushed in batches. Each flush also acts as the job's
+heartbeat. A running job whose heartbeat stops (its process died) is
+requeued after `stale_after` seconds.
+
+On completion the results are written to <directory>/<job id>.jsonl.gz in
+submission order, and the per-domain rows are dropped.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+# Domains read from the database at a time, and results written per flush
+PENDING_BATCH = 1000
+FLUSH_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_domains (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    domain TEXT NOT NULL,
+    result BLOB,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+JOB_FIELDS = ('id', 'status', 'total', 'done', 'errors', 'created_at', 'started_at', 'finished_at', 'error')
+
+
+class QueueFull(Exception):
+    """Too many jobs are waiting; the caller should retry later"""
+
+
+class JobStore:
+    """SQLite job state; every method is blocking and meant for JobManager's database thread"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, 'jobs.db')
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        # Several worker processes share the file
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA busy_timeout=5000')
+        self.db.executescript(SCHEMA)
+
+    def results_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f'{job_id}.jsonl.gz')
+
+    def create(self, items: List[Tuple[str, Optional[bytes]]], max_queued: int) -> Dict:
+        """Store a new queued job from (domain, result line) items in submission order.
+
+        Items with a result line (say, a domain that failed validation) are
+        already done; the others are checked. Results keep the items' order.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        done = sum(1 for _, result in items if result is not None)
+        with self.db:
+            queued = self.db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (QUEUED,)).fetchone()[0]
+            if queued >= max_queued:
+                raise QueueFull(f'{queued} jobs are already queued')
+            self.db.execute(
+                'INSERT INTO jobs (id, status, total, done, errors, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, QUEUED, len(items), done, done, now, now),
+            )
+            self.db.executemany(
+                'INSERT INTO job_domains (job_id, position, domain, result) VALUES (?, ?, ?, ?)',
+                [(job_id, position, domain, result) for position, (domain, result) in enumerate(items)],
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self.db.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+
+    def claim(self, owner: str) -> Optional[str]:
+        """Take the oldest queued job for `owner`; None when nothing is queued"""
+        now = time.time()
+        with self.db:
+            row = self.db.execute(
+                'SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1', (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            claimed = self.db.execute(
+                'UPDATE jobs SET status = ?, owner = ?, started_at = COALESCE(started_at, ?), updated_at = ? '
+                'WHERE id = ? AND status = ?',
+                (RUNNING, owner, now, now, row[0], QUEUED),
+            ).rowcount
+        return row[0] if claimed else None
+
+    def requeue_stale(self, stale_before: float) -> int:
+        """Put back running jobs whose owner stopped reporting progress"""
+        with self.db:
+            return self.db.execute(
+                'UPDATE jobs SET status = ?, owner = NULL WHERE status = ? AND updated_at < ?',
+                (QUEUED, RUNNING, stale_before),
+            ).rowcount
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Hand a running job back to the queue (this process is shutting down)"""
+        with self.db:
+            self.db.execute(
+                'UPDATE jobs SET status = ?, owner = NULL WHERE id = ? AND owner = ? AND status = ?',
+                (QUEUED, job_id, owner, RUNNING),
+            )
+
+    def pending(self, job_id: str, after: int, limit: int) -> List[Tuple[int, str]]:
+        return self.db.execute(
+            'SELECT position, domain FROM job_domains WHERE job_id = ? AND position > ? AND result IS NULL '
+            'ORDER BY position LIMIT ?',
+            (job_id, after, limit),
+        ).fetchall()
+
+    def record(self, job_id: str, owner: str, results: List[Tuple[int, bytes, bool]]) -> bool:
+        """Store (position, line, failed) results and beat the heartbeat; False if the job is no longer ours"""
+        with self.db:
+            still_ours = self.db.execute(
+                'UPDATE jobs SET done = done + ?, errors = errors + ?, updated_at = ? '
+                'WHERE id = ? AND owner = ? AND status = ?',
+                (len(results), sum(1 for _, _, failed in results if failed), time.time(), job_id, owner, RUNNING),
+            ).rowcount
+            if not still_ours:
+                return False
+            self.db.executemany(
+                'UPDATE job_domains SET result = ? WHERE job_id = ? AND position = ?',
+                [(line, job_id, position) for position, line, _ in results],
+            )
+        return True
+
+    def export(self, job_id: str) -> str:
+        """Write the results file; opens its own connection so the database thread stays free"""
+        path = self.results_path(job_id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        db = sqlite3.connect(self.path)
+        try:
+            rows = db.execute(
+                'SELECT result FROM job_domains WHERE job_id = ? ORDER BY position', (job_id,))
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                for (line,) in rows:
+                    f.write(line)
+        finally:
+            db.close()
+        os.replace(tmp_path, path)
+        return path
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None) -> None:
+        with self.db:
+            finished = self.db.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ?, owner = NULL '
+                'WHERE id = ? AND owner = ? AND status = ?',
+                (status, error, time.time(), time.time(), job_id, owner, RUNNING),
+            ).rowcount
+            if finished:
+                self.db.execute('DELETE FROM job_domains WHERE job_id = ?', (job_id,))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; its owner notices at the next flush"""
+        with self.db:
+            cancelled = self.db.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, updated_at = ?, owner = NULL '
+                'WHERE id = ? AND status IN (?, ?)',
+                (CANCELLED, time.time(), time.time(), job_id, QUEUED, RUNNING),
+            ).rowcount
+            if cancelled:
+                self.db.execute('DELETE FROM job_domains WHERE job_id = ?', (job_id,))
+        return bool(cancelled)
+
+    def expire(self, finished_before: float) -> List[str]:
+        """Forget jobs that finished before `finished_before`; returns their ids"""
+        with self.db:
+            expired = [row[0] for row in self.db.execute(
+                'SELECT id FROM jobs WHERE finished_at < ?', (finished_before,))]
+            self.db.executemany('DELETE FROM jobs WHERE id = ?', ((job_id,) for job_id in expired))
+            self.db.executemany('DELETE FROM job_domains WHERE job_id = ?', ((job_id,) for job_id in expired))
+        return expired
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+class JobManager:
+    """Runs the queued jobs of a JobStore in this process.
+
+    `check(domain)` returns (JSON line, failed) for one domain.
+    """
+
+    def __init__(self, directory: str, check: Callable[[str], Awaitable[Tuple[bytes, bool]]],
+                 workers: int = 2, concurrency: int = 50, max_queued: int = 20,
+                 retention: float = 7 * 86400, stale_after: float = 60, poll_interval: float = 2.0):
+        self.check = check
+        self.workers = workers
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.retention = retention
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        # sqlite3 calls block; they run one at a time on this thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jobs-db')
+        self.store = JobStore(directory)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def _db(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    async def submit(self, items: List[Tuple[str, Optional[bytes]]]) -> Dict:
+        """Queue a job (see JobStore.create); raises QueueFull when `max_queued` jobs are already waiting"""
+        job = await self._db(self.store.create, items, self.max_queued)
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self._db(self.store.get, job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        return await self._db(self.store.cancel, job_id)
+
+    def results_path(self, job_id: str) -> str:
+        return self.store.results_path(job_id)
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self, timeout: float) -> None:
+        """Stop claiming jobs and hand running ones back to the queue after flushing their results"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        for task in self._running.values():
+            task.cancel()
+        if self._running:
+            await asyncio.wait(list(self._running.values()), timeout=timeout)
+
+    async def _dispatch(self) -> None:
+        last_expiry = 0.0
+        while True:
+            try:
+                now = time.time()
+                await self._db(self.store.requeue_stale, now - self.stale_after)
+                if now - last_expiry > 3600:
+                    last_expiry = now
+                    for job_id in await self._db(self.store.expire, now - self.retention):
+                        self._remove_results(job_id)
+                while len(self._running) < self.workers:
+                    job_id = await self._db(self.store.claim, self.owner)
+                    if job_id is None:
+                        break
+                    task = asyncio.ensure_future(self._run_job(job_id))
+                    self._running[job_id] = task
+                    task.add_done_callback(lambda _, job_id=job_id: self._job_done(job_id))
+            except sqlite3.Error as e:
+                logger.error(f"Job dispatcher database error: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _job_done(self, job_id: str) -> None:
+        self._running.pop(job_id, None)
+        if self._wake is not None:
+            self._wake.set()  # a worker slot is free
+
+    def _remove_results(self, job_id: str) -> None:
+        try:
+            os.unlink(self.results_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    async def _run_job(self, job_id: str) -> None:
+        logger.info(f"Job {job_id} started")
+        results: List[Tuple[int, bytes, bool]] = []
+        pending = set()
+
+        async def flush() -> bool:
+            nonlocal results
+            batch, results = results, []
+            return await self._db(self.store.record, job_id, self.owner, batch)
+
+        async def check(position: int, domain: str) -> Tuple[int, bytes, bool]:
+            line, failed = await self.check(domain)
+            return position, line, failed
+
+        try:
+            ours = True
+            last_flush = time.monotonic()
+            rows = deque(await self._db(self.store.pending, job_id, -1, PENDING_BATCH))
+            while ours and (rows or pending):
+                while rows and len(pending) < self.concurrency:
+                    position, domain = rows.popleft()
+                    pending.add(asyncio.ensure_future(check(position, domain)))
+                    if not rows:
+                        rows.extend(await self._db(self.store.pending, job_id, position, PENDING_BATCH))
+                # Wake at least once a second so the heartbeat keeps going through slow checks
+                done, pending = await asyncio.wait(pending, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+                results.extend(task.result() for task in done)
+                if len(results) >= FLUSH_BATCH or time.monotonic() - last_flush >= 1.0:
+                    ours = await flush()
+                    last_flush = time.monotonic()
+            if ours:
+                ours = await flush()
+            if not ours:
+                logger.info(f"Job {job_id} was cancelled or taken over; stopping")
+                for task in pending:
+                    task.cancel()
+                return
+            await asyncio.get_running_loop().run_in_executor(None, self.store.export, job_id)
+            await self._db(self.store.finish, job_id, self.owner, COMPLETED)
+            logger.info(f"Job {job_id} completed")
+        except asyncio.CancelledError:
+            # Shutting down: keep what is finished and let the next start resume the rest
+            for task in pending:
+                task.cancel()
+            if results:
+                await flush()
+            await self._db(self.store.release, job_id, self.owner)
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            for task in pending:
+                task.cancel()
+            await self._db(self.store.finish, job_id, self.owner, FAILED, str(e))
+
+    async def stats(self) -> Dict:
+        counts = await self._db(self.store.counts)
+        return {
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'running_here': len(self._running),
+            'completed': counts.get(COMPLETED, 0),
+            'failed': counts.get(FAILED, 0),
+            'max_queued': self.max_queued,
+        }
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Production launcher: several uvicorn workers with one shared cache.
+
+Runs the API in `--workers` processes (default: one per core) behind a single
+listening socket. With more than one worker, the launcher also starts a
+shared_cache server process and points the workers at it, so DNS answers and
+reports computed by one worker serve the others. The global DNS rate limit is
+split evenly between the workers.
+
+The DKIM selector index file is shared too: each worker merges what it
+learned into the file when saving (see dkim_index) and picks up the others'.
+
+/metrics and /api/health report the process that answers the request, so
+with several workers a scrape through the shared port sees a random worker's
+counters (the health response names it in `worker_pid`). Where exact
+totals matter, run one worker per port and scrape each port.
+
+SIGTERM or Ctrl-C shuts down gracefully. Workers stop accepting connections,
+finish open requests (up to --graceful-timeout seconds) and drain in-flight
+DNS work. The cache server is stopped after all workers have exited.
+
+    python launcher.py --workers 8 --port 8001
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import uvicorn
+
+from shared_cache import run_server
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_for_socket(path: str, process: multiprocessing.Process, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            sys.exit(f'Shared cache server exited with code {process.exitcode}')
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(path)
+                return
+        except OSError:
+            time.sleep(0.05)
+    sys.exit(f'Shared cache server did not start listening on {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the API with multiple workers and a shared cache')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument('--backlog', type=int, default=int(os.environ.get('BACKLOG', '2048')),
+                        help='Pending connections the kernel queues before refusing new ones')
+    parser.add_argument('--keep-alive', type=int, default=int(os.environ.get('KEEP_ALIVE', '75')),
+                        help='Idle keep-alive seconds; keep this above the load balancer idle timeout')
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('GRACEFUL_TIMEOUT', '30')),
+                        help='Seconds open requests get to finish on shutdown')
+    parser.add_argument('--cache-socket', default=os.environ.get('SHARED_CACHE_SOCKET', ''),
+                        help='Unix socket for the shared cache (default: a per-port path in /tmp)')
+    parser.add_argument('--cache-size', type=int, default=int(os.environ.get('SHARED_CACHE_SIZE', '200000')))
+    parser.add_argument('--cache-mb', type=int, default=int(os.environ.get('SHARED_CACHE_MAX_MB', '256')))
+    parser.add_argument('--no-shared-cache', action='store_true', help='Give every worker only its own caches')
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    # Workers inherit the environment, so per-worker settings travel through it
+    rate_limit = float(os.environ.get('DNS_RATE_LIMIT', '2000'))
+    os.environ['DNS_RATE_LIMIT'] = str(rate_limit / workers)
+    if 'DNS_RATE_BURST' in os.environ:
+        os.environ['DNS_RATE_BURST'] = str(float(os.environ['DNS_RATE_BURST']) / workers)
+
+    cache_server = None
+    if workers > 1 and not args.no_shared_cache:
+        path = args.cache_socket or f'/tmp/deliverability-cache-{args.port}.sock'
+        cache_server = multiprocessing.Process(
+            target=run_server, args=(path, args.cache_size, args.cache_mb * 1024 * 1024), name='shared-cache')
+        cache_server.start()
+        wait_for_socket(path, cache_server)
+        os.environ['SHARED_CACHE_SOCKET'] = path
+    else:
+        os.environ.pop('SHARED_CACHE_SOCKET', None)
+
+    try:
+        uvicorn.run(
+            'server:app',
+            app_dir=BACKEND_DIR,
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout,
+        )
+    finally:
+        if cache_server is not None:
+            cache_server.terminate()
+            cache_server.join(5)
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Minimal Prometheus-compatible metrics (text exposition format 0.0.4).
+
+Instruments are module-level, like prometheus_client's, so any module can
+import and update them. Updates happen on the event loop thread, so no locking.
+"""
+import bisect
+import math
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or computed at scrape time with set_function"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Callable[[], Dict[Tuple[str, ...], float]] = None
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """Sum across all label sets"""
+        return sum(self._values.values())
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """function() returns {label values tuple: value}; use {(): value} without labels"""
+        self._function = function
+
+    def samples(self):
+        values = self._function() if self._function else self._values
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (non-cumulative) + overflow, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class RecentOutcomes:
+    """Success/failure counts over a sliding window, in one-second buckets"""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self._buckets = deque()  # [second, ok, failed]
+
+    def record(self, ok: bool) -> None:
+        now = int(time.time())
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+            self._expire(now)
+        self._buckets[-1][1 if ok else 2] += 1
+
+    def _expire(self, now: int) -> None:
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+
+    def totals(self) -> Tuple[int, int]:
+        self._expire(int(time.time()))
+        return sum(b[1] for b in self._buckets), sum(b[2] for b in self._buckets)
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', ('method', 'path', 'status'))
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served', ('path',))
+CHECK_DURATION = Histogram(
+    'deliverability_check_duration_seconds', 'Latency of each deliverability check', ('check',))
+CHECK_RESULTS = Counter(
+    'deliverability_check_results_total', 'Deliverability check outcomes', ('check', 'outcome'))
+DNS_QUERY_DURATION = Histogram(
+    'dns_query_duration_seconds', 'Upstream DNS query latency (cache misses only)', ('rdtype',))
+DNS_QUERY_ERRORS = Counter(
+    'dns_query_errors_total', 'Upstream DNS queries that did not return an answer', ('rdtype', 'error'))
+DNS_QUERIES_IN_FLIGHT = Gauge(
+    'dns_queries_in_flight', 'Upstream DNS queries currently waiting for an answer')
+BULK_CHECKS_IN_FLIGHT = Gauge(
+    'bulk_checks_in_flight', 'Domains currently being checked for bulk requests')
+CACHE_HIT_RATIO = Gauge(
+    'cache_hit_ratio', 'Hit ratio since startup', ('cache',))
+CACHE_ENTRIES = Gauge(
+    'cache_entries', 'Entries currently cached', ('cache',))
+DNS_RATE_LIMIT = Gauge(
+    'dns_rate_limit_qps', 'Current adaptive limit on upstream DNS queries per second')
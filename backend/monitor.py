@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Incremental deliverability monitoring for a large, mostly unchanging domain list.
+
+Every DNS answer a domain's checks used is kept in SQLite along with its TTL,
+together with the domain's last check results and the DKIM selector that
+matched. A cycle only revisits domains with an expired or previously failed
+record. Within those domains, only those records are queried again; the rest
+are replayed from the snapshot, and the known DKIM selector is tried before
+any others. Only differences from the previous snapshot are written out, as
+JSON lines:
+
+    {"type": "added",   "domain": ..., "overall_score": 83, "failed": ["dkim"]}
+    {"type": "changed", "domain": ..., "overall_score": {"before": 83, "after": 100},
+     "checks": [{"id": "dkim", "before": {...}, "after": {...}}],
+     "records": [{"qname": ..., "rdtype": "TXT", "before": {...}, "after": {...}}]}
+    {"type": "removed", "domain": ...}
+
+DNS traffic therefore follows TTL expiry and changes, not the fleet size. Many
+zones use TTLs of a few minutes, which would bring every domain back each
+hourly cycle. --min-ttl holds snapshots at least that long (by default, one
+interval).
+
+    python monitor.py domains.txt --db monitor.db --events changes.jsonl --interval 3600
+    python monitor.py domains.txt --db monitor.db --once
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import dns.message
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+from pydantic import ValidationError
+
+import server
+from check_engine import CheckContext, CheckResult, Query
+from dns_cache import DEFAULT_NEGATIVE_TTL, negative_ttl
+from dns_scheduler import BULK, set_priority
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain TEXT PRIMARY KEY,
+    next_due REAL NOT NULL DEFAULT 0,
+    checked_at REAL,
+    overall_score INTEGER,
+    dkim_selector TEXT,
+    checks TEXT
+);
+CREATE INDEX IF NOT EXISTS domains_next_due ON domains (next_due);
+CREATE TABLE IF NOT EXISTS records (
+    domain TEXT NOT NULL,
+    qname TEXT NOT NULL,
+    rdtype TEXT NOT NULL,
+    status TEXT NOT NULL,
+    value TEXT NOT NULL,
+    response BLOB,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (domain, qname, rdtype)
+);
+"""
+
+
+@dataclass
+class RecordSnapshot:
+    """One stored DNS result: an answer, or an NXDOMAIN/NoAnswer negative answer"""
+    qname: str
+    rdtype: str
+    status: str  # 'answer', 'nxdomain' or 'noanswer'
+    value: str  # sorted rdata texts as JSON, compared across cycles
+    response: Optional[bytes]  # wire format, replayed to the checks
+    fetched_at: float
+    expires_at: float
+
+    def replay(self):
+        """Return the stored answer, or raise the stored negative answer"""
+        name = dns.name.from_text(self.qname)
+        response = dns.message.from_wire(self.response) if self.response else None
+        if self.status == 'answer':
+            return dns.resolver.Answer(name, dns.rdatatype.from_text(self.rdtype), dns.rdataclass.IN, response)
+        if self.status == 'nxdomain':
+            raise dns.resolver.NXDOMAIN(qnames=[name], responses={name: response} if response else {})
+        raise dns.resolver.NoAnswer(response=response)
+
+    def summary(self) -> Dict:
+        return {'status': self.status, 'value': json.loads(self.value)}
+
+
+def answer_values(rdtype: str, answer) -> List[str]:
+    """Rdata texts compared across cycles. An SOA's serial and timers change with
+    every edit to the zone, so only its primary nameserver counts."""
+    if rdtype == 'SOA':
+        return sorted(rdata.mname.to_text() for rdata in answer)
+    return sorted(rdata.to_text() for rdata in answer)
+
+
+class SnapshotResolver:
+    """resolve() for one domain's checks: replays unexpired snapshots and queries the rest.
+
+    Transient failures (timeouts, SERVFAIL) are not snapshotted; the keys are
+    collected in `failed` so the domain comes back next cycle. Keys answered
+    by an upstream this run are collected in `fetched`: only those can have
+    changed.
+    """
+
+    def __init__(self, snapshots: Dict[Query, RecordSnapshot], resolve: Callable, min_ttl: float, now: float):
+        self.snapshots = snapshots
+        self._resolve = resolve
+        self.min_ttl = min_ttl
+        self.now = now
+        self.used: Dict[Query, RecordSnapshot] = {}
+        self.failed: Set[Query] = set()
+        self.fetched: Set[Query] = set()
+        self.queried = 0
+        self.replayed = 0
+
+    async def resolve(self, qname: str, rdtype: str):
+        key = (qname.rstrip('.').lower(), rdtype.upper())
+        snapshot = self.snapshots.get(key)
+        if snapshot is not None and snapshot.expires_at > self.now:
+            self.replayed += 1
+            self.used[key] = snapshot
+            return snapshot.replay()
+        self.queried += 1
+        try:
+            answer = await self._resolve(qname, rdtype)
+        except dns.resolver.NXDOMAIN as e:
+            response = next(iter(e.responses().values()), None)
+            self.used[key] = self._negative(key, 'nxdomain', response)
+            self.fetched.add(key)
+            raise
+        except dns.resolver.NoAnswer as e:
+            self.used[key] = self._negative(key, 'noanswer', e.kwargs.get('response'))
+            self.fetched.add(key)
+            raise
+        except Exception:
+            self.failed.add(key)
+            raise
+        self.fetched.add(key)
+        fetched_at = time.time()
+        self.used[key] = RecordSnapshot(
+            qname=key[0],
+            rdtype=key[1],
+            status='answer',
+            value=json.dumps(answer_values(key[1], answer)),
+            response=answer.response.to_wire(),
+            fetched_at=fetched_at,
+            expires_at=fetched_at + max(answer.expiration - fetched_at, self.min_ttl),
+        )
+        return answer
+
+    def _negative(self, key: Query, status: str, response) -> RecordSnapshot:
+        ttl = negative_ttl(response)
+        fetched_at = time.time()
+        return RecordSnapshot(
+            qname=key[0],
+            rdtype=key[1],
+            status=status,
+            value='[]',
+            response=response.to_wire() if response is not None else None,
+            fetched_at=fetched_at,
+            expires_at=fetched_at + max(DEFAULT_NEGATIVE_TTL if ttl is None else ttl, self.min_ttl),
+        )
+
+    def records(self) -> Dict[Query, RecordSnapshot]:
+        """Snapshots to store: everything used this run, failed keys kept as already expired, and
+        unexpired snapshots this run didn't need (say, DKIM probes a known selector made unnecessary)"""
+        records = {key: snapshot for key, snapshot in self.snapshots.items() if snapshot.expires_at > self.now}
+        records.update(self.used)
+        for key in self.failed:
+            previous = self.snapshots.get(key)
+            if previous is not None:
+                records[key] = replace(previous, expires_at=self.now)
+        return records
+
+
+class SnapshotStore:
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def sync_domains(self, domains: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Make the monitored set match `domains`; returns (added, removed)"""
+        with self.db:
+            self.db.execute('CREATE TEMP TABLE IF NOT EXISTS wanted (domain TEXT PRIMARY KEY)')
+            self.db.execute('DELETE FROM wanted')
+            self.db.executemany('INSERT OR IGNORE INTO wanted VALUES (?)', ((d,) for d in domains))
+            added = [row[0] for row in self.db.execute(
+                'SELECT domain FROM wanted WHERE domain NOT IN (SELECT domain FROM domains)')]
+            removed = [row[0] for row in self.db.execute(
+                'SELECT domain FROM domains WHERE domain NOT IN (SELECT domain FROM wanted)')]
+            self.db.executemany('INSERT INTO domains (domain) VALUES (?)', ((d,) for d in added))
+            self.db.executemany('DELETE FROM domains WHERE domain = ?', ((d,) for d in removed))
+            self.db.executemany('DELETE FROM records WHERE domain = ?', ((d,) for d in removed))
+        return added, removed
+
+    def due_domains(self, cycle_started: float, limit: int) -> List[Tuple[str, Optional[str], Optional[int], Optional[str]]]:
+        """Domains due this cycle that haven't been checked since it started"""
+        return self.db.execute(
+            'SELECT domain, dkim_selector, overall_score, checks FROM domains '
+            'WHERE next_due <= ? AND (checked_at IS NULL OR checked_at < ?) LIMIT ?',
+            (cycle_started, cycle_started, limit),
+        ).fetchall()
+
+    def records_for(self, domain: str) -> Dict[Query, RecordSnapshot]:
+        rows = self.db.execute(
+            'SELECT qname, rdtype, status, value, response, fetched_at, expires_at FROM records WHERE domain = ?',
+            (domain,),
+        )
+        return {(row[0], row[1]): RecordSnapshot(*row) for row in rows}
+
+    def save(self, domain: str, report: server.DeliverabilityReport, dkim_selector: Optional[str], records: Dict[Query, RecordSnapshot],
+             next_due: float, checked_at: float, previous_checks: Optional[Dict[str, Dict]] = None) -> None:
+        """Replace a domain's snapshot (call inside a transaction)"""
+        checks = {check.id: {'passed': check.passed, 'result': check.result} for check in report.checks}
+        if previous_checks:
+            # Keep the last conclusive result of checks that were rate limited this time
+            for check in report.checks:
+                if check.status == 'inconclusive' and check.id in previous_checks:
+                    checks[check.id] = previous_checks[check.id]
+        self.db.execute(
+            'UPDATE domains SET next_due = ?, checked_at = ?, overall_score = ?, dkim_selector = ?, checks = ? '
+            'WHERE domain = ?',
+            (next_due, checked_at, report.overall_score, dkim_selector, json.dumps(checks), domain),
+        )
+        self.db.execute('DELETE FROM records WHERE domain = ?', (domain,))
+        self.db.executemany(
+            'INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(domain, r.qname, r.rdtype, r.status, r.value, r.response, r.fetched_at, r.expires_at)
+             for r in records.values()],
+        )
+
+    def mark_failed(self, domain: str, checked_at: float) -> None:
+        """Keep a domain's snapshot but retry it next cycle (call inside a transaction)"""
+        self.db.execute('UPDATE domains SET next_due = ?, checked_at = ? WHERE domain = ?',
+                        (checked_at, checked_at, domain))
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def record_changes(before: Dict[Query, RecordSnapshot], after: Dict[Query, RecordSnapshot],
+                   fetched: Iterable[Query]) -> List[Dict]:
+    """Records whose content changed among those fetched again; a record that wasn't looked
+    up this time is unknown rather than gone, and probes without an answer either way are not changes"""
+    changes = []
+    for key in sorted(fetched):
+        old, new = before.get(key), after.get(key)
+        if old is not None and new is not None and (old.status, old.value) == (new.status, new.value):
+            continue
+        answered = any(snapshot is not None and snapshot.status == 'answer' for snapshot in (old, new))
+        if not answered and (old is None or new is None):
+            continue
+        changes.append({
+            'qname': key[0],
+            'rdtype': key[1],
+            'before': old.summary() if old else None,
+            'after': new.summary() if new else None,
+        })
+    return changes
+
+
+def check_changes(before: Dict[str, Dict], checks: List[CheckResult]) -> List[Dict]:
+    changes = []
+    for check in checks:
+        if check.status == 'inconclusive':
+            continue  # rate limited this time; the stored result stands
+        after = {'passed': check.passed, 'result': check.result}
+        if before.get(check.id) != after:
+            changes.append({'id': check.id, 'name': check.name, 'before': before.get(check.id), 'after': after})
+    return changes
+
+
+class Monitor:
+    def __init__(self, store: SnapshotStore, emit: Callable[[Dict], None], concurrency: int = 100,
+                 min_ttl: float = 0, batch_size: int = 1000):
+        self.store = store
+        self.emit = emit
+        self.concurrency = concurrency
+        self.min_ttl = min_ttl
+        self.batch_size = batch_size
+
+    def sync(self, domains: Iterable[str]) -> None:
+        added, removed = self.store.sync_domains(domains)
+        for domain in removed:
+            self.emit({'type': 'removed', 'domain': domain, 'at': time.time()})
+        if added or removed:
+            logger.info(f"Monitoring {len(added)} new domain(s), dropped {len(removed)}")
+
+    async def check_domain(self, domain: str, dkim_selector: Optional[str], overall_score: Optional[int],
+                           checks_json: Optional[str], semaphore: asyncio.Semaphore, stats: Dict) -> None:
+        snapshots = self.store.records_for(domain)
+        started = time.time()
+        resolver = SnapshotResolver(snapshots, server.resolve, self.min_ttl, started)
+        ctx = CheckContext(domain, resolver.resolve, hints={'dkim_selectors': [dkim_selector]} if dkim_selector else None)
+        async with semaphore:
+            report = await server.build_deliverability_report(domain, ctx)
+        records = resolver.records()
+        # Failed lookups are retried next cycle; otherwise wait for the first record this run used to expire
+        next_due = started if resolver.failed else min((r.expires_at for r in resolver.used.values()), default=started)
+        selector = ctx.findings.get('dkim_selector')
+        # Stored before emitting, so a domain that fails to save doesn't report the same change again
+        self.store.save(domain, report, selector, records, next_due, started,
+                        json.loads(checks_json) if checks_json else None)
+
+        if checks_json is None:
+            self.emit({
+                'type': 'added', 'domain': domain, 'at': started, 'overall_score': report.overall_score,
+                'failed': [check.id for check in report.checks if not check.passed],
+            })
+        else:
+            changed_checks = check_changes(json.loads(checks_json), report.checks)
+            changed_records = record_changes(snapshots, records, resolver.fetched)
+            if changed_checks or changed_records:
+                stats['changed'] += 1
+                self.emit({
+                    'type': 'changed', 'domain': domain, 'at': started,
+                    'overall_score': {'before': overall_score, 'after': report.overall_score},
+                    'checks': changed_checks,
+                    'records': changed_records,
+                })
+        stats['checked'] += 1
+        stats['queried'] += resolver.queried
+        stats['replayed'] += resolver.replayed
+        stats['failed'] += len(resolver.failed)
+
+    async def run_cycle(self) -> Dict:
+        cycle_started = time.time()
+        stats = {'checked': 0, 'changed': 0, 'queried': 0, 'replayed': 0, 'failed': 0, 'errors': 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            due = self.store.due_domains(cycle_started, self.batch_size)
+            if not due:
+                break
+            with self.store.db:
+                outcomes = await asyncio.gather(*(self.check_domain(*row, semaphore, stats) for row in due),
+                                                return_exceptions=True)
+                for row, outcome in zip(due, outcomes):
+                    if isinstance(outcome, Exception):
+                        # One domain's failure shouldn't cost the batch; it is retried next cycle
+                        logger.error(f"Error monitoring {row[0]}: {outcome}")
+                        stats['errors'] += 1
+                        self.store.mark_failed(row[0], cycle_started)
+        stats['elapsed_seconds'] = round(time.time() - cycle_started, 3)
+        return stats
+
+
+def read_domains(path: str) -> List[str]:
+    domains = {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            raw_domain = server.parse_domain_line(line.encode())
+            if not raw_domain:
+                continue
+            try:
+                domains.setdefault(server.DeliverabilityRequest(domain=raw_domain).domain, None)
+            except ValidationError:
+                logger.warning(f"Skipping invalid domain: {raw_domain}")
+    return list(domains)
+
+
+async def monitor(args) -> None:
+    set_priority(BULK)
+    store = SnapshotStore(args.db)
+    events = sys.stdout if args.events == '-' else open(args.events, 'a')
+
+    def emit(event: Dict) -> None:
+        events.write(json.dumps(event) + '\n')
+
+    min_ttl = args.interval if args.min_ttl is None else args.min_ttl
+    runner = Monitor(store, emit, concurrency=args.concurrency, min_ttl=min_ttl)
+    try:
+        while True:
+            started = time.time()
+            runner.sync(read_domains(args.input))
+            stats = await runner.run_cycle()
+            events.flush()
+            server.dkim_index.save()
+            print(f"Cycle: {json.dumps(stats)}", file=sys.stderr)
+            if args.once:
+                return
+            await asyncio.sleep(max(0.0, started + args.interval - time.time()))
+    finally:
+        server.resolver.close()
+        store.close()
+        if events is not sys.stdout:
+            events.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='domain file, one per line (first CSV column); re-read every cycle')
+    parser.add_argument('--db', default='monitor.db', help='SQLite snapshot database')
+    parser.add_argument('--events', default='-', help="file to append change events to, or '-' for stdout")
+    parser.add_argument('--interval', type=float, default=3600, help='seconds between cycle starts')
+    parser.add_argument('--min-ttl', type=float, help='hold snapshots at least this many seconds (default: --interval)')
+    parser.add_argument('--concurrency', type=int, default=100, help='domains checked at once')
+    parser.add_argument('--once', action='store_true', help='run a single cycle and exit')
+    args = parser.parse_args(argv)
+    # Per-domain INFO logging from server would swamp the terminal
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    asyncio.run(monitor(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
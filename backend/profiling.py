@@ -0,0 +1,311 @@
+"""Opt-in per-request profiling: a span tree of checks and DNS queries, plus CPU samples.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked by the `sample_rate` lottery. For a profiled request:
+
+* Code wrapped in span() records a tree of timed spans: the checks, every DNS
+  query (cache hit or miss, upstream used, outcome), the pre-check, and so
+  on. Spans started in tasks attach to the span that was current when the
+  task was created.
+* A sampler thread records the event loop thread's Python stack every few
+  milliseconds. The loop is shared, so the samples include whatever else it
+  was running at the time.
+* Both are written to `directory` as <id>.spans.json and <id>.speedscope.json.
+  The latter opens in https://www.speedscope.app.
+
+When no profile is active, span() and annotate() cost one context variable
+read. Work in a streamed response body is not covered: the profile ends
+when the response starts.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+
+class Span:
+    __slots__ = ('name', 'kind', 'attrs', 'start', 'end', 'children')
+
+    def __init__(self, name: str, kind: str, attrs: Dict):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List['Span'] = []
+
+    def to_dict(self, origin: float, until: float) -> Dict:
+        end = self.end if self.end is not None else until
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((end - self.start) * 1000, 3),
+            **({'attrs': self.attrs} if self.attrs else {}),
+            **({'children': [child.to_dict(origin, until) for child in self.children]} if self.children else {}),
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar('profiling_span', default=None)
+
+
+class _SpanScope:
+    __slots__ = ('span', 'token')
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.token = current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.span.end = time.perf_counter()
+        if exc_type is not None:
+            self.span.attrs.setdefault('outcome', exc_type.__name__)
+        current_span.reset(self.token)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, kind: str = 'span', **attrs):
+    """Context manager timing a child of the current span; yields the Span, or None when not profiling"""
+    parent = current_span.get()
+    if parent is None:
+        return _NO_SPAN
+    child = Span(name, kind, attrs)
+    parent.children.append(child)
+    return _SpanScope(child)
+
+
+def annotate(**attrs) -> None:
+    """Attach attributes to the current span, if profiling"""
+    current = current_span.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+class _StackSampler(threading.Thread):
+    """Samples another thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: List[Tuple[float, Tuple[Tuple[str, str, int], ...]]] = []
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append((time.perf_counter(), tuple(stack)))
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class Profile:
+    def __init__(self, name: str, sampler: Optional[_StackSampler]):
+        self.id = uuid.uuid4().hex[:16]
+        self.root = Span(name, 'request', {})
+        self.sampler = sampler
+        self.token = None
+
+    def spans(self) -> Dict:
+        return self.root.to_dict(self.root.start, self.root.end or time.perf_counter())
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total, each check, and the DNS query count"""
+        parts = [f'total;dur={(self.root.end - self.root.start) * 1000:.1f}']
+        dns_queries = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            if node.kind in ('check', 'precheck') and node.end is not None:
+                parts.append(f'{node.name};dur={(node.end - node.start) * 1000:.1f}')
+            elif node.kind == 'dns':
+                dns_queries += 1
+        parts.append(f'dns;desc="{dns_queries} lookups"')
+        return ', '.join(parts)
+
+    def speedscope(self) -> Dict:
+        """Span lanes as evented profiles, CPU samples as a sampled profile"""
+        frames: List[Dict] = []
+        frame_index: Dict[Tuple, int] = {}
+
+        def frame(name: str, file: Optional[str] = None, line: Optional[int] = None) -> int:
+            key = (name, file, line)
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({'name': name, **({'file': file, 'line': line} if file else {})})
+            return frame_index[key]
+
+        origin = self.root.start
+        until = self.root.end or time.perf_counter()
+        end_ms = (until - origin) * 1000
+        profiles = []
+        for number, lane in enumerate(_lanes(self.root, until), 1):
+            events = []
+            open_spans: List[Tuple[float, int]] = []
+            for start, end, node in sorted(lane, key=lambda item: (item[0], -item[1])):
+                while open_spans and open_spans[-1][0] <= start:
+                    closed_at, index = open_spans.pop()
+                    events.append({'type': 'C', 'frame': index, 'at': (closed_at - origin) * 1000})
+                index = frame(_span_label(node))
+                events.append({'type': 'O', 'frame': index, 'at': (start - origin) * 1000})
+                open_spans.append((end, index))
+            while open_spans:
+                closed_at, index = open_spans.pop()
+                events.append({'type': 'C', 'frame': index, 'at': (closed_at - origin) * 1000})
+            profiles.append({
+                'type': 'evented', 'name': f'Spans (lane {number})', 'unit': 'milliseconds',
+                'startValue': 0, 'endValue': end_ms, 'events': events,
+            })
+        if self.sampler is not None and self.sampler.samples:
+            samples = [[frame(*entry) for entry in stack] for _, stack in self.sampler.samples]
+            profiles.append({
+                'type': 'sampled', 'name': 'CPU samples (event loop thread)', 'unit': 'milliseconds',
+                'startValue': 0, 'endValue': end_ms, 'samples': samples,
+                'weights': [self.sampler.interval * 1000] * len(samples),
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': self.root.name,
+            'exporter': 'deliverability-api profiling',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': profiles,
+        }
+
+
+# Attributes shown in speedscope frame names; the full set is in the .spans.json file
+LABEL_ATTRS = ('cache', 'outcome', 'status', 'upstream')
+
+
+def _span_label(node: Span) -> str:
+    details = ' '.join(str(node.attrs[key]) for key in LABEL_ATTRS if key in node.attrs)
+    return f'{node.kind} {node.name}' + (f' [{details}]' if details else '')
+
+
+def _lanes(root: Span, until: float) -> List[List[Tuple[float, float, Span]]]:
+    """Pack spans into lanes where spans nest or don't overlap, as speedscope's evented profiles need.
+
+    Concurrent siblings (the checks, parallel DKIM probes) land on separate
+    lanes. A child is clipped to its parent, since a cancelled lookup can
+    finish after the check that started it.
+    """
+    lanes: List[List[Tuple[float, float, Span]]] = []
+
+    def fits(lane: List[Tuple[float, float, Span]], start: float, end: float) -> bool:
+        return all(
+            other_end <= start or end <= other_start  # disjoint
+            or (other_start <= start and end <= other_end) or (start <= other_start and other_end <= end)
+            for other_start, other_end, _ in lane
+        )
+
+    def place(node: Span, lower: float, upper: float, preferred: int) -> None:
+        start = max(node.start, lower)
+        end = max(start, min(node.end if node.end is not None else until, upper))
+        candidates = [preferred] + [i for i in range(len(lanes)) if i != preferred]
+        chosen = next((i for i in candidates if i < len(lanes) and fits(lanes[i], start, end)), None)
+        if chosen is None:
+            lanes.append([])
+            chosen = len(lanes) - 1
+        lanes[chosen].append((start, end, node))
+        for child in sorted(node.children, key=lambda child: child.start):
+            place(child, start, end, chosen)
+
+    place(root, root.start, until, 0)
+    return lanes
+
+
+class Profiler:
+    """Decides which requests to profile and writes their profiles out"""
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, token: str = '',
+                 cpu_interval: float = 0.005, max_files: int = 200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.cpu_interval = cpu_interval
+        self.max_files = max_files
+        self.profiled = 0
+        self._sampling = False  # one CPU sampler at a time; overlapping profiles get spans only
+
+    def wanted(self, header: Optional[str]) -> bool:
+        if header is not None and self.token and header == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, name: str) -> Profile:
+        sampler = None
+        if self.cpu_interval > 0 and not self._sampling:
+            self._sampling = True
+            sampler = _StackSampler(threading.get_ident(), self.cpu_interval)
+            sampler.start()
+        profile = Profile(name, sampler)
+        profile.token = current_span.set(profile.root)
+        self.profiled += 1
+        return profile
+
+    def finish(self, profile: Profile) -> None:
+        profile.root.end = time.perf_counter()
+        current_span.reset(profile.token)
+        if profile.sampler is not None:
+            profile.sampler.stop()
+            self._sampling = False
+
+    def write(self, profile: Profile) -> str:
+        """Write the profile files (blocking; run it in an executor); returns the speedscope path"""
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f'{time.strftime("%Y%m%dT%H%M%S")}-{profile.id}')
+        with open(f'{base}.spans.json', 'w') as f:
+            json.dump(profile.spans(), f, indent=1)
+        with open(f'{base}.speedscope.json', 'w') as f:
+            json.dump(profile.speedscope(), f, separators=(',', ':'))
+        self._prune()
+        return f'{base}.speedscope.json'
+
+    def _prune(self) -> None:
+        paths = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.speedscope.json')]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(0, len(paths) - self.max_files)]:
+            base = path[:-len('.speedscope.json')]
+            for suffix in ('.speedscope.json', '.spans.json'):
+                try:
+                    os.unlink(base + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> Dict:
+        return {
+            'sample_rate': self.sample_rate,
+            'header_enabled': bool(self.token),
+            'profiled_requests': self.profiled,
+            'directory': self.directory,
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ResultCache:
+    """Short-lived LRU cache of full results with single-flight computation.
+
+    Concurrent callers asking for the same key while it is being computed share
+    one computation instead of starting their own. The computation runs in its
+    own task, so a caller that goes away does not cancel it for the others.
+    Values that `cacheable` rejects are shared with concurrent callers but not stored.
+
+    With a `shared` SharedCacheClient, a local miss is looked up in the cache
+    shared by the other worker processes before computing, and computed values
+    are published there; `encode`/`decode` convert values to and from bytes.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 10000,
+                 cacheable: Optional[Callable[[object], bool]] = None,
+                 shared=None, encode: Callable[[object], bytes] = None, decode: Callable[[bytes], object] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cacheable = cacheable
+        self.shared = shared
+        self.encode = encode
+        self.decode = decode
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable]) -> Tuple[object, bool, float]:
+        """Return (value, from_cache, age_seconds) for key, computing it at most once at a time"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value, True, age
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._inflight[key] = task
+        value, age = await asyncio.shield(task)
+        return value, age is not None, age or 0.0
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable]) -> Tuple[object, Optional[float]]:
+        """(value, age) where age is None for a freshly computed value"""
+        try:
+            if self.shared is not None and self.ttl > 0:
+                found = await self.shared.get('result:' + key)
+                if found is not None:
+                    data, remaining = found
+                    age = max(0.0, self.ttl - remaining)
+                    value = self.decode(data)
+                    self.shared_hits += 1
+                    self._store(key, time.time() - age, value)
+                    return value, age
+            value = await compute()
+        finally:
+            self._inflight.pop(key, None)
+        if self.ttl > 0 and (self.cacheable is None or self.cacheable(value)):
+            self._store(key, time.time(), value)
+            if self.shared is not None:
+                self.shared.set('result:' + key, self.encode(value), self.ttl)
+        return value, None
+
+    def _store(self, key: str, stored_at: float, value) -> None:
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for computations in flight; returns how many are still running"""
+        if self._inflight:
+            await asyncio.wait(list(self._inflight.values()), timeout=timeout)
+        return len(self._inflight)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'shared_hits': self.shared_hits,
+            'in_flight': len(self._inflight),
+            'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
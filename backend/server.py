@@ -1,17 +1,154 @@
 import os
-import re
-import dns.resolver
-import socket
-from fastapi import FastAPI, HTTPException
+import math
+import asyncio
+import dataclasses
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, validator
-from typing import Optional, List, Dict
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, validator
+from typing import Optional, List, Dict, AsyncIterator, Tuple, Union
 import logging
+import time
+import numpy as np
+import dns.exception
+import dns.rdatatype
+import dns.resolver
+import metrics
+import profiling
+from check_engine import CheckContext, CheckEngine, CheckRegistry, CheckResult, CheckSkipped, Recommendation
+from dkim_index import SelectorIndex, provider_fingerprints
+from dns_cache import DNSCache
+from dns_scheduler import BULK as BULK_PRIORITY, QueryThrottled, set_priority
+from dns_transport import PooledResolver
+from domains import normalize_domain
+from industry_benchmarks import DEFAULT_REGION, BenchmarkStore
+from jobs import FINISHED as JOB_FINISHED, JobManager, QueueFull
+from fast_json import FastJSONResponse, dumps as json_dumps, loads as json_loads
+from result_cache import ResultCache
+from shared_cache import SharedCacheClient
+from spf import LOOKUP_LIMIT as SPF_LOOKUP_LIMIT, SPFExpander, spf_records
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# DNS lookup settings
+DNS_LIFETIME = float(os.environ.get('DNS_LIFETIME', '5'))
+CHECK_TIMEOUT = float(os.environ.get('CHECK_TIMEOUT', '12'))
+
+DNS_TIMEOUT = float(os.environ.get('DNS_TIMEOUT', '2'))
+DNS_UDP_SOCKETS = int(os.environ.get('DNS_UDP_SOCKETS', '4'))
+# Upstream admission control (0 disables): queries per second across all upstreams,
+# and queries in flight per upstream; both back off on SERVFAIL/timeouts
+DNS_RATE_LIMIT = float(os.environ.get('DNS_RATE_LIMIT', '2000'))
+DNS_RATE_BURST = float(os.environ.get('DNS_RATE_BURST', str(DNS_RATE_LIMIT)))
+DNS_UPSTREAM_CONCURRENCY = int(os.environ.get('DNS_UPSTREAM_CONCURRENCY', '256'))
+
+def configured_nameservers() -> List[str]:
+    """DNS_NAMESERVERS (comma-separated specs, see dns_transport), else the system resolvers"""
+    configured = os.environ.get('DNS_NAMESERVERS', '')
+    if configured.strip():
+        return [spec.strip() for spec in configured.split(',') if spec.strip()]
+    system = dns.resolver.Resolver()
+    return [f'[{ns}]:{system.port}' if ':' in ns else f'{ns}:{system.port}' for ns in system.nameservers]
+
+# Async stub resolver with persistent upstream sockets, shared by all checks
+resolver = PooledResolver(
+    configured_nameservers(),
+    timeout=DNS_TIMEOUT,
+    lifetime=DNS_LIFETIME,
+    udp_sockets=DNS_UDP_SOCKETS,
+    rate_limit=DNS_RATE_LIMIT,
+    rate_burst=DNS_RATE_BURST,
+    upstream_concurrency=DNS_UPSTREAM_CONCURRENCY,
+)
+
+# Cache shared by the worker processes (set by launcher.py); local caches stay in front of it
+SHARED_CACHE_SOCKET = os.environ.get('SHARED_CACHE_SOCKET', '')
+shared_cache = SharedCacheClient(SHARED_CACHE_SOCKET) if SHARED_CACHE_SOCKET else None
+
+# Seconds graceful shutdown waits for in-flight checks and DNS queries before closing sockets
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', '10'))
+
+# Opt-in request profiling: send `X-Profile: <PROFILE_TOKEN>`, or profile a random share of requests
+profiler = profiling.Profiler(
+    directory=os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    token=os.environ.get('PROFILE_TOKEN', ''),
+    cpu_interval=float(os.environ.get('PROFILE_CPU_INTERVAL_MS', '5')) / 1000,
+    max_files=int(os.environ.get('PROFILE_MAX_FILES', '200')),
+)
+
+# TTL-aware answer cache shared by every check and request
+dns_cache = DNSCache(
+    max_entries=int(os.environ.get('DNS_CACHE_SIZE', '10000')),
+    max_ttl=int(os.environ.get('DNS_CACHE_MAX_TTL', '3600')),
+    shared=shared_cache,
+)
+
+# Upstream resolver outcomes over the last minute, reported by /api/health
+resolver_outcomes = metrics.RecentOutcomes(window=60)
+
+# Full deliverability reports, keyed on the normalized domain
+result_cache = ResultCache(
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', '300')),
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', '10000')),
+    # Reports with rate-limited (inconclusive) checks are worth retrying rather than replaying
+    cacheable=lambda report: all(check.status != 'inconclusive' for check in report.checks),
+    shared=shared_cache,
+    encode=lambda report: json_dumps(report),
+    decode=lambda data: report_from_json(data),
+)
+
+# Maximum number of DKIM selector lookups in flight per domain
+DKIM_CONCURRENCY = int(os.environ.get('DKIM_CONCURRENCY', '8'))
+
+# Common DKIM selectors; the order probes start from before the index has learned anything
+DKIM_SELECTORS = [
+    'default', 'google', 'k1', 'k2', 'mail', 'dkim', 'selector1', 'selector2',
+    'key1', 'key2', 'smtp', 'email', 'mailgun', 'mandrill', 'sendgrid',
+    'amazonses', 'sparkpost', 'postmark', 'mailchimp', 'constantcontact',
+    'campaignmonitor', 'klaviyo', 'brevo', 'sendinblue', 'mailjet',
+    'elastic', 'dkim1', 'dkim2', 's1', 's2', 'mxvault'
+]
+
+# Learned selector hit counts and each domain's last matching selector, kept across restarts
+# (workers merge into the same file rather than overwriting each other, see dkim_index)
+dkim_index = SelectorIndex(
+    os.environ.get('DKIM_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dkim_selector_index.json')),
+    max_domains=int(os.environ.get('DKIM_INDEX_MAX_DOMAINS', '200000')),
+    max_fingerprints=int(os.environ.get('DKIM_INDEX_MAX_FINGERPRINTS', '20000')),
+).load()
+DKIM_INDEX_SAVE_INTERVAL = float(os.environ.get('DKIM_INDEX_SAVE_INTERVAL', '60'))
+
+# Industry ROI benchmarks (percentage of revenue) by industry and region, reloaded when the file changes
+industry_benchmarks = BenchmarkStore(
+    os.environ.get('INDUSTRY_BENCHMARKS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'industry_benchmarks.json'))
+)
+INDUSTRY_BENCHMARKS_RELOAD_INTERVAL = float(os.environ.get('INDUSTRY_BENCHMARKS_RELOAD_INTERVAL', '5'))
+
+# Largest scenario grid /api/calculate-revenue/grid will compute in one request
+# (about 20 MB of JSON at the default; computed off the event loop, but still a thread's worth of CPU)
+REVENUE_GRID_MAX_ROWS = int(os.environ.get('REVENUE_GRID_MAX_ROWS', '100000'))
+
+# Bulk checks: domains checked at once across all bulk requests, and request size limit
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', '50'))
+BULK_MAX_DOMAINS = int(os.environ.get('BULK_MAX_DOMAINS', '100000'))
+# Uploaded domain files: total size, and longest line (a CSV row) we will buffer
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_MB', '256')) * 1024 * 1024
+UPLOAD_MAX_LINE_BYTES = 64 * 1024
+bulk_semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+# Background bulk audit jobs (see jobs.py): job state and gzipped results live in JOBS_DIR
+JOBS_DIR = os.environ.get('JOBS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', str(BULK_CONCURRENCY)))
+JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', '20'))
+JOB_MAX_DOMAINS = int(os.environ.get('JOB_MAX_DOMAINS', '1000000'))
+JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', '7'))
+# Created by the startup handler, so importing server (audit_cli, monitor, benchmarks) opens no job database
+job_manager: Optional[JobManager] = None
+
 app = FastAPI(title="Email Marketing Deliverability & Revenue Calculator API")
 
 # CORS middleware
@@ -23,6 +160,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def route_path(request: Request) -> str:
+    """Route template for a request, so metrics are not labelled per domain or per 404 path"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match.name == 'FULL':
+            return route.path
+    return 'unmatched'
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    path = route_path(request)
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc(path=path)
+    started = time.perf_counter()
+    status = 500
+    # Decided here rather than in a middleware of its own, which would cost every request a layer
+    profile = profiler.start(f'{request.method} {request.url.path}') if profiler.wanted(
+        request.headers.get('x-profile')) else None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if profile is not None:
+            profiler.finish(profile)
+            response.headers['X-Profile-Id'] = profile.id
+            response.headers['Server-Timing'] = profile.server_timing()
+            asyncio.get_running_loop().run_in_executor(None, write_profile, profile)
+            profile = None
+        return response
+    finally:
+        if profile is not None:
+            profiler.finish(profile)
+        metrics.HTTP_REQUESTS_IN_FLIGHT.dec(path=path)
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started, method=request.method, path=path, status=status
+        )
+
+def write_profile(profile: profiling.Profile) -> None:
+    try:
+        logger.info(f"Wrote request profile {profiler.write(profile)}")
+    except OSError as e:
+        logger.warning(f"Could not write request profile {profile.id}: {e}")
+
+metrics.CACHE_HIT_RATIO.set_function(lambda: {
+    ('dns',): dns_cache.stats()['hit_ratio'],
+    ('result',): result_cache.stats()['hit_ratio'],
+    ('spf_include',): spf_expander.stats()['hit_ratio'],
+})
+metrics.DNS_RATE_LIMIT.set_function(lambda: {(): resolver.rate_limiter.rate})
+metrics.CACHE_ENTRIES.set_function(lambda: {
+    ('dns',): dns_cache.stats()['entries'],
+    ('result',): result_cache.stats()['entries'],
+    ('spf_include',): spf_expander.stats()['entries'],
+})
+
 # Pydantic models
 class DeliverabilityRequest(BaseModel):
     domain: str
@@ -31,30 +221,103 @@ class DeliverabilityRequest(BaseModel):
     def validate_domain(cls, v):
         if not v:
             raise ValueError('Domain is required')
-        # Remove protocol and trailing slash if present
-        domain = re.sub(r'^https?://', '', v)
-        domain = domain.rstrip('/')
-        # Basic domain validation
-        domain_pattern = r'^[a-zA-Z0-9][a-zA-Z0-9-]{0,61}[a-zA-Z0-9]?\.([a-zA-Z]{2,}\.?)*[a-zA-Z]{2,}$'
-        if not re.match(domain_pattern, domain):
-            raise ValueError('Invalid domain format')
-        return domain
+        # Strip protocol, path and port, lowercase and IDNA-encode, then validate
+        return normalize_domain(v)
+
+class CheckResultModel(BaseModel):
+    id: str
+    name: str
+    description: str
+    passed: bool
+    result: str
+    status: str
+
+class RecommendationModel(BaseModel):
+    title: str
+    description: str
 
+class ZoneModel(BaseModel):
+    apex: str
+    negative_ttl: int
+    nameservers: List[str]
+
+# Documents the response schema; the endpoint returns DeliverabilityReport directly
 class DeliverabilityResponse(BaseModel):
     domain: str
     overall_score: int
     summary: str
-    checks: List[Dict]
-    recommendations: List[Dict]
+    checks: List[CheckResultModel]
+    recommendations: List[RecommendationModel]
+    zone: Optional[ZoneModel] = None
+    cache_status: str = 'fresh'
+    cache_age_seconds: float = 0
+
+@dataclasses.dataclass(slots=True)
+class DeliverabilityReport:
+    """Built from already validated parts, so it is serialized as is (see fast_json)"""
+    domain: str
+    overall_score: int
+    summary: str
+    checks: List[CheckResult]
+    recommendations: List[Recommendation]
+    # What the SOA pre-check learned about the domain's zone; None when it didn't run or learned nothing
+    zone: Optional[Dict] = None
+    cache_status: str = 'fresh'
+    cache_age_seconds: float = 0
+
+def report_from_json(data: bytes) -> DeliverabilityReport:
+    """Rebuild a report published to the shared cache by another worker"""
+    report = json_loads(data)
+    checks = []
+    for check in report['checks']:
+        # Reuse the spec's interned strings rather than keeping a copy per cached report
+        spec = checks_registry[check['id']]
+        checks.append(CheckResult(spec.id, spec.name, spec.description, check['passed'], check['result'], check['status']))
+    report['checks'] = checks
+    report['recommendations'] = [Recommendation(**recommendation) for recommendation in report['recommendations']]
+    return DeliverabilityReport(**report)
+
+class BulkDeliverabilityRequest(BaseModel):
+    domains: List[str]
 
 class RevenueRequest(BaseModel):
     monthly_revenue: float
     industry: str
+    region: str = DEFAULT_REGION
     has_email_marketing: bool
     has_sms_marketing: bool
     current_email_revenue: Optional[float] = 0
     current_sms_revenue: Optional[float] = 0
 
+class ValueRange(BaseModel):
+    """Inclusive range of values: start, start + step, ... up to stop"""
+    start: float
+    stop: float
+    step: float
+    
+    def count(self) -> int:
+        if self.step <= 0 or self.stop < self.start:
+            raise ValueError('Range needs step > 0 and stop >= start')
+        # Checked as a float: an extreme range is inf/NaN or too large for int()
+        span = (self.stop - self.start) / self.step
+        if not math.isfinite(span) or span >= REVENUE_GRID_MAX_ROWS:
+            raise ValueError(f'Range has more than {REVENUE_GRID_MAX_ROWS} values')
+        return math.floor(span + 1e-9) + 1
+    
+    def values(self) -> np.ndarray:
+        return self.start + self.step * np.arange(self.count(), dtype=np.float64)
+
+class RevenueGridRequest(BaseModel):
+    """Every combination of the listed values (or ranges) is computed"""
+    monthly_revenue: Union[ValueRange, List[float]]
+    industries: List[str] = Field(['general'], min_length=1)
+    region: str = DEFAULT_REGION
+    has_email_marketing: List[bool] = [False]
+    has_sms_marketing: List[bool] = [False]
+    current_email_revenue: Union[ValueRange, List[float]] = [0]
+    current_sms_revenue: Union[ValueRange, List[float]] = [0]
+    decimals: Optional[int] = Field(2, ge=0, le=10)
+
 class RevenueResponse(BaseModel):
     current_monthly: float
     current_email_revenue: float
@@ -64,103 +327,270 @@ class RevenueResponse(BaseModel):
     total_monthly_increase: float
     annual_potential: float
     industry: str
+    region: str
+    benchmark_version: str
     calculation_breakdown: Dict
 
 # Helper functions for deliverability checks
-def check_mx_record(domain: str) -> Dict:
+async def resolve(qname: str, rdtype: str):
+    """Resolve a DNS record without blocking the event loop, serving from dns_cache when possible"""
+    with profiling.span(f'{rdtype} {qname}', 'dns') as span:
+        answer = dns_cache.get(qname, rdtype)
+        if answer is None:
+            answer = await dns_cache.get_shared(qname, rdtype)
+            if span is not None:
+                span.attrs['cache'] = 'shared' if answer is not None else 'miss'
+        elif span is not None:
+            span.attrs['cache'] = 'hit'
+        if answer is not None:
+            return answer
+        metrics.DNS_QUERIES_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            answer = await resolver.resolve(qname, rdtype)
+        except Exception as e:
+            kind = dns_error_kind(e)
+            metrics.DNS_QUERY_ERRORS.inc(rdtype=rdtype, error=kind)
+            if span is not None:
+                span.attrs['outcome'] = kind
+            # NXDOMAIN/NoAnswer are real answers from a healthy resolver; throttled queries were never sent
+            if kind != 'throttled':
+                resolver_outcomes.record(kind in ('nxdomain', 'noanswer'))
+            dns_cache.put_error(qname, rdtype, e)
+            raise
+        finally:
+            metrics.DNS_QUERIES_IN_FLIGHT.dec()
+            metrics.DNS_QUERY_DURATION.observe(time.perf_counter() - started, rdtype=rdtype)
+        if span is not None:
+            span.attrs['outcome'] = 'ok'
+        resolver_outcomes.record(True)
+        dns_cache.put_answer(qname, rdtype, answer)
+        return answer
+
+def dns_error_kind(error: Exception) -> str:
+    if isinstance(error, QueryThrottled):
+        return 'throttled'
+    if isinstance(error, dns.resolver.NXDOMAIN):
+        return 'nxdomain'
+    if isinstance(error, dns.resolver.NoAnswer):
+        return 'noanswer'
+    if isinstance(error, dns.exception.Timeout):
+        return 'timeout'
+    if isinstance(error, dns.resolver.NoNameservers):
+        return 'servfail'
+    if isinstance(error, asyncio.CancelledError):
+        return 'cancelled'
+    return 'other'
+
+# Registered deliverability checks; report order follows registration order
+checks_registry = CheckRegistry()
+
+def check_context(domain: str, ctx: Optional[CheckContext]) -> CheckContext:
+    """Checks can be called on their own, outside an engine run"""
+    return ctx if ctx is not None else CheckContext(domain, resolve)
+
+@checks_registry.register(
+    'mx', 'MX Record Check', 'Verifies that your domain can receive emails',
+    queries=lambda domain: [(domain, 'MX')],
+    recommendation={
+        'title': 'Set up MX Records',
+        'description': 'Configure MX records in your DNS settings to enable email receiving. Contact your DNS provider or hosting company for assistance.'
+    }
+)
+async def check_mx_record(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
     """Check if domain has MX records"""
+    ctx = check_context(domain, ctx)
     try:
-        mx_records = dns.resolver.resolve(domain, 'MX')
+        mx_records = await ctx.lookup(domain, 'MX')
         return {
-            'name': 'MX Record Check',
-            'description': 'Verifies that your domain can receive emails',
             'passed': len(mx_records) > 0,
             'result': f'Found {len(mx_records)} MX record(s)' if mx_records else 'No MX records found'
         }
     except Exception as e:
         return {
-            'name': 'MX Record Check',
-            'description': 'Verifies that your domain can receive emails',
             'passed': False,
             'result': f'Error checking MX records: {str(e)}'
         }
 
-def check_spf_record(domain: str) -> Dict:
+@checks_registry.register(
+    'spf', 'SPF Record Check', 'Sender Policy Framework helps prevent email spoofing',
+    queries=lambda domain: [(domain, 'TXT')],
+    recommendation={
+        'title': 'Configure SPF Record',
+        'description': 'Add an SPF record to your DNS (e.g., "v=spf1 include:_spf.google.com ~all" for Google Workspace) to prevent email spoofing.'
+    }
+)
+async def check_spf_record(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
     """Check SPF record"""
+    ctx = check_context(domain, ctx)
     try:
-        txt_records = dns.resolver.resolve(domain, 'TXT')
-        spf_found = False
-        spf_record = ""
+        records = spf_records(await ctx.lookup(domain, 'TXT'))
         
-        for record in txt_records:
-            record_str = str(record).strip('"')
-            if record_str.startswith('v=spf1'):
-                spf_found = True
-                spf_record = record_str
-                break
+        if len(records) > 1:
+            return {
+                'passed': False,
+                'result': f'Found {len(records)} SPF records; a domain must publish exactly one'
+            }
+        spf_found = bool(records)
+        spf_record = records[0] if records else ""
         
         return {
-            'name': 'SPF Record Check',
-            'description': 'Sender Policy Framework helps prevent email spoofing',
             'passed': spf_found,
             'result': f'SPF record found: {spf_record[:50]}...' if spf_found else 'No SPF record found'
         }
     except Exception as e:
         return {
-            'name': 'SPF Record Check',
-            'description': 'Sender Policy Framework helps prevent email spoofing',
             'passed': False,
             'result': f'Error checking SPF record: {str(e)}'
         }
 
-def check_dkim_record(domain: str) -> Dict:
+@checks_registry.register(
+    'spf_lookups', 'SPF Lookup Limit', 'SPF records may trigger at most 10 DNS lookups, including nested includes',
+    depends_on=('spf',),
+    recommendation={
+        'title': 'Reduce SPF DNS Lookups',
+        'description': 'Your SPF record needs more than 10 DNS lookups (or has a broken include), so receivers treat it as a permanent error. Remove unused include: mechanisms or replace them with ip4:/ip6: ranges.'
+    }
+)
+async def check_spf_lookups(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
+    """Expand the SPF include tree and count DNS-lookup mechanisms (RFC 7208 section 4.6.4)"""
+    ctx = check_context(domain, ctx)
+    spf = ctx.results.get('spf')
+    if spf is not None and not spf.passed:
+        # The SPF check already failed (and counts) for this
+        raise CheckSkipped('no valid SPF record')
+    evaluation = await spf_expander.evaluate(domain, ctx.lookup)
+    if evaluation.exceeds_limit:
+        return {
+            'passed': False,
+            'result': f'SPF record needs {evaluation.lookups} DNS lookups (limit {SPF_LOOKUP_LIMIT}) across {evaluation.includes} included record(s)'
+        }
+    if evaluation.errors:
+        return {
+            'passed': False,
+            'result': f'SPF evaluation error: {"; ".join(evaluation.errors[:3])}'
+        }
+    return {
+        'passed': True,
+        'result': f'SPF record uses {evaluation.lookups} of {SPF_LOOKUP_LIMIT} DNS lookups across {evaluation.includes} included record(s)'
+    }
+
+async def probe_dkim_selector(domain: str, selector: str, semaphore: asyncio.Semaphore,
+                              resolve_with=None) -> Optional[str]:
+    """Return the DKIM record published under a selector, if any"""
+    async with semaphore:
+        try:
+            records = await (resolve_with or resolve)(f"{selector}._domainkey.{domain}", 'TXT')
+        except QueryThrottled:
+            raise  # unknown, not absent
+        except Exception:
+            return None
+    for record in records:
+        record_str = str(record).strip('"')
+        if 'p=' in record_str:  # DKIM records contain public key with p= parameter
+            return record_str
+    return None
+
+async def dkim_fingerprints(domain: str, ctx: CheckContext) -> List[str]:
+    """Provider fingerprint of a domain for the DKIM selector index"""
+    mx, txt = await asyncio.gather(ctx.lookup(domain, 'MX'), ctx.lookup(domain, 'TXT'), return_exceptions=True)
+    mx_hosts = [] if isinstance(mx, Exception) else [str(record.exchange) for record in mx]
+    spf = [] if isinstance(txt, Exception) else spf_records(txt)
+    return provider_fingerprints(mx_hosts, spf[0] if spf else None)
+
+@checks_registry.register(
+    'dkim', 'DKIM Record Check', 'DomainKeys Identified Mail provides email authentication and helps prevent spoofing',
+    recommendation={
+        'title': 'Set up DKIM Authentication',
+        'description': 'Enable DKIM in your email service provider and add the DKIM record to your DNS settings for better email authentication.'
+    }
+)
+async def check_dkim_record(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
     """Check for DKIM selectors - comprehensive check"""
-    # Expanded list of common DKIM selectors
-    common_selectors = [
-        'default', 'google', 'k1', 'k2', 'mail', 'dkim', 'selector1', 'selector2',
-        'key1', 'key2', 'smtp', 'email', 'mailgun', 'mandrill', 'sendgrid',
-        'amazonses', 'sparkpost', 'postmark', 'mailchimp', 'constantcontact',
-        'campaignmonitor', 'klaviyo', 'brevo', 'sendinblue', 'mailjet',
-        'elastic', 'dkim1', 'dkim2', 's1', 's2', 'mxvault'
-    ]
+    ctx = check_context(domain, ctx)
+    # Probe every selector concurrently (bounded by DKIM_CONCURRENCY), but walk the
+    # results in priority order so the reported selector is always the first match.
+    # Probes bypass ctx.lookup: no other check shares them, and they must be cancellable.
+    semaphore = asyncio.Semaphore(DKIM_CONCURRENCY)
+    # The provider fingerprint comes from lookups the MX and SPF checks make anyway
+    fingerprints = asyncio.ensure_future(dkim_fingerprints(domain, ctx))
+    
+    async def first_match(selectors: List[str]) -> Optional[Tuple[str, str]]:
+        probes = [
+            asyncio.create_task(probe_dkim_selector(domain, selector, semaphore, ctx.resolve))
+            for selector in selectors
+        ]
+        throttled = False
+        try:
+            for selector, probe in zip(selectors, probes):
+                try:
+                    record_str = await probe
+                except QueryThrottled:
+                    throttled = True
+                    continue
+                if record_str:
+                    return selector, record_str
+            if throttled:
+                # Some selectors went unchecked; neither a miss nor the index should record this
+                raise QueryThrottled()
+            return None
+        finally:
+            # Cancel the lower-priority probes still waiting on DNS
+            for probe in probes:
+                probe.cancel()
     
-    dkim_found = False
+    # Selectors already known for this domain are tried on their own first, so a
+    # domain whose selector is still published costs a single lookup. The rest
+    # follow in the order the selector index learned for this domain's provider.
+    known = list(dict.fromkeys(s for s in [*ctx.hints.get('dkim_selectors', ()), dkim_index.known_selector(domain)] if s))
+    try:
+        match = await first_match(known) if known else None
+        if match is None:
+            remaining = [s for s in DKIM_SELECTORS if s not in known]
+            # Waiting for the fingerprint costs a round trip, only worth it once providers have been learned
+            provider = await fingerprints if dkim_index.by_fingerprint else ()
+            ordered = dkim_index.order(remaining, provider)
+            # A selector seen before on this provider is likely enough to try alone before fanning out
+            if provider and dkim_index.provider_hits(ordered[0], provider):
+                match = await first_match(ordered[:1]) or await first_match(ordered[1:])
+            else:
+                match = await first_match(ordered)
+        dkim_index.record(domain, await fingerprints, match[0] if match else None)
+    finally:
+        fingerprints.cancel()
+    
+    dkim_found = match is not None
     found_selector = None
     dkim_record = ""
-    
-    for selector in common_selectors:
-        try:
-            dkim_domain = f"{selector}._domainkey.{domain}"
-            records = dns.resolver.resolve(dkim_domain, 'TXT')
-            for record in records:
-                record_str = str(record).strip('"')
-                if 'p=' in record_str:  # DKIM records contain public key with p= parameter
-                    dkim_found = True
-                    found_selector = selector
-                    dkim_record = record_str[:100] + "..." if len(record_str) > 100 else record_str
-                    break
-            if dkim_found:
-                break
-        except Exception:
-            continue
+    if dkim_found:
+        found_selector, record_str = match
+        dkim_record = record_str[:100] + "..." if len(record_str) > 100 else record_str
     
     if dkim_found:
+        ctx.findings['dkim_selector'] = found_selector
         result = f'DKIM record found (selector: {found_selector}): {dkim_record}'
     else:
         result = 'No DKIM records found with common selectors. Consider checking your email service provider documentation for the correct DKIM selector.'
     
     return {
-        'name': 'DKIM Record Check',
-        'description': 'DomainKeys Identified Mail provides email authentication and helps prevent spoofing',
         'passed': dkim_found,
         'result': result
     }
 
-def check_dmarc_record(domain: str) -> Dict:
+@checks_registry.register(
+    'dmarc', 'DMARC Record Check', 'Domain-based Message Authentication helps with email authentication',
+    queries=lambda domain: [(f"_dmarc.{domain}", 'TXT')],
+    recommendation={
+        'title': 'Implement DMARC Policy',
+        'description': 'Create a DMARC record starting with "v=DMARC1; p=none;" to monitor email authentication and gradually strengthen your policy.'
+    }
+)
+async def check_dmarc_record(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
     """Check DMARC record"""
+    ctx = check_context(domain, ctx)
     try:
         dmarc_domain = f"_dmarc.{domain}"
-        txt_records = dns.resolver.resolve(dmarc_domain, 'TXT')
+        txt_records = await ctx.lookup(dmarc_domain, 'TXT')
         dmarc_found = False
         dmarc_record = ""
         
@@ -172,76 +602,160 @@ def check_dmarc_record(domain: str) -> Dict:
                 break
         
         return {
-            'name': 'DMARC Record Check',
-            'description': 'Domain-based Message Authentication helps with email authentication',
             'passed': dmarc_found,
             'result': f'DMARC record found: {dmarc_record[:50]}...' if dmarc_found else 'No DMARC record found'
         }
     except Exception as e:
         return {
-            'name': 'DMARC Record Check',
-            'description': 'Domain-based Message Authentication helps with email authentication',
             'passed': False,
             'result': f'Error checking DMARC record: {str(e)}'
         }
 
-def check_domain_reputation(domain: str) -> Dict:
+@checks_registry.register(
+    'resolution', 'Domain Resolution', 'Checks if the domain resolves properly',
+    queries=lambda domain: [(domain, 'A')],
+    recommendation={
+        'title': 'Fix Domain Resolution',
+        'description': 'Ensure your domain is properly configured and accessible. Check with your domain registrar or DNS provider.'
+    }
+)
+async def check_domain_reputation(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
     """Basic domain reputation check"""
+    ctx = check_context(domain, ctx)
     try:
         # Try to resolve the domain
-        socket.gethostbyname(domain)
+        await ctx.lookup(domain, 'A')
         return {
-            'name': 'Domain Resolution',
-            'description': 'Checks if the domain resolves properly',
             'passed': True,
             'result': 'Domain resolves successfully'
         }
     except Exception as e:
         return {
-            'name': 'Domain Resolution',
-            'description': 'Checks if the domain resolves properly',
             'passed': False,
             'result': f'Domain resolution failed: {str(e)}'
         }
 
-def generate_recommendations(checks: List[Dict]) -> List[Dict]:
+@checks_registry.register(
+    'mx_hosts', 'Mail Server Resolution', 'Checks that every mail server listed in your MX records has an address',
+    depends_on=('mx',),
+    recommendation={
+        'title': 'Fix Mail Server Addresses',
+        'description': 'One or more of your MX records points to a host without an A or AAAA record. Update the MX record or add the missing address record.'
+    }
+)
+async def check_mx_hosts(domain: str, ctx: Optional[CheckContext] = None) -> Dict:
+    """Check that each MX host resolves to an IPv4 or IPv6 address"""
+    ctx = check_context(domain, ctx)
+    try:
+        mx_records = await ctx.lookup(domain, 'MX')
+    except QueryThrottled:
+        raise
+    except Exception:
+        # The MX check already failed (and counts) for this
+        raise CheckSkipped('no MX records to resolve')
+    # A null MX (".") means the domain explicitly accepts no mail
+    hosts = sorted({str(record.exchange).rstrip('.') for record in mx_records} - {''})
+    if not hosts:
+        raise CheckSkipped('no MX records to resolve')
+    
+    async def has_address(host: str) -> bool:
+        lookups = await asyncio.gather(ctx.lookup(host, 'A'), ctx.lookup(host, 'AAAA'), return_exceptions=True)
+        return any(not isinstance(lookup, Exception) for lookup in lookups)
+    
+    resolved = await asyncio.gather(*(has_address(host) for host in hosts))
+    unresolved = [host for host, ok in zip(hosts, resolved) if not ok]
+    if unresolved:
+        return {'passed': False, 'result': f'Mail server(s) without an address: {", ".join(unresolved)}'}
+    return {'passed': True, 'result': f'All {len(hosts)} mail server(s) resolve'}
+
+def zone_facts(response) -> Dict:
+    """Zone apex, negative caching TTL and nameservers from a response to an SOA query"""
+    soa = None
+    nameservers = []
+    for rrset in [*response.answer, *response.authority]:
+        if rrset.rdtype == dns.rdatatype.SOA and soa is None:
+            soa = rrset
+        elif rrset.rdtype == dns.rdatatype.NS:
+            nameservers = sorted(str(record.target).rstrip('.') for record in rrset)
+    if soa is None:
+        return {}
+    return {
+        'apex': soa.name.to_text().rstrip('.'),
+        'negative_ttl': min(soa.ttl, soa[0].minimum),
+        # Resolvers often leave NS out of the authority section; the SOA names the primary at least
+        'nameservers': nameservers or [str(soa[0].mname).rstrip('.')],
+    }
+
+async def zone_precheck(domain: str, ctx: CheckContext) -> Optional[str]:
+    """Look up the domain's SOA before anything else, so a domain that doesn't exist costs one query.
+
+    NXDOMAIN, or SERVFAIL from every upstream (a dead or broken delegation),
+    fails all checks with one reason. Otherwise what the answer says about
+    the zone (apex, negative caching TTL, nameservers) is left in
+    ctx.findings['zone'] and reported with the results. Timeouts and rate
+    limiting decide nothing: the checks still run and report for themselves.
+    """
+    try:
+        answer = await ctx.lookup(domain, 'SOA')
+        response = answer.response
+    except dns.resolver.NXDOMAIN:
+        return f'Domain does not exist: no DNS zone has a record for {domain} (NXDOMAIN)'
+    except dns.resolver.NoNameservers as e:
+        errors = e.kwargs.get('errors') or []
+        if errors and all(error[3] == 'SERVFAIL' for error in errors):
+            return f"The DNS servers for {domain} are not answering (SERVFAIL); check the domain's delegation at your registrar"
+        return None
+    except dns.resolver.NoAnswer as e:
+        # The name exists below its zone's apex (e.g. mail.example.com)
+        response = e.kwargs.get('response')
+    except Exception:
+        return None
+    if response is not None:
+        ctx.findings['zone'] = zone_facts(response)
+    return None
+
+# DNS_PRECHECK=0 skips the SOA lookup, saving a round trip per cold check of a domain that does exist
+DNS_PRECHECK = os.environ.get('DNS_PRECHECK', '1') != '0'
+
+check_engine = CheckEngine(checks_registry, resolve, timeout=CHECK_TIMEOUT,
+                           precheck=zone_precheck if DNS_PRECHECK else None)
+
+# Parsed SPF records of included domains, shared by every evaluation
+spf_expander = SPFExpander(
+    resolve,
+    max_entries=int(os.environ.get('SPF_CACHE_SIZE', '10000')),
+    max_ttl=int(os.environ.get('DNS_CACHE_MAX_TTL', '3600')),
+)
+
+async def run_checks(domain: str, ctx: Optional[CheckContext] = None) -> List[CheckResult]:
+    """Run all registered deliverability checks for a domain"""
+    return await check_engine.run(domain, ctx)
+
+CHECK_DOMAIN_NAME = Recommendation(
+    title='Check the Domain Name',
+    description='DNS has no working zone for this domain, so no email can be sent from or delivered to it. Check the spelling, and that the domain is registered and delegated to working DNS servers.'
+)
+
+REGULAR_MONITORING = Recommendation(
+    title='Regular Monitoring',
+    description='Set up regular monitoring of your email deliverability metrics and DNS records to catch issues early.'
+)
+
+def generate_recommendations(checks: List[CheckResult]) -> List[Recommendation]:
     """Generate recommendations based on failed checks"""
     recommendations = []
+    results = {check.id: check for check in checks}
     
-    for check in checks:
-        if not check['passed']:
-            if 'MX Record' in check['name']:
-                recommendations.append({
-                    'title': 'Set up MX Records',
-                    'description': 'Configure MX records in your DNS settings to enable email receiving. Contact your DNS provider or hosting company for assistance.'
-                })
-            elif 'SPF' in check['name']:
-                recommendations.append({
-                    'title': 'Configure SPF Record',
-                    'description': 'Add an SPF record to your DNS (e.g., "v=spf1 include:_spf.google.com ~all" for Google Workspace) to prevent email spoofing.'
-                })
-            elif 'DKIM' in check['name']:
-                recommendations.append({
-                    'title': 'Set up DKIM Authentication',
-                    'description': 'Enable DKIM in your email service provider and add the DKIM record to your DNS settings for better email authentication.'
-                })
-            elif 'DMARC' in check['name']:
-                recommendations.append({
-                    'title': 'Implement DMARC Policy',
-                    'description': 'Create a DMARC record starting with "v=DMARC1; p=none;" to monitor email authentication and gradually strengthen your policy.'
-                })
-            elif 'Domain Resolution' in check['name']:
-                recommendations.append({
-                    'title': 'Fix Domain Resolution',
-                    'description': 'Ensure your domain is properly configured and accessible. Check with your domain registrar or DNS provider.'
-                })
+    failed = [check for check in checks if check.status == 'failed']
+    for check in failed:
+        spec = checks_registry[check.id]
+        # A failed dependency already has its own recommendation
+        if spec.recommendation and all(results[d].passed for d in spec.depends_on if d in results):
+            recommendations.append(spec.recommendation)
     
     # Add general recommendations
-    if len([c for c in checks if c['passed']]) < len(checks):
-        recommendations.append({
-            'title': 'Regular Monitoring',
-            'description': 'Set up regular monitoring of your email deliverability metrics and DNS records to catch issues early.'
-        })
+    if failed:
+        recommendations.append(REGULAR_MONITORING)
     
     return recommendations
 
@@ -252,7 +766,179 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "message": "API is running"}
+    ok, failed = resolver_outcomes.totals()
+    failure_ratio = failed / (ok + failed) if ok + failed else 0.0
+    bulk_in_use = int(metrics.BULK_CHECKS_IN_FLIGHT.value())
+    # Most upstream queries in the last minute timing out or SERVFAILing means checks are unreliable
+    status = "degraded" if failed >= 5 and failure_ratio > 0.5 else "healthy"
+    return {
+        "status": status,
+        "message": "API is running",
+        # Counters below are this worker's own; behind launcher.py each request reaches one worker
+        "worker_pid": os.getpid(),
+        "resolver": {
+            "nameservers": resolver.stats(),
+            "timeout_seconds": resolver.timeout,
+            "lifetime_seconds": resolver.lifetime,
+            "queries_last_minute": ok + failed,
+            "failures_last_minute": failed,
+            "failure_ratio": round(failure_ratio, 4),
+            "queries_in_flight": int(metrics.DNS_QUERIES_IN_FLIGHT.value()),
+            "rate_limit": resolver.rate_limiter.stats(),
+        },
+        "saturation": {
+            "requests_in_flight": int(metrics.HTTP_REQUESTS_IN_FLIGHT.total()),
+            "bulk_checks_in_flight": bulk_in_use,
+            "bulk_utilization": round(bulk_in_use / BULK_CONCURRENCY, 4),
+            "result_computations_in_flight": result_cache.stats()['in_flight'],
+        },
+        "dns_cache": dns_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "shared_cache": shared_cache.stats() if shared_cache is not None else None,
+        "spf_include_cache": spf_expander.stats(),
+        "dkim_selector_index": dkim_index.stats(),
+        "industry_benchmarks": industry_benchmarks.stats(),
+        "profiling": profiler.stats(),
+        "jobs": await job_manager.stats() if job_manager is not None else None
+    }
+
+@app.on_event("startup")
+async def start_dkim_index_autosave():
+    app.state.dkim_index_autosave = asyncio.ensure_future(dkim_index.autosave(DKIM_INDEX_SAVE_INTERVAL))
+
+@app.on_event("startup")
+async def start_job_manager():
+    global job_manager
+    job_manager = JobManager(
+        JOBS_DIR, job_check,
+        workers=JOB_WORKERS,
+        concurrency=JOB_CONCURRENCY,
+        max_queued=JOB_MAX_QUEUED,
+        retention=JOB_RETENTION_DAYS * 86400,
+    )
+    job_manager.start()
+
+@app.on_event("startup")
+async def start_industry_benchmarks_watch():
+    app.state.industry_benchmarks_watch = asyncio.ensure_future(
+        industry_benchmarks.watch(INDUSTRY_BENCHMARKS_RELOAD_INTERVAL)
+    )
+
+@app.on_event("shutdown")
+async def stop_industry_benchmarks_watch():
+    watch = getattr(app.state, 'industry_benchmarks_watch', None)
+    if watch is not None:
+        watch.cancel()
+
+@app.on_event("shutdown")
+async def drain_and_close_resolver():
+    """Let in-flight checks and DNS queries finish before closing upstream sockets.
+
+    uvicorn has stopped accepting connections and finished open requests by
+    now; this covers work that outlives them, such as result computations
+    whose callers went away.
+    """
+    deadline = time.monotonic() + SHUTDOWN_DRAIN_TIMEOUT
+    # Running jobs flush their results and go back to the queue; the next start resumes them
+    if job_manager is not None:
+        await job_manager.stop(SHUTDOWN_DRAIN_TIMEOUT)
+    pending = await result_cache.drain(max(0.0, deadline - time.monotonic()))
+    queries = await resolver.drain(max(0.0, deadline - time.monotonic()))
+    if pending or queries:
+        logger.warning(f"Shutting down with {pending} check(s) and {queries} DNS queries still in flight")
+    resolver.close()
+    if shared_cache is not None:
+        shared_cache.close()
+
+@app.on_event("shutdown")
+async def save_dkim_index():
+    autosave = getattr(app.state, 'dkim_index_autosave', None)
+    if autosave is not None:
+        autosave.cancel()
+    try:
+        dkim_index.save()
+    except OSError as e:
+        logger.warning(f"Could not save DKIM selector index: {e}")
+
+@app.get("/metrics")
+@app.get("/api/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint.
+
+    Metrics are per process: behind launcher.py a scrape through the shared
+    port reaches whichever worker accepts the connection (see launcher.py).
+    """
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+async def build_deliverability_report(domain: str, ctx: Optional[CheckContext] = None) -> DeliverabilityReport:
+    """Run every check for an already validated domain and score the results"""
+    ctx = check_context(domain, ctx)
+    # Perform all checks concurrently
+    checks = await run_checks(domain, ctx)
+    if 'precheck_failure' in ctx.findings:
+        # Every check failed for the same reason; one explanation beats seven recommendations
+        return DeliverabilityReport(
+            domain=domain,
+            overall_score=0,
+            summary=ctx.findings['precheck_failure'],
+            checks=checks,
+            recommendations=[CHECK_DOMAIN_NAME]
+        )
+    
+    # Calculate overall score; inconclusive checks (rate-limited lookups) and skipped
+    # checks (a dependency already failed for the same reason) count neither way
+    conclusive = [check for check in checks if check.status in ('passed', 'failed')]
+    passed_checks = sum(1 for check in conclusive if check.passed)
+    overall_score = int((passed_checks / len(conclusive)) * 100) if conclusive else 0
+    
+    # Generate summary
+    if overall_score >= 80:
+        summary = "Excellent! Your email setup looks great with strong authentication."
+    elif overall_score >= 60:
+        summary = "Good setup, but there are some areas for improvement."
+    else:
+        summary = "Your email setup needs attention to improve deliverability."
+    if any(check.status == 'inconclusive' for check in checks):
+        summary += " Some checks were inconclusive because DNS lookups were rate limited; try again shortly."
+    
+    # Generate recommendations
+    recommendations = generate_recommendations(checks)
+    
+    return DeliverabilityReport(
+        domain=domain,
+        overall_score=overall_score,
+        summary=summary,
+        checks=checks,
+        recommendations=recommendations,
+        zone=ctx.findings.get('zone') or None
+    )
+
+async def cached_deliverability_report(domain: str) -> DeliverabilityReport:
+    """Serve a recent report for the domain, or compute one (shared by concurrent callers)"""
+    report, from_cache, age = await result_cache.get_or_compute(
+        domain, lambda: build_deliverability_report(domain)
+    )
+    profiling.annotate(result_cache='hit' if from_cache else 'miss')
+    if not from_cache:
+        return report
+    return dataclasses.replace(report, cache_status='cached', cache_age_seconds=round(age, 3))
+
+@app.get("/api/checks")
+async def list_checks():
+    """Describe the registered checks and the stages they run in"""
+    return {
+        'stages': [[spec.id for spec in stage] for stage in checks_registry.stages()],
+        'checks': [
+            {
+                'id': spec.id,
+                'name': spec.name,
+                'description': spec.description,
+                'depends_on': list(spec.depends_on),
+                'queries': [list(query) for query in spec.queries('example.com')]
+            }
+            for spec in checks_registry
+        ]
+    }
 
 @app.post("/api/check-deliverability", response_model=DeliverabilityResponse)
 async def check_deliverability(request: DeliverabilityRequest):
@@ -261,67 +947,272 @@ async def check_deliverability(request: DeliverabilityRequest):
         domain = request.domain
         logger.info(f"Checking deliverability for domain: {domain}")
         
-        # Perform all checks
-        checks = [
-            check_mx_record(domain),
-            check_spf_record(domain),
-            check_dkim_record(domain),
-            check_dmarc_record(domain),
-            check_domain_reputation(domain)
-        ]
-        
-        # Calculate overall score
-        passed_checks = sum(1 for check in checks if check['passed'])
-        overall_score = int((passed_checks / len(checks)) * 100)
-        
-        # Generate summary
-        if overall_score >= 80:
-            summary = "Excellent! Your email setup looks great with strong authentication."
-        elif overall_score >= 60:
-            summary = "Good setup, but there are some areas for improvement."
-        else:
-            summary = "Your email setup needs attention to improve deliverability."
-        
-        # Generate recommendations
-        recommendations = generate_recommendations(checks)
-        
-        return DeliverabilityResponse(
-            domain=domain,
-            overall_score=overall_score,
-            summary=summary,
-            checks=checks,
-            recommendations=recommendations
-        )
+        report = await cached_deliverability_report(domain)
+        # Returning a Response skips re-validating the report against response_model
+        return FastJSONResponse(report)
         
     except Exception as e:
         logger.error(f"Error checking deliverability: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error checking deliverability: {str(e)}")
 
+async def bulk_check(raw_domain: str, domain: str) -> Union[DeliverabilityReport, Dict]:
+    """Check one domain of a bulk run or job; failures become an error dict"""
+    # Interactive checks get upstream DNS capacity first
+    set_priority(BULK_PRIORITY)
+    async with bulk_semaphore:
+        metrics.BULK_CHECKS_IN_FLIGHT.inc()
+        try:
+            return await cached_deliverability_report(domain)
+        except Exception as e:
+            logger.error(f"Error checking deliverability for {domain}: {str(e)}")
+            return {'domain': raw_domain, 'error': f'Error checking deliverability: {str(e)}'}
+        finally:
+            metrics.BULK_CHECKS_IN_FLIGHT.dec()
+
+async def bulk_check_line(raw_domain: str, domain: str) -> bytes:
+    """Check one domain of a bulk run and encode the outcome as an NDJSON line"""
+    return json_dumps(await bulk_check(raw_domain, domain)) + b'\n'
+
+async def job_check(domain: str) -> Tuple[bytes, bool]:
+    """jobs.JobManager callback: (NDJSON line, failed) for an already validated domain"""
+    result = await bulk_check(domain, domain)
+    return json_dumps(result) + b'\n', isinstance(result, dict)
+
+async def stream_bulk_results(raw_domains: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Validate, dedupe and check domains, yielding NDJSON lines in completion order.
+
+    At most BULK_CONCURRENCY checks are scheduled per stream (and globally through
+    bulk_semaphore), so memory does not grow with the number of submitted domains.
+    """
+    seen = set()
+    pending = set()
+    try:
+        async for raw_domain in raw_domains:
+            try:
+                domain = DeliverabilityRequest(domain=raw_domain).domain
+            except ValidationError as e:
+                yield json_dumps({'domain': raw_domain, 'error': e.errors()[0]['msg']}) + b'\n'
+                continue
+            if domain in seen:
+                continue
+            seen.add(domain)
+            
+            pending.add(asyncio.create_task(bulk_check_line(raw_domain, domain)))
+            if len(pending) >= BULK_CONCURRENCY:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Client went away or the stream failed: stop outstanding checks
+        for task in pending:
+            task.cancel()
+
+async def iterate_domains(domains: List[str]) -> AsyncIterator[str]:
+    for domain in domains:
+        yield domain
+
+async def read_upload_domains(upload: UploadFile, max_domains: int) -> List[str]:
+    """Read domains from an uploaded text/CSV file (first column, one per line).
+
+    The upload is closed once the endpoint returns, so it is parsed up front;
+    results are still streamed. Reading stops with a 400 as soon as the file
+    passes `max_domains` domains, UPLOAD_MAX_BYTES or a line of UPLOAD_MAX_LINE_BYTES.
+    """
+    domains = []
+    remainder = b''
+    size = 0
+    while True:
+        chunk = await upload.read(64 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=400, detail=f"Uploads are limited to {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+        lines = (remainder + chunk).split(b'\n')
+        remainder = lines.pop()
+        if len(remainder) > UPLOAD_MAX_LINE_BYTES:
+            raise HTTPException(status_code=400, detail=f"Lines are limited to {UPLOAD_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            domain = parse_domain_line(line)
+            if domain:
+                domains.append(domain)
+        if len(domains) > max_domains:
+            raise HTTPException(status_code=400, detail=f"At most {max_domains} domains per upload")
+    domain = parse_domain_line(remainder)
+    if domain:
+        domains.append(domain)
+    if len(domains) > max_domains:
+        raise HTTPException(status_code=400, detail=f"At most {max_domains} domains per upload")
+    return domains
+
+def parse_domain_line(line: bytes) -> Optional[str]:
+    text = line.decode('utf-8', errors='replace').strip()
+    if not text or text.startswith('#'):
+        return None
+    return text.split(',', 1)[0].strip().strip('"') or None
+
+@app.post("/api/check-deliverability/bulk")
+async def check_deliverability_bulk(request: BulkDeliverabilityRequest):
+    """Check many domains, streaming one NDJSON result per unique domain as it completes"""
+    if len(request.domains) > BULK_MAX_DOMAINS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_DOMAINS} domains per request")
+    logger.info(f"Bulk deliverability check for {len(request.domains)} domains")
+    return StreamingResponse(stream_bulk_results(iterate_domains(request.domains)), media_type="application/x-ndjson")
+
+@app.post("/api/check-deliverability/bulk/upload")
+async def check_deliverability_bulk_upload(file: UploadFile = File(...)):
+    """Check domains from an uploaded file, streaming NDJSON results as they complete"""
+    domains = await read_upload_domains(file, BULK_MAX_DOMAINS)
+    logger.info(f"Bulk deliverability check for {len(domains)} domains from {file.filename}")
+    return StreamingResponse(stream_bulk_results(iterate_domains(domains)), media_type="application/x-ndjson")
+
+def job_links(job_id: str) -> Dict[str, str]:
+    return {
+        'status': f'/api/jobs/{job_id}',
+        'events': f'/api/jobs/{job_id}/events',
+        'results': f'/api/jobs/{job_id}/results',
+    }
+
+def job_view(job: Dict) -> Dict:
+    return {
+        **job,
+        'progress': round(job['done'] / job['total'], 4) if job['total'] else 1.0,
+        'links': job_links(job['id']),
+    }
+
+def job_items(raw_domains: List[str]) -> Tuple[List[Tuple[str, Optional[bytes]]], int]:
+    """Validate and dedupe domains: (domain, None) to check, or (raw domain, error line) already
+    done, in submission order; plus the number of domains to check"""
+    items = []
+    seen = set()
+    for raw_domain in raw_domains:
+        try:
+            domain = DeliverabilityRequest(domain=raw_domain).domain
+        except ValidationError as e:
+            items.append((raw_domain, json_dumps({'domain': raw_domain, 'error': e.errors()[0]['msg']}) + b'\n'))
+            continue
+        if domain not in seen:
+            seen.add(domain)
+            items.append((domain, None))
+    return items, len(seen)
+
+async def submit_job(raw_domains: List[str]) -> FastJSONResponse:
+    """Validate and dedupe domains, then queue them as a job (202), or 429 when the queue is full"""
+    if len(raw_domains) > JOB_MAX_DOMAINS:
+        raise HTTPException(status_code=400, detail=f"At most {JOB_MAX_DOMAINS} domains per job")
+    # A million domains take seconds to validate; that would hold up every other request
+    items, checked = await asyncio.get_running_loop().run_in_executor(None, job_items, raw_domains)
+    try:
+        job = await job_manager.submit(items)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many jobs queued; try again later",
+                            headers={'Retry-After': '60'})
+    logger.info(f"Queued job {job['id']} with {checked} domains")
+    return FastJSONResponse(job_view(job), status_code=202)
+
+async def get_job_or_404(job_id: str) -> Dict:
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(request: BulkDeliverabilityRequest):
+    """Queue a bulk audit; poll the returned links for progress and results"""
+    return await submit_job(request.domains)
+
+@app.post("/api/jobs/upload", status_code=202)
+async def create_job_from_upload(file: UploadFile = File(...)):
+    """Queue a bulk audit of the domains in an uploaded text/CSV file"""
+    return await submit_job(await read_upload_domains(file, JOB_MAX_DOMAINS))
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    return job_view(await get_job_or_404(job_id))
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: a `progress` event whenever the job advances, then one `finished` event"""
+    job = await get_job_or_404(job_id)
+
+    async def events() -> AsyncIterator[bytes]:
+        current = job
+        last_sent = None
+        last_write = time.monotonic()
+        while True:
+            if current is None:
+                return  # expired while we were watching
+            if current != last_sent:
+                event = 'finished' if current['status'] in JOB_FINISHED else 'progress'
+                yield b'event: ' + event.encode() + b'\ndata: ' + json_dumps(job_view(current)) + b'\n\n'
+                last_sent = current
+                last_write = time.monotonic()
+                if event == 'finished':
+                    return
+            elif time.monotonic() - last_write > 15:
+                yield b': keep-alive\n\n'  # stops proxies from closing an idle stream
+                last_write = time.monotonic()
+            await asyncio.sleep(1.0)
+            if await request.is_disconnected():
+                return
+            current = await job_manager.get(job_id)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.get("/api/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    """Download a completed job's results as gzipped NDJSON, in submission order"""
+    job = await get_job_or_404(job_id)
+    if job['status'] != 'completed':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; results are available once it completes")
+    return FileResponse(job_manager.results_path(job_id), media_type="application/gzip",
+                        filename=f"deliverability-{job_id}.jsonl.gz")
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await get_job_or_404(job_id)
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    return job_view(await job_manager.get(job_id))
+
+@app.get("/api/industries")
+async def list_industries():
+    """Industries and regions the revenue calculator has benchmarks for"""
+    benchmarks = industry_benchmarks.table
+    return {
+        'benchmark_version': benchmarks.version,
+        'regions': dict(benchmarks.regions),
+        'industries': [
+            {'id': key, 'name': industry.name, 'email_roi': industry.email_roi, 'sms_roi': industry.sms_roi}
+            for key, industry in ((key, benchmarks.get(key)) for key in benchmarks.industries)
+        ],
+    }
+
 @app.post("/api/calculate-revenue", response_model=RevenueResponse)
 async def calculate_revenue(request: RevenueRequest):
     """Calculate potential revenue from email and SMS marketing"""
     try:
-        # Industry-specific ROI data (percentage of revenue)
-        industry_data = {
-            'general': {'email_roi': 20, 'sms_roi': 15, 'name': 'General E-commerce'},
-            'fashion': {'email_roi': 25, 'sms_roi': 20, 'name': 'Fashion & Apparel'},
-            'beauty': {'email_roi': 30, 'sms_roi': 25, 'name': 'Beauty & Cosmetics'},  
-            'electronics': {'email_roi': 18, 'sms_roi': 12, 'name': 'Electronics'},
-            'home': {'email_roi': 22, 'sms_roi': 16, 'name': 'Home & Garden'},
-            'food': {'email_roi': 28, 'sms_roi': 22, 'name': 'Food & Beverage'}
-        }
-        
-        if request.industry not in industry_data:
+        # One table for the whole request, even if a reload lands meanwhile
+        benchmarks = industry_benchmarks.table
+        if request.region not in benchmarks.regions:
+            raise HTTPException(status_code=400, detail="Invalid region selected")
+        industry = benchmarks.get(request.industry, request.region)
+        if industry is None:
             raise HTTPException(status_code=400, detail="Invalid industry selected")
         
-        industry = industry_data[request.industry]
         monthly_revenue = request.monthly_revenue
         current_email_revenue = request.current_email_revenue or 0
         current_sms_revenue = request.current_sms_revenue or 0
         
         # Calculate theoretical maximum potential based on industry benchmarks
-        max_email_potential = monthly_revenue * (industry['email_roi'] / 100)
-        max_sms_potential = monthly_revenue * (industry['sms_roi'] / 100)
+        max_email_potential = monthly_revenue * (industry.email_roi / 100)
+        max_sms_potential = monthly_revenue * (industry.sms_roi / 100)
         
         # Calculate potential increase
         if request.has_email_marketing:
@@ -344,8 +1235,8 @@ async def calculate_revenue(request: RevenueRequest):
         # Create detailed calculation breakdown
         calculation_breakdown = {
             'industry_benchmarks': {
-                'email_roi_percent': industry['email_roi'],
-                'sms_roi_percent': industry['sms_roi']
+                'email_roi_percent': industry.email_roi,
+                'sms_roi_percent': industry.sms_roi
             },
             'max_potential': {
                 'email': max_email_potential,
@@ -360,27 +1251,123 @@ async def calculate_revenue(request: RevenueRequest):
                 'sms': sms_potential
             },
             'explanation': {
-                'email': f"Based on {industry['name']} industry average of {industry['email_roi']}% revenue from email marketing",
-                'sms': f"Based on {industry['name']} industry average of {industry['sms_roi']}% revenue from SMS marketing"
+                'email': f"Based on {industry.name} industry average of {industry.email_roi}% revenue from email marketing",
+                'sms': f"Based on {industry.name} industry average of {industry.sms_roi}% revenue from SMS marketing"
             }
         }
         
-        return RevenueResponse(
-            current_monthly=monthly_revenue,
-            current_email_revenue=current_email_revenue,
-            current_sms_revenue=current_sms_revenue,
-            email_potential=email_potential,
-            sms_potential=sms_potential,
-            total_monthly_increase=total_monthly_increase,
-            annual_potential=annual_potential,
-            industry=industry['name'],
-            calculation_breakdown=calculation_breakdown
-        )
+        # Same fields as RevenueResponse, all computed from validated input
+        return FastJSONResponse({
+            'current_monthly': monthly_revenue,
+            'current_email_revenue': current_email_revenue,
+            'current_sms_revenue': current_sms_revenue,
+            'email_potential': email_potential,
+            'sms_potential': sms_potential,
+            'total_monthly_increase': total_monthly_increase,
+            'annual_potential': annual_potential,
+            'industry': industry.name,
+            'region': industry.region,
+            'benchmark_version': benchmarks.version,
+            'calculation_breakdown': calculation_breakdown
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error calculating revenue: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error calculating revenue: {str(e)}")
 
+def grid_axis_length(values: Union[ValueRange, List]) -> int:
+    length = values.count() if isinstance(values, ValueRange) else len(values)
+    if not length:
+        raise ValueError('Every grid axis needs at least one value')
+    return length
+
+def grid_axis(values: Union[ValueRange, List], dtype) -> np.ndarray:
+    if isinstance(values, ValueRange):
+        return values.values().astype(dtype)
+    return np.asarray(values, dtype=dtype)
+
+def compute_revenue_grid(request: RevenueGridRequest) -> Dict:
+    """Compute every scenario of the grid in one vectorized pass, returned as NumPy columns"""
+    benchmarks = industry_benchmarks.table
+    if request.region not in benchmarks.regions:
+        raise ValueError(f"Invalid region selected: {request.region}")
+    industries = [benchmarks.get(industry, request.region) for industry in request.industries]
+    for key, industry in zip(request.industries, industries):
+        if industry is None:
+            raise ValueError(f"Invalid industry selected: {key}")
+    
+    # Sized with Python ints before any array exists: NumPy's int64 product can wrap around
+    rows = math.prod(grid_axis_length(values) for values in (
+        request.monthly_revenue, request.industries, request.has_email_marketing,
+        request.has_sms_marketing, request.current_email_revenue, request.current_sms_revenue,
+    ))
+    if rows > REVENUE_GRID_MAX_ROWS:
+        raise ValueError(f'Grid has {rows} scenarios; the limit is {REVENUE_GRID_MAX_ROWS}')
+    axes = [
+        grid_axis(request.monthly_revenue, np.float64),
+        np.arange(len(request.industries)),
+        grid_axis(request.has_email_marketing, bool),
+        grid_axis(request.has_sms_marketing, bool),
+        grid_axis(request.current_email_revenue, np.float64),
+        grid_axis(request.current_sms_revenue, np.float64),
+    ]
+    
+    # Cartesian product, flattened so row i is one scenario
+    monthly_revenue, industry_code, has_email, has_sms, current_email, current_sms = (
+        column.ravel() for column in np.meshgrid(*axes, indexing='ij')
+    )
+    email_roi = np.array([industry.email_roi for industry in industries], dtype=np.float64)
+    sms_roi = np.array([industry.sms_roi for industry in industries], dtype=np.float64)
+    
+    # Same formulas as calculate_revenue
+    max_email_potential = monthly_revenue * (email_roi[industry_code] / 100)
+    max_sms_potential = monthly_revenue * (sms_roi[industry_code] / 100)
+    email_potential = np.where(has_email, np.maximum(0, max_email_potential - current_email), max_email_potential)
+    sms_potential = np.where(has_sms, np.maximum(0, max_sms_potential - current_sms), max_sms_potential)
+    total_monthly_increase = email_potential + sms_potential
+    annual_potential = total_monthly_increase * 12
+    
+    def money(values: np.ndarray) -> np.ndarray:
+        if request.decimals is not None:
+            values = np.round(values, request.decimals)
+        return values
+    
+    return {
+        'rows': rows,
+        'benchmark_version': benchmarks.version,
+        'region': request.region,
+        # Industry column holds indexes into this list to keep the payload small
+        'industries': [industry.name for industry in industries],
+        'columns': {
+            'monthly_revenue': monthly_revenue,
+            'industry': industry_code,
+            'has_email_marketing': has_email,
+            'has_sms_marketing': has_sms,
+            'current_email_revenue': current_email,
+            'current_sms_revenue': current_sms,
+            'email_potential': money(email_potential),
+            'sms_potential': money(sms_potential),
+            'total_monthly_increase': money(total_monthly_increase),
+            'annual_potential': money(annual_potential),
+        }
+    }
+
+def revenue_grid_response(request: RevenueGridRequest) -> FastJSONResponse:
+    # Returned as a ready response: fast_json writes the NumPy columns directly
+    return FastJSONResponse(content=compute_revenue_grid(request))
+
+@app.post("/api/calculate-revenue/grid")
+async def calculate_revenue_grid(request: RevenueGridRequest):
+    """Calculate revenue potential for every combination of the given inputs"""
+    try:
+        # Building and encoding a large grid takes long enough to stall DNS checks and streams
+        return await asyncio.get_running_loop().run_in_executor(None, revenue_grid_response, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 if __name__ == "__main__":
+    # Single process for development; production runs launcher.py (workers sharing one cache)
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,279 @@
+"""Cache shared by the worker processes of one host.
+
+The launcher runs one SharedCacheServer process next to the uvicorn workers.
+Workers reach it over a Unix socket with a SharedCacheClient. The in-process
+DNS and result caches stay in front of it: a worker asks the shared cache only
+on a local miss and publishes what it computes. A key that one worker has
+resolved therefore costs the others a single socket round trip instead of
+fresh DNS queries. Values are opaque bytes with a TTL, and serializing them is
+up to the caller. The shared cache is best effort. A missing, slow or
+restarting server counts as a miss and never fails a request.
+
+Wire format, each frame prefixed with a 4-byte big-endian length:
+    request:  id (u32), op (u8), ttl (f64), key length (u16), key, value
+    response: id (u32), found (u8), remaining ttl (f64), value
+SET is fire-and-forget and gets no response.
+
+    python shared_cache.py --socket /tmp/deliverability-cache.sock
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import signal
+import struct
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OP_GET = 1
+OP_SET = 2
+
+_LENGTH = struct.Struct('!I')
+_REQUEST = struct.Struct('!IBdH')
+_RESPONSE = struct.Struct('!IBd')
+
+
+class SharedCacheServer:
+    """LRU of bytes values with TTLs, bounded by entry count and total value size"""
+
+    def __init__(self, path: str, max_entries: int = 200000, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[bytes, Tuple[float, bytes]]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: bytes) -> Optional[Tuple[bytes, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        remaining = expires - time.time()
+        if remaining <= 0:
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value, remaining
+
+    def set(self, key: bytes, value: bytes, ttl: float) -> None:
+        if ttl <= 0 or len(value) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.time() + ttl, value)
+        self.size += len(value)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                length = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))[0]
+                frame = await reader.readexactly(length)
+                request_id, op, ttl, key_length = _REQUEST.unpack_from(frame)
+                key = frame[_REQUEST.size:_REQUEST.size + key_length]
+                if op == OP_SET:
+                    self.set(key, frame[_REQUEST.size + key_length:], ttl)
+                    continue
+                found = self.get(key)
+                if found is None:
+                    response = _RESPONSE.pack(request_id, 0, 0.0)
+                else:
+                    response = _RESPONSE.pack(request_id, 1, found[1]) + found[0]
+                writer.write(_LENGTH.pack(len(response)) + response)
+                if writer.transport.get_write_buffer_size() > 1024 * 1024:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except struct.error as e:
+            logger.warning(f"Dropping shared cache client after a malformed frame: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left behind by a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"Shared cache listening on {self.path}")
+        async with server:
+            await server.serve_forever()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SharedCacheClient:
+    """Pipelined connection from one worker to the shared cache server"""
+
+    def __init__(self, path: str, timeout: float = 0.05, retry_interval: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._loop = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connecting: Optional[asyncio.Future] = None
+        self._down_until = 0.0
+
+    async def _connection(self) -> Optional[asyncio.StreamWriter]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # The connection belongs to one event loop; CLIs may run several in sequence
+            self._loop = loop
+            self._writer = None
+            self._connecting = None
+            self._pending = {}
+        if self._writer is not None:
+            return self._writer
+        if time.monotonic() < self._down_until:
+            return None
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+        return await asyncio.shield(self._connecting)
+
+    async def _connect(self) -> Optional[asyncio.StreamWriter]:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), self.timeout * 10)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_interval
+            logger.warning(f"Shared cache at {self.path} unavailable, using local caches only: {e}")
+            return None
+        finally:
+            self._connecting = None
+        self._writer = writer
+        self._reader_task = asyncio.ensure_future(self._read_loop(reader, writer))
+        return writer
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                length = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))[0]
+                frame = await reader.readexactly(length)
+                request_id, found, ttl = _RESPONSE.unpack_from(frame)
+                future = self._pending.get(request_id)
+                if future is not None and not future.done():
+                    future.set_result((frame[_RESPONSE.size:], ttl) if found else None)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_interval
+        finally:
+            self._disconnect(writer)
+
+    def _disconnect(self, writer: asyncio.StreamWriter) -> None:
+        if self._writer is writer:
+            self._writer = None
+        writer.close()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(None)
+
+    def _send(self, writer: asyncio.StreamWriter, request_id: int, op: int, key: str, value: bytes, ttl: float) -> None:
+        key_bytes = key.encode()
+        frame = _REQUEST.pack(request_id, op, ttl, len(key_bytes)) + key_bytes + value
+        writer.write(_LENGTH.pack(len(frame)) + frame)
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return (value, remaining ttl seconds), or None on a miss or any trouble reaching the server"""
+        writer = await self._connection()
+        if writer is None:
+            return None
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = future
+        try:
+            self._send(writer, request_id, OP_GET, key, b'', 0.0)
+            found = await asyncio.wait_for(future, self.timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.errors += 1
+            return None
+        finally:
+            self._pending.pop(request_id, None)
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Publish a value; dropped silently while there is no connection"""
+        if self._writer is None or ttl <= 0 or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            self._send(self._writer, 0, OP_SET, key, value, ttl)
+        except ConnectionError:
+            self.errors += 1
+
+    def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._disconnect(self._writer)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'socket': self.path,
+            'connected': self._writer is not None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def run_server(path: str, max_entries: int, max_bytes: int) -> None:
+    """Process entry point; the launcher stops the server once the workers have drained"""
+    logging.basicConfig(level=logging.INFO)
+    # Ctrl-C reaches the whole process group: keep serving while the workers shut down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        asyncio.run(SharedCacheServer(path, max_entries, max_bytes).serve())
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the cache shared by the API worker processes')
+    parser.add_argument('--socket', default=os.environ.get('SHARED_CACHE_SOCKET', '/tmp/deliverability-cache.sock'))
+    parser.add_argument('--max-entries', type=int, default=int(os.environ.get('SHARED_CACHE_SIZE', '200000')))
+    parser.add_argument('--max-mb', type=int, default=int(os.environ.get('SHARED_CACHE_MAX_MB', '256')))
+    args = parser.parse_args()
+    run_server(args.socket, args.max_entries, args.max_mb * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    main()
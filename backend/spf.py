@@ -0,0 +1,194 @@
+"""SPF include-tree expansion and DNS-lookup counting (RFC 7208).
+
+Evaluation happens in two phases so shared subtrees can be memoized without
+risking deadlock on include loops:
+
+1. The include/redirect graph is fetched breadth-first, each level
+   concurrently. Every node only parses its own TXT record, and parsed nodes
+   for included domains (the same few hundred provider records such as
+   _spf.google.com over and over) are memoized across evaluations until their
+   TTL runs out.
+2. Lookup totals are summed over the fetched graph depth-first, detecting
+   loops along the way.
+
+Mechanisms that need an IP address to evaluate (a, mx, ptr, exists) are
+counted but not resolved, since no message is being checked.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dns_scheduler import QueryThrottled
+
+# RFC 7208 section 4.6.4
+LOOKUP_LIMIT = 10
+LOOKUP_MECHANISMS = ('include', 'a', 'mx', 'ptr', 'exists')
+# Stop fetching once the graph is this deep or this far past the limit: the verdict can't change
+MAX_DEPTH = 12
+MAX_COUNTED_LOOKUPS = 3 * LOOKUP_LIMIT
+# How long failed fetches (no record, NXDOMAIN, timeout) are memoized
+ERROR_TTL = 60
+
+
+def spf_records(txt_answer) -> List[str]:
+    """The v=spf1 strings in a TXT answer (multi-string records joined)"""
+    records = []
+    for rdata in txt_answer:
+        text = b''.join(rdata.strings).decode('utf-8', errors='replace')
+        if text == 'v=spf1' or text.startswith('v=spf1 '):
+            records.append(text)
+    return records
+
+
+class SPFNode:
+    """One parsed SPF record and the domains it pulls in"""
+    __slots__ = ('domain', 'record', 'lookups', 'children', 'error', 'expires')
+
+    def __init__(self, domain: str, record: Optional[str] = None, error: Optional[str] = None,
+                 expires: float = 0.0):
+        self.domain = domain
+        self.record = record
+        self.lookups = 0
+        self.children: List[str] = []
+        self.error = error
+        self.expires = expires
+        if record is not None:
+            self._parse(record)
+
+    def _parse(self, record: str) -> None:
+        redirect = None
+        has_all = False
+        for term in record.split()[1:]:
+            name, _, value = term.partition('=')
+            if _ and ':' not in name and '/' not in name:
+                # Modifier; exp= does not count towards the limit
+                if name.lower() == 'redirect':
+                    redirect = value
+                continue
+            mechanism = term.lstrip('+-~?')
+            name, _, argument = mechanism.partition(':')
+            name = name.split('/', 1)[0].lower()
+            if name == 'all':
+                has_all = True
+            elif name in LOOKUP_MECHANISMS:
+                self.lookups += 1
+                if name == 'include':
+                    self._add_child(argument)
+        # redirect= is ignored when the record has an "all" mechanism (section 6.1)
+        if redirect and not has_all:
+            self.lookups += 1
+            self._add_child(redirect)
+
+    def _add_child(self, target: str) -> None:
+        # Targets with macros depend on the message being checked and can't be expanded here
+        if target and '%' not in target:
+            self.children.append(target.rstrip('.').lower())
+
+
+class SPFResult:
+    __slots__ = ('domain', 'record', 'lookups', 'errors', 'includes')
+
+    def __init__(self, domain: str, record: Optional[str], lookups: int, errors: List[str], includes: int):
+        self.domain = domain
+        self.record = record
+        self.lookups = lookups
+        self.errors = errors
+        self.includes = includes
+
+    @property
+    def exceeds_limit(self) -> bool:
+        return self.lookups > LOOKUP_LIMIT
+
+
+class SPFExpander:
+    def __init__(self, resolve: Callable[[str, str], Awaitable], max_entries: int = 10000, max_ttl: float = 3600):
+        self.resolve = resolve
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._memo: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def _load(self, domain: str, resolve: Optional[Callable[[str, str], Awaitable]] = None) -> SPFNode:
+        try:
+            answer = await (resolve or self.resolve)(domain, 'TXT')
+        except QueryThrottled:
+            raise  # not an answer about the domain; nothing to memoize
+        except Exception as e:
+            return SPFNode(domain, error=f'{domain}: {str(e) or type(e).__name__}', expires=time.time() + ERROR_TTL)
+        records = spf_records(answer)
+        expires = min(answer.expiration, time.time() + self.max_ttl)
+        if not records:
+            return SPFNode(domain, error=f'{domain}: no SPF record', expires=time.time() + ERROR_TTL)
+        if len(records) > 1:
+            return SPFNode(domain, error=f'{domain}: multiple SPF records', expires=expires)
+        return SPFNode(domain, records[0], expires=expires)
+
+    async def _fetch_shared(self, domain: str) -> SPFNode:
+        """Memoized, single-flight fetch for included domains"""
+        future = self._memo.get(domain)
+        if future is not None:
+            if not future.done():
+                self.hits += 1
+                return await asyncio.shield(future)
+            # Completed entries are read directly, so they stay usable from later event loops
+            if not future.cancelled() and future.exception() is None and future.result().expires > time.time():
+                self._memo.move_to_end(domain)
+                self.hits += 1
+                return future.result()
+            del self._memo[domain]
+        self.misses += 1
+        future = asyncio.ensure_future(self._load(domain))
+        self._memo[domain] = future
+        while len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+        return await asyncio.shield(future)
+
+    async def evaluate(self, domain: str, resolve: Optional[Callable[[str, str], Awaitable]] = None) -> SPFResult:
+        """Count lookups for `domain`; `resolve` (e.g. a check context's lookup) fetches its own record"""
+        # The customer's own record is not memoized here (it is in the DNS cache);
+        # the memo is kept for shared include targets
+        root = await self._load(domain, resolve)
+        nodes: Dict[str, SPFNode] = {domain: root}
+        frontier = set(root.children)
+        depth = 0
+        while frontier and depth < MAX_DEPTH and sum(n.lookups for n in nodes.values()) <= MAX_COUNTED_LOOKUPS:
+            fetched = await asyncio.gather(*(self._fetch_shared(d) for d in frontier))
+            for node in fetched:
+                nodes[node.domain] = node
+            frontier = {child for node in fetched for child in node.children if child not in nodes}
+            depth += 1
+
+        errors: List[str] = []
+        totals: Dict[str, int] = {}
+
+        def total(name: str, path: Tuple[str, ...]) -> int:
+            if name in path:
+                errors.append(f'include loop: {" -> ".join(path + (name,))}')
+                return 0
+            if name in totals:
+                return totals[name]
+            node = nodes.get(name)
+            if node is None:
+                return 0  # beyond the fetch cut-off; the limit is already exceeded
+            if node.error:
+                errors.append(node.error)
+            count = node.lookups + sum(total(child, path + (name,)) for child in node.children)
+            totals[name] = count
+            return count
+
+        lookups = total(domain, ())
+        return SPFResult(domain, root.record, lookups, list(dict.fromkeys(errors)), len(nodes) - 1)
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._memo),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
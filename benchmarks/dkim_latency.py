@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""DKIM check latency benchmark.
+
+Runs check_dkim_record against a simulated resolver with a fixed per-query
+latency, for a domain without DKIM and for one whose selector sits late in the
+selector list, comparing sequential probing with the concurrent fan-out. Each
+setting runs with an empty selector index ("cold") and with an index that has
+learned the selector from another domain ("learned").
+
+    python benchmarks/dkim_latency.py --latency 0.05 --runs 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import dns.resolver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import server  # noqa: E402
+from dkim_index import SelectorIndex  # noqa: E402
+
+
+def fake_resolver(latency: float, selector: str = None):
+    """Build a resolve() replacement that only answers for one DKIM selector"""
+    async def resolve(qname: str, rdtype: str):
+        await asyncio.sleep(latency)
+        if selector and qname.startswith(f"{selector}._domainkey."):
+            return ['"v=DKIM1; k=rsa; p=MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEA"']
+        raise dns.resolver.NXDOMAIN()
+    return resolve
+
+
+async def time_check(domain: str, runs: int, learned: bool) -> list:
+    timings = []
+    for _ in range(runs):
+        server.dkim_index = SelectorIndex()
+        if learned:
+            await server.check_dkim_record('learned.example')
+        start = time.perf_counter()
+        await server.check_dkim_record(domain)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per DNS query')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=server.DKIM_CONCURRENCY)
+    args = parser.parse_args()
+
+    scenarios = [
+        ('no DKIM', None),
+        ('DKIM at "klaviyo"', 'klaviyo'),
+        ('DKIM at "default"', 'default'),
+    ]
+    print(f"{len(server.DKIM_SELECTORS)} selectors, {args.latency * 1000:.0f} ms per query, {args.runs} runs")
+    print(f"{'scenario':<22}{'fan-out':>8}{'index':>9}{'median ms':>12}{'max ms':>10}")
+    for label, selector in scenarios:
+        server.resolve = fake_resolver(args.latency, selector)
+        for concurrency in (1, args.concurrency):
+            server.DKIM_CONCURRENCY = concurrency
+            for learned in (False, True):
+                timings = asyncio.run(time_check('example.com', args.runs, learned))
+                print(f"{label:<22}{concurrency:>8}{'learned' if learned else 'cold':>9}"
+                      f"{statistics.median(timings) * 1000:>12.1f}{max(timings) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Local authoritative DNS stand-in for benchmarks.
+
+Serves a record set over UDP and TCP on 127.0.0.1, with configurable response
+latency, jitter and packet loss, so the check pipeline can be measured without
+network access. NXDOMAIN and NODATA answers carry an SOA record like a real
+authoritative server, so negative caching behaves realistically.
+
+    stub = StubDNSServer(synthetic_zone(100), latency=0.02, loss=0.01)
+    stub.start()          # runs on its own thread and event loop
+    ... point the resolver at ('127.0.0.1', stub.port) ...
+    stub.stop()
+"""
+import asyncio
+import random
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+
+# (owner name, rdtype) -> record texts in zone file syntax
+Records = Dict[Tuple[str, str], List[str]]
+
+DEFAULT_TTL = 300
+NEGATIVE_TTL = 60
+# Answers larger than this are truncated over UDP when the query has no EDNS
+CLASSIC_UDP_LIMIT = 512
+
+
+def synthetic_zone(domain_count: int, dkim_every: int = 2, missing_every: int = 10,
+                   dkim_selector: str = 'klaviyo', tld: str = 'test') -> Records:
+    """Records for d0.test .. d{n-1}.test.
+
+    Every `dkim_every`-th domain publishes DKIM under `dkim_selector`; every
+    `missing_every`-th domain has no records at all (NXDOMAIN).
+    """
+    records: Records = {}
+    long_key = 'MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEA' + 'x' * 340
+    for i in range(domain_count):
+        domain = f'd{i}.{tld}'
+        if missing_every and i % missing_every == missing_every - 1:
+            continue
+        records[(domain, 'SOA')] = [f'ns.{domain}. hostmaster.{domain}. 1 3600 600 86400 {NEGATIVE_TTL}']
+        records[(domain, 'A')] = ['192.0.2.1']
+        records[(domain, 'MX')] = [f'10 mx.{domain}.']
+        records[(f'mx.{domain}', 'A')] = ['192.0.2.25']
+        records[(domain, 'TXT')] = ['"v=spf1 include:_spf.provider.test ~all"']
+        records[(f'_dmarc.{domain}', 'TXT')] = ['"v=DMARC1; p=none"']
+        if dkim_every and i % dkim_every == 0:
+            # Long keys are split into 255-byte strings, as real DKIM TXT records are
+            key = f'v=DKIM1; k=rsa; p={long_key}'
+            chunks = ' '.join(f'"{key[j:j + 255]}"' for j in range(0, len(key), 255))
+            records[(f'{dkim_selector}._domainkey.{domain}', 'TXT')] = [chunks]
+    records[('_spf.provider.test', 'TXT')] = ['"v=spf1 ip4:198.51.100.0/24 ~all"']
+    return records
+
+
+class StubDNSServer:
+    def __init__(self, records: Records, latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, host: str = '127.0.0.1', port: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.host = host
+        self.port = port
+        self.queries = 0
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._rrsets: Dict[Tuple[dns.name.Name, int], dns.rrset.RRset] = {}
+        self._names = set()
+        for (owner, rdtype), texts in records.items():
+            self.add(owner, rdtype, texts)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def add(self, owner: str, rdtype: str, texts: Iterable[str], ttl: int = DEFAULT_TTL) -> None:
+        name = dns.name.from_text(owner)
+        rrset = dns.rrset.from_text_list(name, ttl, dns.rdataclass.IN, rdtype, list(texts))
+        self._rrsets[(name, rrset.rdtype)] = rrset
+        # Every ancestor up to the zone cut "exists" (empty non-terminals answer NODATA)
+        while len(name) > 1:
+            self._names.add(name)
+            name = name.parent()
+
+    def _soa(self, qname: dns.name.Name) -> dns.rrset.RRset:
+        zone = dns.name.Name(qname.labels[-3:]) if len(qname) > 3 else qname
+        return dns.rrset.from_text(zone, NEGATIVE_TTL, 'IN', 'SOA',
+                                   f'ns.{zone} hostmaster.{zone} 1 3600 600 86400 {NEGATIVE_TTL}')
+
+    def answer(self, wire: bytes) -> Optional[dns.message.Message]:
+        query = dns.message.from_wire(wire)
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        question = query.question[0]
+        rrset = self._rrsets.get((question.name, question.rdtype))
+        if rrset is not None:
+            response.answer.append(rrset)
+        else:
+            if question.name not in self._names:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            response.authority.append(self._soa(question.name))
+        return response
+
+    async def _delay(self) -> None:
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _respond_udp(self, transport, data: bytes, addr) -> None:
+        self.queries += 1
+        if self.loss and self._random.random() < self.loss:
+            self.dropped += 1
+            return
+        await self._delay()
+        query = dns.message.from_wire(data)
+        response = self.answer(data)
+        limit = query.payload if query.edns >= 0 else CLASSIC_UDP_LIMIT
+        wire = response.to_wire()
+        if len(wire) > limit:
+            response.answer.clear()
+            response.authority.clear()
+            response.flags |= dns.flags.TC
+            wire = response.to_wire()
+        transport.sendto(wire, addr)
+
+    async def _serve_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Queries on one connection are answered concurrently (pipelining, RFC 7766)
+        pending = set()
+        lock = asyncio.Lock()
+
+        async def respond(data: bytes):
+            self.queries += 1
+            await self._delay()
+            wire = self.answer(data).to_wire()
+            async with lock:
+                writer.write(struct.pack('!H', len(wire)) + wire)
+                await writer.drain()
+
+        try:
+            while True:
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+                task = asyncio.ensure_future(respond(await reader.readexactly(length)))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def _start(self) -> None:
+        server = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                asyncio.ensure_future(server._respond_udp(self.transport, data, addr))
+
+        self._udp, _ = await self._loop.create_datagram_endpoint(Protocol, local_addr=(self.host, self.port))
+        self.port = self._udp.get_extra_info('sockname')[1]
+        self._tcp = await asyncio.start_server(self._serve_tcp, self.host, self.port)
+
+    def start(self) -> 'StubDNSServer':
+        """Serve from a background thread; returns once the port is bound"""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._start())
+            self._ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='dns-stub', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        def shutdown():
+            self._udp.close()
+            self._tcp.close()
+            self._loop.stop()
+
+        self._loop.call_soon_threadsafe(shutdown)
+        self._thread.join()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Load and latency benchmark for the API, with no network access.
+
+Starts the local DNS stub (benchmarks/dns_stub.py), points the server's resolver
+at it and drives the FastAPI app in-process over ASGI at a fixed concurrency.
+Throughput and p50/p95/p99 latency per scenario are compared against a stored
+baseline; the run fails if any scenario regresses beyond the tolerance.
+
+    python benchmarks/load.py                     # compare with benchmarks/baseline.json
+    python benchmarks/load.py --dns-latency 0.05 --dns-loss 0.02 --concurrency 100
+    python benchmarks/load.py --save-baseline     # record a new baseline
+
+Numbers depend on the machine: the baseline records the commit, Python and
+CPU it was taken on, and should be re-recorded on the machine that compares
+against it (and whenever a change moves the numbers on purpose).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'backend'))
+sys.path.insert(0, BENCH_DIR)
+
+import server  # noqa: E402
+from dns_stub import StubDNSServer, synthetic_zone  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+# Baseline key describing where it was recorded, rather than a scenario
+ENVIRONMENT_KEY = '_environment'
+
+
+def configure_resolver(port: int, lifetime: float) -> None:
+    """Send every lookup from the server to the stub"""
+    server.resolver.set_nameservers([f'127.0.0.1:{port}'])
+    server.resolver.lifetime = lifetime
+
+
+def reset_caches() -> None:
+    server.dns_cache.clear()
+    server.result_cache.clear()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def drive(client: httpx.AsyncClient, make_request: Callable[[int], Dict], total: int,
+                concurrency: int) -> Dict:
+    """Issue `total` requests with at most `concurrency` outstanding"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            request = make_request(index)
+            start = time.perf_counter()
+            response = await client.request(request['method'], request['url'], json=request.get('json'))
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+
+def scenarios(domain_count: int) -> Dict[str, Dict]:
+    revenue_payload = {
+        'monthly_revenue': 50000, 'industry': 'beauty', 'has_email_marketing': True,
+        'has_sms_marketing': False, 'current_email_revenue': 4000, 'current_sms_revenue': 0,
+    }
+    return {
+        # Every request is a different domain and starts from empty caches
+        'deliverability_cold': {
+            'reset': True,
+            'request': lambda i: {'method': 'POST', 'url': '/api/check-deliverability',
+                                  'json': {'domain': f'd{i % domain_count}.test'}},
+        },
+        # A small set of popular domains, as when a campaign links to the checker
+        'deliverability_hot': {
+            'reset': False,
+            'request': lambda i: {'method': 'POST', 'url': '/api/check-deliverability',
+                                  'json': {'domain': f'd{i % 5}.test'}},
+        },
+        'revenue': {
+            'reset': False,
+            'request': lambda i: {'method': 'POST', 'url': '/api/calculate-revenue', 'json': revenue_payload},
+        },
+    }
+
+
+async def run(args) -> Dict[str, Dict]:
+    results = {}
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for name, scenario in scenarios(args.domains).items():
+            if args.scenario and name not in args.scenario:
+                continue
+            if scenario['reset']:
+                reset_caches()
+            total = min(args.requests, args.domains) if scenario['reset'] else args.requests
+            results[name] = await drive(client, scenario['request'], total, args.concurrency)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCH_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def environment(args) -> Dict:
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'settings': {
+            'requests': args.requests, 'concurrency': args.concurrency, 'domains': args.domains,
+            'dns_latency': args.dns_latency, 'dns_jitter': args.dns_jitter, 'dns_loss': args.dns_loss,
+        },
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if result[key] > expected[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {result[key]} > baseline {expected[key]}")
+        if result['throughput_rps'] < expected['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput_rps']} < baseline {expected['throughput_rps']}")
+        if result['errors'] > expected['errors']:
+            regressions.append(f"{name}: {result['errors']} errors (baseline {expected['errors']})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--domains', type=int, default=500, help='domains in the synthetic zone')
+    parser.add_argument('--dns-latency', type=float, default=0.01, help='stub response delay in seconds')
+    parser.add_argument('--dns-jitter', type=float, default=0.005, help='extra random delay, up to this many seconds')
+    parser.add_argument('--dns-loss', type=float, default=0.0, help='fraction of UDP queries the stub drops')
+    parser.add_argument('--dns-lifetime', type=float, default=2.0, help='resolver lifetime per lookup')
+    parser.add_argument('--records', help='JSON file of {"name TYPE": ["rdata", ...]} to serve instead of the synthetic zone')
+    parser.add_argument('--scenario', action='append', help='only run this scenario (repeatable)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.records:
+        with open(args.records) as f:
+            records = {tuple(key.rsplit(' ', 1)): value for key, value in json.load(f).items()}
+    else:
+        records = synthetic_zone(args.domains)
+    stub = StubDNSServer(records, latency=args.dns_latency, jitter=args.dns_jitter,
+                         loss=args.dns_loss, seed=args.seed).start()
+    configure_resolver(stub.port, args.dns_lifetime)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        stub.stop()
+
+    print(f"{'scenario':<22}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['throughput_rps']:>10}{result['p50_ms']:>10}"
+              f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}")
+    print(f"DNS stub answered {stub.queries} queries ({stub.dropped} dropped)")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({ENVIRONMENT_KEY: environment(args), **results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    recorded = baseline.pop(ENVIRONMENT_KEY, {})
+    if recorded:
+        print(f"Baseline recorded at {recorded['commit']} on {recorded['processor']} "
+              f"({recorded['cpu_count']} CPUs, Python {recorded['python']})")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Domain normalization micro-benchmark and fuzz run.
+
+Times normalize_domain on typical and adversarial inputs against the previous
+validator regex, then feeds it random inputs and fails if any single call takes
+longer than --max-ms or breaks the normalizer's invariants (idempotent,
+lowercase ASCII, valid labels).
+
+    python benchmarks/normalize_domain.py --fuzz 200000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from domains import MAX_DOMAIN_LENGTH, _normalize, normalize_domain  # noqa: E402
+
+# The validator used before normalize_domain, kept here for comparison
+LEGACY_PATTERN = r'^[a-zA-Z0-9][a-zA-Z0-9-]{0,61}[a-zA-Z0-9]?\.([a-zA-Z]{2,}\.?)*[a-zA-Z]{2,}$'
+LABEL = re.compile(r'[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?')
+FUZZ_ALPHABET = 'abcXYZ019-._:/@?#% \\ü中а' + 'a' * 10 + '.' * 4
+
+
+def legacy_validate(value: str) -> bool:
+    domain = re.sub(r'^https?://', '', value).rstrip('/')
+    return bool(re.match(LEGACY_PATTERN, domain))
+
+
+def try_normalize(value: str):
+    try:
+        return normalize_domain(value)
+    except ValueError:
+        return None
+
+
+def per_call_us(func, value: str, number: int) -> float:
+    return timeit.timeit(lambda: func(value), number=number) / number * 1e6
+
+
+def benchmark(number: int) -> None:
+    inputs = [
+        ('plain domain', 'example.com'),
+        ('url with path and port', 'HTTPS://Mail.Example.co.uk:8443/path?q=1'),
+        ('idn', 'bücher.example'),
+        # 253 characters, the longest name normalize_domain accepts
+        ('long valid', '.'.join(['abcdefgh'] * 27) + '.abcdef.com'),
+    ]
+    for label, value in inputs:
+        assert try_normalize(value) is not None, f"{label} input is rejected, so it would time the error path"
+    print(f"{'input':<26}{'legacy us':>12}{'cold us':>10}{'cached us':>11}")
+    for label, value in inputs:
+        legacy = per_call_us(legacy_validate, value, number)
+
+        def cold(v):
+            _normalize.cache_clear()
+            return try_normalize(v)
+
+        print(f"{label:<26}{legacy:>12.2f}{per_call_us(cold, value, number):>10.2f}"
+              f"{per_call_us(try_normalize, value, number):>11.2f}")
+
+    # Backtracking in ([a-zA-Z]{2,}\.?)* is exponential in the number of letters
+    print(f"\n{'adversarial length':<26}{'legacy ms':>12}{'new ms':>10}")
+    for length in (16, 20, 24, 28):
+        value = 'a.' + 'a' * length + '-'
+        start = time.perf_counter()
+        legacy_validate(value)
+        legacy_ms = (time.perf_counter() - start) * 1000
+        _normalize.cache_clear()
+        start = time.perf_counter()
+        try_normalize(value)
+        new_ms = (time.perf_counter() - start) * 1000
+        print(f"{length:<26}{legacy_ms:>12.2f}{new_ms:>10.3f}")
+
+
+def check_invariants(value: str, result: str) -> None:
+    assert result == result.lower() and result.isascii(), result
+    assert len(result) <= MAX_DOMAIN_LENGTH, result
+    assert all(LABEL.fullmatch(label) for label in result.split('.')), result
+    assert try_normalize(result) == result, f"not idempotent: {value!r} -> {result!r}"
+
+
+def fuzz(iterations: int, max_ms: float, seed: int) -> int:
+    rng = random.Random(seed)
+    worst = 0.0
+    accepted = 0
+    for i in range(iterations):
+        size = rng.choice((rng.randint(0, 40), rng.randint(0, 300), rng.randint(0, 5000)))
+        value = ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(size))
+        if i % 3 == 0:
+            value = rng.choice(('', 'http://', 'https://', 'ftp://u:p@')) + value + rng.choice(('', '.com', '.', ':80'))
+        _normalize.cache_clear()
+        start = time.perf_counter()
+        result = try_normalize(value)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        worst = max(worst, elapsed_ms)
+        if elapsed_ms > max_ms:
+            print(f"FAIL: {elapsed_ms:.2f} ms for input of length {len(value)}: {value[:80]!r}")
+            return 1
+        if result is not None:
+            accepted += 1
+            check_invariants(value, result)
+    print(f"\nfuzz: {iterations} inputs, {accepted} accepted, worst case {worst:.3f} ms (limit {max_ms} ms)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000, help='calls per micro-benchmark')
+    parser.add_argument('--fuzz', type=int, default=50000, help='random inputs to try')
+    parser.add_argument('--max-ms', type=float, default=5.0, help='per-call time limit for the fuzz run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    benchmark(args.number)
+    return fuzz(args.fuzz, args.max_ms, args.seed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Response construction and serialization benchmark.
+
+Times building and encoding one deliverability report the way the endpoint
+used to (dicts validated into the pydantic response model, then
+jsonable_encoder and json.dumps) against the current path (slotted
+dataclasses encoded by fast_json), and reports CPU time per response.
+
+    python benchmarks/serialization_bench.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import server  # noqa: E402
+from check_engine import CheckResult  # noqa: E402
+from fast_json import dumps  # noqa: E402
+
+
+def sample_checks():
+    """One result per registered check, half of them failed"""
+    checks = []
+    for i, spec in enumerate(server.checks_registry):
+        passed = i % 2 == 0
+        checks.append(CheckResult(
+            id=spec.id, name=spec.name, description=spec.description, passed=passed,
+            result='Record found: v=spf1 include:_spf.provider.test ~all' if passed else 'No record found',
+            status='passed' if passed else 'failed',
+        ))
+    return checks
+
+
+def legacy_response(checks) -> bytes:
+    """Dict report through response_model validation, jsonable_encoder and the stdlib encoder"""
+    check_dicts = [
+        {'id': c.id, 'name': c.name, 'description': c.description, 'passed': c.passed,
+         'result': c.result, 'status': c.status}
+        for c in checks
+    ]
+    recommendations = [
+        {'title': r.title, 'description': r.description}
+        for r in server.generate_recommendations(checks)
+    ]
+    report = {
+        'domain': 'example.com', 'overall_score': 57, 'summary': 'Good setup',
+        'checks': check_dicts, 'recommendations': recommendations,
+    }
+    model = server.DeliverabilityResponse(**report)
+    return json.dumps(jsonable_encoder(model), ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def fast_response(checks) -> bytes:
+    report = server.DeliverabilityReport(
+        domain='example.com', overall_score=57, summary='Good setup',
+        checks=checks, recommendations=server.generate_recommendations(checks),
+    )
+    return dumps(report)
+
+
+def time_path(build, checks, iterations: int) -> float:
+    """CPU microseconds per response"""
+    build(checks)
+    start = time.process_time()
+    for _ in range(iterations):
+        build(checks)
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    checks = sample_checks()
+    assert json.loads(legacy_response(checks)) == json.loads(fast_response(checks))
+
+    legacy = time_path(legacy_response, checks, args.iterations)
+    fast = time_path(fast_response, checks, args.iterations)
+    print(f"{len(checks)} checks, {len(fast_response(checks))} bytes per response")
+    print(f"pydantic + json:      {legacy:8.1f} us/response")
+    print(f"dataclasses + orjson: {fast:8.1f} us/response ({legacy / fast:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -216,17 +216,24 @@ const DeliverabilityChecker = () => {
 
   const InteractiveCheckCard = ({ check, index }) => {
     const [expanded, setExpanded] = React.useState(false);
+    // Skipped checks had nothing to examine because a check they depend on already failed
+    const skipped = check.status === 'skipped';
     
     return (
       <div className={`bg-slate-800/50 backdrop-blur-sm border rounded-xl p-6 transition-all duration-300 hover:shadow-lg transform hover:scale-105 ${
+        skipped ? 'border-slate-500/30 hover:border-slate-400' :
         check.passed ? 'border-green-500/30 hover:border-green-400' : 'border-red-500/30 hover:border-red-400'
       }`}>
         <div className="flex items-start justify-between mb-4">
           <div className="flex items-center gap-3">
             <div className={`w-8 h-8 rounded-full flex items-center justify-center ${
-              check.passed ? 'bg-green-500' : 'bg-red-500'
+              skipped ? 'bg-slate-500' : check.passed ? 'bg-green-500' : 'bg-red-500'
             }`}>
-              {check.passed ? 
+              {skipped ?
+                <svg className="w-4 h-4 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                  <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M20 12H4" />
+                </svg> :
+               check.passed ? 
                 <svg className="w-4 h-4 text-white" fill="none" stroke="currentColor" viewBox="0 0 24 24">
                   <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M5 13l4 4L19 7" />
                 </svg> :
@@ -248,39 +255,39 @@ const DeliverabilityChecker = () => {
         </div>
         
         <p className="text-gray-400 text-sm mb-3">{check.description}</p>
-        <p className={`text-sm font-medium ${check.passed ? 'text-green-400' : 'text-red-400'}`}>
+        <p className={`text-sm font-medium ${skipped ? 'text-gray-400' : check.passed ? 'text-green-400' : 'text-red-400'}`}>
           {check.result}
         </p>
         
         {expanded && (
           <div className="mt-4 pt-4 border-t border-slate-600 animate-fadeInUp">
             <div className="text-sm text-gray-300">
-              {!check.passed && (
+              {!check.passed && !skipped && (
                 <div className="bg-red-500/10 border border-red-500/20 rounded-lg p-3 mb-3">
                   <p className="text-red-300 font-semibold mb-2">Impact of Missing {check.name}:</p>
                   <ul className="text-red-200 text-xs space-y-1">
-                    {check.name.includes('MX') && (
+                    {check.id === 'mx' && (
                       <>
                         <li>• Emails cannot be delivered to your domain</li>
                         <li>• Complete failure of email communication</li>
                         <li>• Potential revenue loss: 100% of email marketing</li>
                       </>
                     )}
-                    {check.name.includes('SPF') && (
+                    {check.id === 'spf' && (
                       <>
                         <li>• 15-30% of emails may be marked as spam</li>
                         <li>• Reduced sender reputation over time</li>
                         <li>• Potential revenue loss: $500-2000/month</li>
                       </>
                     )}
-                    {check.name.includes('DKIM') && (
+                    {check.id === 'dkim' && (
                       <>
                         <li>• 10-25% delivery rate reduction</li>
                         <li>• Higher spam folder placement</li>
                         <li>• Potential revenue loss: $300-1500/month</li>
                       </>
                     )}
-                    {check.name.includes('DMARC') && (
+                    {check.id === 'dmarc' && (
                       <>
                         <li>• 5-15% delivery rate reduction</li>
                         <li>• Vulnerability to email spoofing</li>
@@ -398,6 +405,12 @@ const DeliverabilityChecker = () => {
                     {results.overall_score >= 80 ? 'Excellent' : results.overall_score >= 60 ? 'Good' : 'Needs Improvement'}
                   </p>
                   <p className="text-gray-300">{results.summary}</p>
+                  {results.zone && (
+                    <p className="text-gray-500 text-sm mt-3">
+                      DNS for {results.zone.apex} is served by {results.zone.nameservers.join(', ')}.
+                      New records can take up to {results.zone.negative_ttl} seconds to become visible.
+                    </p>
+                  )}
                 </div>
               </div>
 
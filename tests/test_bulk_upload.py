@@ -0,0 +1,35 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+
+import server
+
+
+def read(data: bytes, max_domains: int = 10):
+    return asyncio.run(server.read_upload_domains(UploadFile(io.BytesIO(data)), max_domains))
+
+
+def test_reads_first_column_and_skips_comments():
+    assert read(b'# domains\nexample.com,Acme\n\n"example.org", x\nexample.net') == [
+        'example.com', 'example.org', 'example.net']
+
+
+def test_stops_once_too_many_domains():
+    with pytest.raises(HTTPException) as error:
+        read(b'a.com\n' * 11)
+    assert error.value.status_code == 400
+
+
+def test_stops_on_an_overlong_line(monkeypatch):
+    monkeypatch.setattr(server, 'UPLOAD_MAX_LINE_BYTES', 100)
+    with pytest.raises(HTTPException):
+        read(b'a' * 1000)
+
+
+def test_stops_past_the_byte_limit(monkeypatch):
+    monkeypatch.setattr(server, 'UPLOAD_MAX_BYTES', 1024)
+    with pytest.raises(HTTPException):
+        read(b'# comment\n' * 1000)
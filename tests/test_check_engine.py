@@ -0,0 +1,133 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from check_engine import CheckContext, CheckEngine, CheckRegistry, CheckSkipped
+from dns_scheduler import QueryThrottled
+
+
+class FakeResolver:
+    """Answers from a dict of (qname, rdtype) -> records; missing names raise LookupError"""
+
+    def __init__(self, answers, throttled=()):
+        self.answers = answers
+        self.throttled = set(throttled)
+        self.calls = Counter()
+
+    async def __call__(self, qname, rdtype):
+        self.calls[(qname, rdtype)] += 1
+        await asyncio.sleep(0)
+        if (qname, rdtype) in self.throttled:
+            raise QueryThrottled()
+        try:
+            return self.answers[(qname, rdtype)]
+        except KeyError:
+            raise LookupError(f'no {rdtype} for {qname}')
+
+
+async def noop(domain, ctx):
+    return {'passed': True, 'result': ''}
+
+
+def registry_with_dependency(order):
+    registry = CheckRegistry()
+
+    @registry.register('base', 'Base', 'Looks up TXT', queries=lambda domain: [(domain, 'TXT')])
+    async def base(domain, ctx):
+        records = await ctx.lookup(domain, 'TXT')
+        order.append('base')
+        return {'passed': bool(records), 'result': f'{len(records)} record(s)'}
+
+    @registry.register('dependent', 'Dependent', 'Needs base', depends_on=('base',))
+    async def dependent(domain, ctx):
+        order.append('dependent')
+        if not ctx.results['base'].passed:
+            raise CheckSkipped('base failed')
+        await ctx.lookup(domain, 'TXT')
+        return {'passed': True, 'result': 'ok'}
+
+    @registry.register('other', 'Other', 'Independent', queries=lambda domain: [(domain, 'A')])
+    async def other(domain, ctx):
+        await ctx.lookup(domain, 'A')
+        order.append('other')
+        return {'passed': True, 'result': 'resolves'}
+
+    return registry
+
+
+def test_stages_follow_dependencies():
+    registry = registry_with_dependency([])
+    assert [[spec.id for spec in stage] for stage in registry.stages()] == [['base', 'other'], ['dependent']]
+
+
+def test_unregistered_dependency_is_rejected():
+    registry = CheckRegistry()
+    with pytest.raises(ValueError):
+        registry.register('late', 'Late', 'x', depends_on=('missing',))(noop)
+
+
+def test_query_plan_is_deduplicated_and_normalized():
+    registry = CheckRegistry()
+    registry.register('a', 'A', 'x', queries=lambda d: [(d, 'txt'), (d + '.', 'A')])(noop)
+    registry.register('b', 'B', 'x', queries=lambda d: [(d.upper(), 'TXT')])(noop)
+    assert registry.query_plan('example.com') == [('example.com', 'TXT'), ('example.com', 'A')]
+
+
+def test_dependent_runs_after_dependency_and_shares_lookups():
+    order = []
+    resolver = FakeResolver({('example.com', 'TXT'): ['v=spf1 -all'], ('example.com', 'A'): ['192.0.2.1']})
+    engine = CheckEngine(registry_with_dependency(order), resolver, timeout=1)
+    results = asyncio.run(engine.run('example.com'))
+    assert [result.id for result in results] == ['base', 'dependent', 'other']
+    assert [result.status for result in results] == ['passed', 'passed', 'passed']
+    assert order.index('base') < order.index('dependent')
+    assert resolver.calls[('example.com', 'TXT')] == 1
+
+
+def test_dependent_is_skipped_when_dependency_fails():
+    resolver = FakeResolver({('example.com', 'TXT'): [], ('example.com', 'A'): ['192.0.2.1']})
+    engine = CheckEngine(registry_with_dependency([]), resolver, timeout=1)
+    results = {result.id: result for result in asyncio.run(engine.run('example.com'))}
+    assert results['base'].status == 'failed'
+    assert results['dependent'].status == 'skipped'
+    assert not results['dependent'].passed
+    assert results['dependent'].result == 'Skipped: base failed'
+
+
+def test_throttled_lookup_makes_check_inconclusive():
+    resolver = FakeResolver({('example.com', 'TXT'): ['v=spf1 -all']}, throttled=[('example.com', 'A')])
+    engine = CheckEngine(registry_with_dependency([]), resolver, timeout=1)
+    results = {result.id: result for result in asyncio.run(engine.run('example.com'))}
+    assert results['other'].status == 'inconclusive'
+    assert results['base'].status == 'passed'
+
+
+def test_timeout_and_errors_fail_the_check():
+    registry = CheckRegistry()
+
+    @registry.register('slow', 'Slow', 'x')
+    async def slow(domain, ctx):
+        await asyncio.sleep(1)
+
+    @registry.register('broken', 'Broken', 'x')
+    async def broken(domain, ctx):
+        raise RuntimeError('boom')
+
+    results = asyncio.run(CheckEngine(registry, FakeResolver({}), timeout=0.01).run('example.com'))
+    assert [(result.status, result.passed) for result in results] == [('failed', False), ('failed', False)]
+    assert results[0].result.startswith('Check timed out')
+    assert results[1].result == 'Error running check: boom'
+
+
+def test_precheck_failure_fails_every_check_without_lookups():
+    async def precheck(domain, ctx):
+        return 'Domain does not exist'
+
+    resolver = FakeResolver({})
+    engine = CheckEngine(registry_with_dependency([]), resolver, timeout=1, precheck=precheck)
+    ctx = CheckContext('example.com', resolver)
+    results = asyncio.run(engine.run('example.com', ctx))
+    assert {result.result for result in results} == {'Domain does not exist'}
+    assert ctx.findings['precheck_failure'] == 'Domain does not exist'
+    assert not resolver.calls
@@ -0,0 +1,79 @@
+import json
+
+from dkim_index import SelectorIndex, provider_fingerprints
+
+
+def test_provider_fingerprints():
+    assert provider_fingerprints(['mx1.mail.example.net.', 'mx2.mail.example.net'],
+                                 'v=spf1 include:_spf.google.com include:%{d}.x.example -all') == [
+        'mx:example.net', 'spf:_spf.google.com']
+
+
+def test_order_prefers_provider_then_overall_hits():
+    index = SelectorIndex()
+    index.record('a.com', ['mx:klaviyo.com'], 'klaviyo')
+    index.record('b.com', [], 'google')
+    index.record('c.com', [], 'google')
+    assert index.order(['default', 'google', 'klaviyo'], ['mx:klaviyo.com']) == ['klaviyo', 'google', 'default']
+    assert index.order(['default', 'google', 'klaviyo']) == ['google', 'klaviyo', 'default']
+
+
+def test_reconfirmation_does_not_inflate_counts():
+    index = SelectorIndex()
+    for _ in range(3):
+        index.record('a.com', ['mx:example.net'], 's1')
+    assert index.overall['s1'] == 1
+    index.record('a.com', [], None)
+    assert index.known_selector('a.com') is None
+
+
+def test_workers_sharing_a_file_merge_what_they_learned(tmp_path):
+    path = str(tmp_path / 'index.json')
+    first = SelectorIndex(path).load()
+    second = SelectorIndex(path).load()
+    first.record('a.com', ['mx:example.net'], 's1')
+    second.record('b.com', ['mx:example.net'], 's1')
+    second.record('c.com', [], 'google')
+    first.save()
+    second.save()
+
+    with open(path) as f:
+        data = json.load(f)
+    assert data['overall'] == {'s1': 2, 'google': 1}
+    assert data['by_fingerprint'] == {'mx:example.net': {'s1': 2}}
+    assert data['last_good'] == {'a.com': 's1', 'b.com': 's1', 'c.com': 'google'}
+    # Saving also picks up what the other workers learned
+    assert second.known_selector('a.com') == 's1'
+
+
+def test_forgetting_a_domain_is_merged(tmp_path):
+    path = str(tmp_path / 'index.json')
+    first = SelectorIndex(path).load()
+    first.record('a.com', [], 's1')
+    first.save()
+    second = SelectorIndex(path).load()
+    second.record('a.com', [], None)
+    second.save()
+    assert SelectorIndex(path).load().known_selector('a.com') is None
+
+
+def test_failed_save_keeps_deltas(tmp_path):
+    index = SelectorIndex(str(tmp_path / 'missing' / 'index.json'))
+    index.record('a.com', ['mx:example.net'], 's1')
+    try:
+        index.save()
+    except OSError:
+        pass
+    assert index.dirty
+    index.path = str(tmp_path / 'index.json')
+    index.save()
+    assert SelectorIndex(index.path).load().overall == {'s1': 1}
+
+
+def test_fingerprints_and_domains_are_capped():
+    index = SelectorIndex(max_domains=10, max_fingerprints=5)
+    for i in range(20):
+        index.record(f'd{i}.com', [f'mx:p{i}.net'], 's1')
+    assert len(index.by_fingerprint) == 5
+    assert list(index.by_fingerprint) == [f'mx:p{i}.net' for i in range(15, 20)]
+    assert len(index.last_good) == 10
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from dns_scheduler import BULK, INTERACTIVE, ConcurrencyBudget, QueryThrottled, TokenBucket
+
+
+def test_token_bucket_admits_a_burst_then_throttles():
+    async def scenario():
+        bucket = TokenBucket(rate=10, burst=3)
+        for _ in range(3):
+            await bucket.acquire(INTERACTIVE, timeout=0.01)
+        with pytest.raises(QueryThrottled):
+            await bucket.acquire(INTERACTIVE, timeout=0.01)
+        return bucket
+
+    bucket = asyncio.run(scenario())
+    assert bucket.throttled == 1
+
+
+def test_token_bucket_refills_at_its_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=100, burst=1)
+        await bucket.acquire(INTERACTIVE, timeout=0.01)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await bucket.acquire(INTERACTIVE, timeout=1)
+        return loop.time() - started
+
+    assert 0.005 <= asyncio.run(scenario()) < 0.5
+
+
+def test_token_bucket_serves_interactive_before_bulk():
+    async def scenario():
+        bucket = TokenBucket(rate=50, burst=1)
+        await bucket.acquire(INTERACTIVE, timeout=0.01)
+        order = []
+
+        async def acquire(priority, name):
+            await bucket.acquire(priority, timeout=1)
+            order.append(name)
+
+        bulk = asyncio.ensure_future(acquire(BULK, 'bulk'))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(acquire(INTERACTIVE, 'interactive'))
+        await asyncio.gather(bulk, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ['interactive', 'bulk']
+
+
+def test_token_bucket_disabled_never_waits():
+    async def scenario():
+        bucket = TokenBucket(rate=0)
+        for _ in range(1000):
+            await bucket.acquire(BULK, timeout=0)
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_rate_halves_once_per_second_and_recovers():
+    bucket = TokenBucket(rate=100, min_rate=10)
+    bucket.decrease()
+    bucket.decrease()  # same burst of failures
+    assert bucket.rate == 50
+    bucket._last_decrease -= 1
+    bucket.decrease()
+    assert bucket.rate == 25
+    for _ in range(10):
+        bucket.increase()
+    assert bucket.rate == 35
+    for _ in range(1000):
+        bucket.increase()
+    assert bucket.rate == 100
+
+
+def test_token_bucket_rate_never_drops_below_min():
+    bucket = TokenBucket(rate=100, min_rate=10)
+    for _ in range(10):
+        bucket._last_decrease -= 1
+        bucket.decrease()
+    assert bucket.rate == 10
+
+
+def test_budget_limits_in_flight_and_hands_slots_to_waiters():
+    async def scenario():
+        budget = ConcurrencyBudget(limit=2, min_limit=1)
+        await budget.acquire(INTERACTIVE, timeout=0.01)
+        await budget.acquire(INTERACTIVE, timeout=0.01)
+        waiter = asyncio.ensure_future(budget.acquire(INTERACTIVE, timeout=1))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        budget.release()
+        await waiter
+        return budget
+
+    budget = asyncio.run(scenario())
+    assert budget.in_flight == 2
+
+
+def test_budget_serves_interactive_before_bulk():
+    async def scenario():
+        budget = ConcurrencyBudget(limit=1, min_limit=1)
+        await budget.acquire(INTERACTIVE, timeout=0.01)
+        order = []
+
+        async def acquire(priority, name):
+            await budget.acquire(priority, timeout=1)
+            order.append(name)
+            budget.release()
+
+        bulk = asyncio.ensure_future(acquire(BULK, 'bulk'))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(acquire(INTERACTIVE, 'interactive'))
+        await asyncio.sleep(0)
+        budget.release()
+        await asyncio.gather(bulk, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ['interactive', 'bulk']
+
+
+def test_budget_throttles_after_timeout_without_leaking_slots():
+    async def scenario():
+        budget = ConcurrencyBudget(limit=1, min_limit=1)
+        await budget.acquire(BULK, timeout=0.01)
+        with pytest.raises(QueryThrottled):
+            await budget.acquire(BULK, timeout=0.01)
+        budget.release()
+        await budget.acquire(BULK, timeout=0.01)
+        return budget
+
+    budget = asyncio.run(scenario())
+    assert budget.throttled == 1
+    assert budget.in_flight == 1
+
+
+def test_budget_shrinks_on_failure_and_regrows():
+    budget = ConcurrencyBudget(limit=16, min_limit=4)
+    budget.decrease()
+    assert budget.limit == 8
+    budget.decrease()
+    budget.decrease()
+    assert budget.limit == 4
+    for _ in range(200):
+        budget.increase()
+    assert budget.limit == 16
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import shutil
+
+import pytest
+
+from industry_benchmarks import BenchmarkStore, BenchmarkTable
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'data', 'industry_benchmarks.json')
+
+
+def valid_data(version='test.1'):
+    return {
+        'version': version,
+        'regions': {'global': 'Global', 'europe': 'Europe'},
+        'industries': {
+            'fashion': {'name': 'Fashion', 'email_roi': 25, 'sms_roi': 20, 'regions': {'europe': {'email_roi': 23}}},
+            'fashion.footwear': {'name': 'Footwear', 'parent': 'fashion', 'sms_roi': 18},
+        },
+    }
+
+
+def test_resolves_parents_and_regions():
+    table = BenchmarkTable.from_dict(valid_data())
+    footwear = table.get('fashion.footwear', 'europe')
+    assert (footwear.email_roi, footwear.sms_roi, footwear.region) == (23, 18, 'europe')
+    assert table.get('fashion', 'global').email_roi == 25
+
+
+def test_shipped_data_file_is_valid():
+    with open(DATA_FILE) as f:
+        assert len(BenchmarkTable.from_dict(json.load(f))) > 0
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda d: d.update(regions=['global']),
+    lambda d: d['industries'].update(fashion=['not', 'an', 'object']),
+    lambda d: d['industries']['fashion'].update(regions=['europe']),
+    lambda d: d['industries']['fashion']['regions'].update(europe=[23]),
+    lambda d: d['industries']['fashion.footwear'].update(parent=['fashion']),
+    lambda d: d['industries']['fashion.footwear'].update(parent='missing'),
+    lambda d: d['industries']['fashion'].update(email_roi=250),
+])
+def test_malformed_data_raises_value_error(mutate):
+    data = valid_data()
+    mutate(data)
+    with pytest.raises(ValueError):
+        BenchmarkTable.from_dict(data)
+
+
+def test_watch_survives_a_malformed_file(tmp_path):
+    path = str(tmp_path / 'benchmarks.json')
+    shutil.copy(DATA_FILE, path)
+    store = BenchmarkStore(path)
+    original = store.table.version
+
+    async def scenario():
+        watch = asyncio.ensure_future(store.watch(0.01))
+        bad = valid_data('bad.1')
+        bad['industries']['fashion']['regions'] = ['europe']
+        with open(path, 'w') as f:
+            json.dump(bad, f)
+        await asyncio.sleep(0.1)
+        assert store.table.version == original
+        assert store.reload_errors == 1
+        with open(path, 'w') as f:
+            json.dump(valid_data('good.2'), f, indent=2)
+        await asyncio.sleep(0.1)
+        assert not watch.done()
+        watch.cancel()
+
+    asyncio.run(scenario())
+    assert store.table.version == 'good.2'
@@ -0,0 +1,46 @@
+import asyncio
+import gzip
+
+import pytest
+
+import server
+from jobs import COMPLETED, JobManager, JobStore, QueueFull
+
+
+def test_results_keep_submission_order(tmp_path):
+    async def check(domain):
+        await asyncio.sleep(0.01 if domain == 'a.com' else 0)  # finishes last
+        return f'{domain}\n'.encode(), False
+
+    async def scenario():
+        manager = JobManager(str(tmp_path), check, concurrency=4, poll_interval=0.01)
+        manager.start()
+        job = await manager.submit([('a.com', None), ('bad domain', b'bad domain: invalid\n'),
+                                    ('b.com', None), ('c.com', None)])
+        assert (job['total'], job['done'], job['errors']) == (4, 1, 1)
+        for _ in range(200):
+            job = await manager.get(job['id'])
+            if job['status'] == COMPLETED:
+                break
+            await asyncio.sleep(0.01)
+        await manager.stop(1)
+        return manager, job
+
+    manager, job = asyncio.run(scenario())
+    assert job['status'] == COMPLETED
+    with gzip.open(manager.results_path(job['id'])) as f:
+        assert f.read() == b'a.com\nbad domain: invalid\nb.com\nc.com\n'
+
+
+def test_create_refuses_beyond_max_queued(tmp_path):
+    store = JobStore(str(tmp_path))
+    store.create([('a.com', None)], max_queued=1)
+    with pytest.raises(QueueFull):
+        store.create([('b.com', None)], max_queued=1)
+
+
+def test_job_items_validate_and_dedupe_in_order():
+    items, checked = server.job_items(['Example.com', 'not valid!', 'example.com', 'https://b.example/x'])
+    assert checked == 2
+    assert [domain for domain, _ in items] == ['example.com', 'not valid!', 'b.example']
+    assert items[0][1] is None and b'error' in items[1][1]
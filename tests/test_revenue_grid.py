@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def grid(**payload):
+    return client.post('/api/calculate-revenue/grid', json={'monthly_revenue': [10000], **payload})
+
+
+def test_grid_matches_single_calculation():
+    response = grid(monthly_revenue={'start': 1000, 'stop': 3000, 'step': 1000}, industries=['general'],
+                    has_email_marketing=[False, True], current_email_revenue=[500])
+    assert response.status_code == 200
+    body = response.json()
+    assert body['rows'] == 6
+    single = client.post('/api/calculate-revenue', json={
+        'monthly_revenue': 3000, 'industry': 'general', 'has_email_marketing': True,
+        'has_sms_marketing': False, 'current_email_revenue': 500,
+    }).json()
+    assert body['columns']['total_monthly_increase'][-1] == round(single['total_monthly_increase'], 2)
+
+
+@pytest.mark.parametrize('monthly_revenue', [
+    {'start': 0, 'stop': 1e300, 'step': 1e-300},
+    {'start': -1e308, 'stop': 1e308, 'step': 1},
+    {'start': 0, 'stop': 1e6, 'step': 1},
+    {'start': 1, 'stop': 0, 'step': 1},
+])
+def test_extreme_ranges_are_rejected(monthly_revenue):
+    assert grid(monthly_revenue=monthly_revenue).status_code == 400
+
+
+def test_axis_product_is_checked_without_overflow():
+    # 65,536 ** 4 wraps to 0 in int64
+    axis = {'start': 0, 'stop': 65535, 'step': 1}
+    response = grid(monthly_revenue=axis, current_email_revenue=axis, current_sms_revenue=axis,
+                    has_email_marketing=[True] * 65536)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('payload', [{'industries': []}, {'decimals': 400}, {'decimals': -1}])
+def test_invalid_fields_are_rejected(payload):
+    assert grid(**payload).status_code == 422
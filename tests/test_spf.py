@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import Counter
+
+import dns.resolver
+import pytest
+
+from dns_scheduler import QueryThrottled
+from spf import LOOKUP_LIMIT, SPFExpander, spf_records
+
+
+class TXT:
+    def __init__(self, *strings):
+        self.strings = tuple(s.encode() for s in strings)
+
+
+class Answer(list):
+    def __init__(self, records, ttl=300):
+        super().__init__(records)
+        self.expiration = time.time() + ttl
+
+
+class FakeResolver:
+    """Serves TXT records from a dict of domain -> record (or exception); unknown names are NXDOMAIN"""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = Counter()
+
+    async def __call__(self, qname, rdtype):
+        assert rdtype == 'TXT'
+        self.calls[qname] += 1
+        await asyncio.sleep(0)
+        record = self.records.get(qname)
+        if record is None:
+            raise dns.resolver.NXDOMAIN()
+        if isinstance(record, Exception):
+            raise record
+        return Answer([TXT(r) for r in ([record] if isinstance(record, str) else record)])
+
+
+def evaluate(records, domain='example.com', expander=None):
+    expander = expander or SPFExpander(FakeResolver(records))
+    return asyncio.run(expander.evaluate(domain))
+
+
+def test_spf_records_joins_strings_and_ignores_other_txt():
+    answer = [TXT('v=spf1 include:_spf.example.net ', '-all'), TXT('google-site-verification=x'), TXT('v=spf10')]
+    assert spf_records(answer) == ['v=spf1 include:_spf.example.net -all']
+
+
+def test_counts_each_lookup_mechanism():
+    result = evaluate({
+        'example.com': 'v=spf1 a mx ptr exists:%{i}.bl.example a:mail.example.com/24 mx/24 '
+                       'ip4:192.0.2.0/24 ip6:2001:db8::/32 exp=explain.example.com -all',
+    })
+    # a, mx, ptr, exists, a:..., mx/24; ip4, ip6, all and exp= are free
+    assert result.lookups == 6
+    assert result.errors == []
+    assert not result.exceeds_limit
+
+
+def test_counts_nested_includes():
+    result = evaluate({
+        'example.com': 'v=spf1 include:_spf.provider.net include:other.net ~all',
+        '_spf.provider.net': 'v=spf1 include:_netblocks.provider.net include:_netblocks2.provider.net ~all',
+        '_netblocks.provider.net': 'v=spf1 ip4:192.0.2.0/24 ~all',
+        '_netblocks2.provider.net': 'v=spf1 a mx ~all',
+        'other.net': 'v=spf1 ip4:198.51.100.0/24 -all',
+    })
+    assert result.lookups == 2 + 2 + 0 + 2 + 0
+    assert result.includes == 4
+
+
+def test_shared_subtree_is_counted_once_per_reference():
+    result = evaluate({
+        'example.com': 'v=spf1 include:a.net include:b.net -all',
+        'a.net': 'v=spf1 include:shared.net -all',
+        'b.net': 'v=spf1 include:shared.net -all',
+        'shared.net': 'v=spf1 a mx -all',
+    })
+    # Evaluation follows both paths, so shared.net's lookups count twice
+    assert result.lookups == 2 + 1 + 1 + 2 * 2
+
+
+def test_exceeding_the_limit():
+    includes = ' '.join(f'include:p{i}.net' for i in range(LOOKUP_LIMIT))
+    records = {'example.com': f'v=spf1 {includes} a -all'}
+    records.update({f'p{i}.net': 'v=spf1 ip4:192.0.2.1 -all' for i in range(LOOKUP_LIMIT)})
+    result = evaluate(records)
+    assert result.lookups == LOOKUP_LIMIT + 1
+    assert result.exceeds_limit
+
+
+def test_redirect_is_counted_and_followed():
+    result = evaluate({
+        'example.com': 'v=spf1 redirect=_spf.example.com',
+        '_spf.example.com': 'v=spf1 mx a -all',
+    })
+    assert result.lookups == 3
+    assert result.includes == 1
+
+
+def test_redirect_is_ignored_with_all():
+    resolver = FakeResolver({'example.com': 'v=spf1 mx redirect=_spf.example.com -all'})
+    result = asyncio.run(SPFExpander(resolver).evaluate('example.com'))
+    assert result.lookups == 1
+    assert '_spf.example.com' not in resolver.calls
+
+
+def test_macro_targets_are_counted_but_not_expanded():
+    resolver = FakeResolver({'example.com': 'v=spf1 include:%{d}.spf.example.net -all'})
+    result = asyncio.run(SPFExpander(resolver).evaluate('example.com'))
+    assert result.lookups == 1
+    assert list(resolver.calls) == ['example.com']
+
+
+def test_include_loop_is_detected():
+    result = evaluate({
+        'example.com': 'v=spf1 include:a.net -all',
+        'a.net': 'v=spf1 include:b.net -all',
+        'b.net': 'v=spf1 include:a.net -all',
+    })
+    assert result.errors == ['include loop: example.com -> a.net -> b.net -> a.net']
+
+
+def test_void_lookups_are_reported():
+    result = evaluate({
+        'example.com': 'v=spf1 include:gone.example include:nospf.example include:nodata.example -all',
+        'nospf.example': 'google-site-verification=x',
+        'nodata.example': dns.resolver.NoAnswer(),
+    })
+    assert result.lookups == 3
+    assert len(result.errors) == 3
+    assert 'nospf.example: no SPF record' in result.errors
+
+
+def test_multiple_records_is_an_error():
+    result = evaluate({'example.com': ['v=spf1 -all', 'v=spf1 a -all']})
+    assert result.errors == ['example.com: multiple SPF records']
+
+
+def test_includes_are_memoized_across_evaluations():
+    resolver = FakeResolver({
+        'one.com': 'v=spf1 include:_spf.provider.net -all',
+        'two.com': 'v=spf1 include:_spf.provider.net -all',
+        '_spf.provider.net': 'v=spf1 ip4:192.0.2.0/24 -all',
+    })
+    expander = SPFExpander(resolver)
+
+    async def both():
+        return await asyncio.gather(expander.evaluate('one.com'), expander.evaluate('two.com'))
+
+    asyncio.run(both())
+    assert resolver.calls['_spf.provider.net'] == 1
+    assert expander.stats()['hits'] == 1
+
+
+def test_throttled_lookup_propagates_and_is_not_memoized():
+    resolver = FakeResolver({'example.com': 'v=spf1 include:a.net -all', 'a.net': QueryThrottled()})
+    expander = SPFExpander(resolver)
+    with pytest.raises(QueryThrottled):
+        asyncio.run(expander.evaluate('example.com'))
+    resolver.records['a.net'] = 'v=spf1 mx -all'
+    assert asyncio.run(expander.evaluate('example.com')).lookups == 2
+    assert resolver.calls['a.net'] == 2